@@ -0,0 +1,93 @@
+"""
+Low-priority background jobs.
+
+Jobs run on a small dedicated thread pool so speculative work never competes
+with requests a user is waiting for. Each job has a key, so callers can attach
+to a running job instead of starting a duplicate, and an owner (usually a
+session id), so stale jobs can be cancelled together. A job that has already
+started cannot be interrupted; cancelling it only discards its result.
+"""
+# Standard library imports
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+# Local imports
+from backend import metrics
+from backend.call_context import bind
+
+# Define public API
+__all__ = [
+    'BACKGROUND_WORKERS',
+    'submit',
+    'get',
+    'cancel'
+]
+
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "2"))
+
+# Finished jobs kept for callers to pick up; the oldest are dropped first
+_MAX_JOBS = 256
+
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_jobs: "OrderedDict[str, Tuple[str, Future]]" = OrderedDict()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="background")
+    return _executor
+
+
+def _evict() -> None:
+    """Drop the oldest finished jobs beyond _MAX_JOBS (caller holds the lock)"""
+    for key in list(_jobs):
+        if len(_jobs) <= _MAX_JOBS:
+            return
+        if _jobs[key][1].done():
+            del _jobs[key]
+
+
+def submit(key: str, owner: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """Start fn(*args, **kwargs) in the background unless a job with key exists
+
+    Returns:
+        Future: The new job, or the existing job for key
+    """
+    with _lock:
+        existing = _jobs.get(key)
+        if existing is not None:
+            return existing[1]
+        # The job keeps the submitter's call context (tenant, priority)
+        future = _get_executor().submit(bind(fn), *args, **kwargs)
+        _jobs[key] = (owner, future)
+        _evict()
+    metrics.increment("background.submitted")
+    return future
+
+
+def get(key: str) -> Optional[Future]:
+    """Return the job for key, or None if there is none"""
+    with _lock:
+        job = _jobs.get(key)
+    return job[1] if job is not None else None
+
+
+def cancel(owner: str, keep: Optional[str] = None) -> int:
+    """Cancel and forget every job of owner except keep
+
+    Returns:
+        int: Number of jobs cancelled
+    """
+    with _lock:
+        keys = [key for key, (job_owner, _) in _jobs.items() if job_owner == owner and key != keep]
+        jobs = [_jobs.pop(key)[1] for key in keys]
+    for future in jobs:
+        future.cancel()
+    if jobs:
+        metrics.increment("background.cancelled", len(jobs))
+    return len(jobs)
@@ -0,0 +1,455 @@
+"""
+Offline benchmarks for the LLM pipeline.
+
+Run from the project root, e.g.:
+
+    python -m backend.benchmarks patch --phases 6 12 24
+    python -m backend.benchmarks patch --live   # also times real model calls
+    python -m backend.benchmarks context --phases 6 12 24
+    python -m backend.benchmarks tiers --log traffic.jsonl             # cost/latency per model tier
+    python -m backend.benchmarks tiers --log traffic.jsonl --replay 3  # also replays recorded prompts
+    python -m backend.benchmarks prompts                     # composed prompt size for typical forms
+    python -m backend.benchmarks prompts --log traffic.jsonl # token savings across recorded traffic
+    python -m backend.benchmarks cache                       # cacheable static prefix of each template
+    python -m backend.benchmarks cache --log traffic.jsonl   # cached input tokens across recorded traffic
+    python -m backend.benchmarks schema --phases 6 12 24     # full vs compact plan output
+    python -m backend.benchmarks schema --live               # also times real model calls
+"""
+# Standard library imports
+import argparse
+import json
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+# Local imports
+from backend import budgets, tokens, traffic
+from backend.call_context import priority_scope, template_scope, tier_scope
+from backend.plan_context import build_plan_context, context_window
+from backend.plan_patch import apply_plan_patch
+from backend.plan_utils import compact_plan, expand_plan
+
+# Define public API
+__all__ = [
+    'synthetic_plan',
+    'estimate_output_tokens',
+    'benchmark_patch_revision',
+    'benchmark_revision_context',
+    'benchmark_model_tiers',
+    'benchmark_prompt_sections',
+    'benchmark_prompt_cache',
+    'benchmark_plan_schema'
+]
+
+_FILLER = (
+    "Students work through guided examples, compare their reasoning with a partner, "
+    "and the teacher checks understanding with targeted questions before moving on. "
+)
+
+
+def synthetic_plan(num_phases: int, sentences_per_description: int = 4) -> Dict[str, Any]:
+    """Build a deterministic plan with realistic field lengths"""
+    return {
+        "objectives": [f"Objective {i + 1}: apply concept {i + 1} to new problems" for i in range(4)],
+        "outline": [
+            {
+                "phase": f"Phase {i + 1}: Activity {i + 1}",
+                "duration": "10 minutes",
+                "purpose": f"Students will practice concept {i + 1} and connect it to earlier phases.",
+                "description": _FILLER * sentences_per_description
+            }
+            for i in range(num_phases)
+        ]
+    }
+
+
+def estimate_output_tokens(text: str) -> int:
+    """Token count by the local estimator (backend/tokens.py)"""
+    return max(1, tokens.estimate_tokens(text))
+
+
+def _edit_scenarios(plan: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Typical teacher edits expressed as patches"""
+    last = len(plan["outline"]) - 1
+    return {
+        "rename one phase": {"objectives": None, "operations": [
+            {"op": "replace", "index": 1, "phase": {
+                "phase": "Hands-on Lab",
+                "purpose": "Students will apply the concept in a lab setting.",
+                "description": _FILLER * 4,
+                "summary of changes": "Renamed and refocused on hands-on work"}}
+        ]},
+        "change one duration": {"objectives": None, "operations": [
+            {"op": "replace", "index": 1, "phase": {"duration": "20 minutes",
+                                                     "summary of changes": "Extended practice time"}},
+            {"op": "replace", "index": last - 1, "phase": {"duration": "5 minutes",
+                                                            "summary of changes": "Shortened to keep total time"}},
+            {"op": "replace", "index": last, "phase": {"duration": "5 minutes",
+                                                        "summary of changes": "Shortened to keep total time"}}
+        ]}
+    }
+
+
+def benchmark_patch_revision(phase_counts: List[int], live: bool = False) -> List[Dict[str, Any]]:
+    """Compare output size (and optionally latency) of patch vs full-plan revisions"""
+    rows = []
+    for num_phases in phase_counts:
+        plan = synthetic_plan(num_phases)
+        for scenario, patch in _edit_scenarios(plan).items():
+            revised = apply_plan_patch(plan, patch)
+            full_tokens = estimate_output_tokens(json.dumps({"broad_plan": revised}, ensure_ascii=False))
+            patch_tokens = estimate_output_tokens(json.dumps(patch, ensure_ascii=False))
+            rows.append({
+                "phases": num_phases,
+                "scenario": scenario,
+                "full_output_tokens": full_tokens,
+                "patch_output_tokens": patch_tokens,
+                "reduction": 1 - patch_tokens / full_tokens
+            })
+        if live:
+            rows[-1].update(_time_live_revision(plan))
+    return rows
+
+
+def _time_live_revision(plan: Dict[str, Any]) -> Dict[str, float]:
+    """Time one real duration edit with both chains (needs API keys)"""
+    from backend.chains import (
+        get_openrouter_llm,
+        create_precise_revision_chain,
+        create_precise_revision_patch_chain
+    )
+    llm = get_openrouter_llm(model_name="anthropic/claude-3.7-sonnet", temperature=0)
+    inputs = {
+        "revised_phases": "- Phase 2: Change 'Phase 2: Activity 2' (10 minutes) to 'Phase 2: Activity 2' (20 minutes)\n",
+        "user_feedback": "I extended phase 2; take the time from the last phases."
+    }
+
+    start = time.perf_counter()
+    create_precise_revision_chain(llm).invoke(
+        {**inputs, "original_plan_json": json.dumps({"broad_plan": plan}, ensure_ascii=False)})
+    full_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    create_precise_revision_patch_chain(llm).invoke(
+        {**inputs, "plan_context": build_plan_context(plan, context_window(plan, "", [1]))})
+    patch_seconds = time.perf_counter() - start
+
+    return {"full_latency_s": full_seconds, "patch_latency_s": patch_seconds}
+
+
+def _with_artifacts(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Attach generated materials to every phase, as in a finalized plan"""
+    material = {"title": "Worksheet", "content": _FILLER * 12}
+    return {**plan, "outline": [{**phase, "artifacts": [material]} for phase in plan["outline"]]}
+
+
+def benchmark_revision_context(phase_counts: List[int]) -> List[Dict[str, Any]]:
+    """Compare prompt input size of the full plan vs the windowed context"""
+    requests = {
+        "edit one phase": ("Make phase 2 more hands-on.", []),
+        "duration change in UI": ("", [1]),
+        "two distant phases": ("Shorten phase 1 and add a recap to the last phase.", [])
+    }
+    rows = []
+    for num_phases in phase_counts:
+        plan = _with_artifacts(synthetic_plan(num_phases))
+        full_tokens = estimate_output_tokens(json.dumps({"broad_plan": plan}, ensure_ascii=False))
+        for scenario, (feedback, changed) in requests.items():
+            if scenario == "two distant phases":
+                feedback = feedback.replace("the last phase", f"phase {num_phases}")
+            window = context_window(plan, feedback, changed)
+            context_tokens = estimate_output_tokens(build_plan_context(plan, window))
+            rows.append({
+                "phases": num_phases,
+                "scenario": scenario,
+                "phases_sent": len(window) if window is not None else num_phases,
+                "full_input_tokens": full_tokens,
+                "context_input_tokens": context_tokens,
+                "reduction": 1 - context_tokens / full_tokens
+            })
+    return rows
+
+
+def _replay(llm: Any, template: str, tier: str, calls: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Re-run recorded prompts on one tier (needs API keys) and average latency and tokens"""
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+    message_types = {"system": SystemMessage, "ai": AIMessage}
+    seconds, used = 0.0, 0
+    for call in calls:
+        messages = [message_types.get(m["role"], HumanMessage)(content=m["content"]) for m in call["messages"]]
+        start = time.perf_counter()
+        with template_scope(template), tier_scope(tier):
+            result = llm.invoke(messages)
+        seconds += time.perf_counter() - start
+        used += sum(budgets.usage_of(messages, result))
+    return {f"replay_{tier}_s": seconds / len(calls), f"replay_{tier}_tokens": used / len(calls)}
+
+
+def benchmark_model_tiers(log_path: str, quality_model: str, fast_model: str,
+                          replay: int = 0) -> List[Dict[str, Any]]:
+    """Compare per-call cost and latency of each template on the quality and fast tiers
+
+    Costs apply each tier's model prices to the recorded token counts; latencies
+    are the recorded averages of calls that ran on the tier (empty if none did).
+    With replay, up to that many recorded prompts per template are re-run on both
+    tiers (the fast tier then uses OPENROUTER_FAST_MODEL).
+    """
+    llm = None
+    by_template: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for call in traffic.read(log_path):
+        by_template[call["template"]].append(call)
+
+    # Replayed calls must not end up in the log being analysed
+    traffic.TRAFFIC_LOG = ""
+    rows = []
+    for template, calls in sorted(by_template.items()):
+        input_tokens = sum(call["input_tokens"] for call in calls) / len(calls)
+        output_tokens = sum(call["output_tokens"] for call in calls) / len(calls)
+        quality_cost = budgets.estimate_cost(quality_model, input_tokens, output_tokens)
+        fast_cost = budgets.estimate_cost(fast_model, input_tokens, output_tokens)
+        row = {
+            "template": template,
+            "calls": len(calls),
+            "input_tokens": round(input_tokens),
+            "output_tokens": round(output_tokens),
+            "quality_usd_per_1k_calls": quality_cost * 1000,
+            "fast_usd_per_1k_calls": fast_cost * 1000,
+            "cost_reduction": 1 - fast_cost / quality_cost if quality_cost else 0.0
+        }
+        for tier in ("quality", "fast"):
+            latencies = [call["seconds"] for call in calls if call["tier"] == tier]
+            row[f"{tier}_latency_s"] = sum(latencies) / len(latencies) if latencies else ""
+        recorded = [call for call in calls if call.get("messages")][:replay]
+        if recorded:
+            if llm is None:
+                from backend.chains import get_openrouter_llm
+                llm = get_openrouter_llm(model_name=quality_model, temperature=0)
+            with priority_scope("batch"):
+                for tier in ("quality", "fast"):
+                    row.update(_replay(llm, template, tier, recorded))
+        rows.append(row)
+    return rows
+
+
+# Typical lesson forms: (styles, requirements, reference material, feedback)
+_FORM_SCENARIOS = {
+    "one style, nothing optional": (["Facilitator"], [], "", ""),
+    "two styles, requirements": (["Expert", "Facilitator"], ["Include a group activity"], "", ""),
+    "one style, reference material": (["Formal Authority"], [], _FILLER * 20, ""),
+    "all styles, everything": (["Expert", "Formal Authority", "Personal Model", "Facilitator", "Delegator"],
+                               ["Include a group activity"], _FILLER * 20, "Keep four phases.")
+}
+
+
+def benchmark_prompt_sections(log_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Prompt tokens saved by leaving out sections that do not apply
+
+    Without a log, the broad plan prompt is composed for typical lesson forms.
+    With a TRAFFIC_LOG file, the savings recorded with each call are summed per
+    template.
+    """
+    if log_path:
+        by_template: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for call in traffic.read(log_path):
+            if call.get("prompt"):
+                by_template[call["template"]].append(call["prompt"])
+        rows = []
+        for template, prompts in sorted(by_template.items()):
+            sent = sum(prompt["tokens"] for prompt in prompts)
+            saved = sum(prompt.get("sections_saved_tokens", 0) for prompt in prompts)
+            rows.append({
+                "template": template,
+                "calls": len(prompts),
+                "avg_prompt_tokens": sent / len(prompts),
+                "avg_saved_tokens": saved / len(prompts),
+                "total_saved_tokens": saved,
+                "reduction": saved / (sent + saved) if sent + saved else 0.0
+            })
+        return rows
+
+    from backend.prompts import BROAD_PLAN_DRAFT_TEMPLATE
+
+    rows = []
+    for scenario, (styles, requirements, reference, feedback) in _FORM_SCENARIOS.items():
+        inputs = {
+            "grade_level": "9th grade", "topic": "Linear equations", "duration": 60,
+            "style": json.dumps(styles), "learning_objectives": json.dumps(["Solve linear equations"]),
+            "requirements": json.dumps(requirements), "broad_plan_feedback": feedback,
+            "reference_context": reference
+        }
+        complete = tokens.estimate_tokens(BROAD_PLAN_DRAFT_TEMPLATE.template.format(**inputs))
+        composed = tokens.estimate_tokens(BROAD_PLAN_DRAFT_TEMPLATE.format(**inputs))
+        rows.append({
+            "scenario": scenario,
+            "complete_prompt_tokens": complete,
+            "composed_prompt_tokens": composed,
+            "saved_tokens": complete - composed,
+            "reduction": 1 - composed / complete
+        })
+    return rows
+
+
+def benchmark_prompt_cache(log_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Share of each prompt that providers can serve from their prefix cache
+
+    Without a log, the static prefix (text before the first input) of every
+    template is measured against its whole fixed text. With a TRAFFIC_LOG file,
+    the input tokens providers reported as cached are summed per template, next
+    to the prefix size estimated when the prompt was built.
+    """
+    if log_path:
+        by_template: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for call in traffic.read(log_path):
+            by_template[call["template"]].append(call)
+        rows = []
+        for template, calls in sorted(by_template.items()):
+            reported = [call for call in calls if call.get("cached_input_tokens") is not None]
+            input_tokens = sum(call["input_tokens"] for call in reported)
+            cached = sum(call["cached_input_tokens"] for call in reported)
+            prefixes = [call["prompt"]["prefix_tokens"] for call in calls if (call.get("prompt") or {}).get("prefix_tokens")]
+            rows.append({
+                "template": template,
+                "calls": len(calls),
+                "calls_with_cache_data": len(reported),
+                "avg_input_tokens": input_tokens / len(reported) if reported else "",
+                "avg_cached_tokens": cached / len(reported) if reported else "",
+                "cached_ratio": cached / input_tokens if input_tokens else "",
+                "avg_prefix_tokens": sum(prefixes) / len(prefixes) if prefixes else ""
+            })
+        return rows
+
+    from backend import prompts
+    from backend.prompt_cache import PROMPT_CACHE_MIN_TOKENS, static_prefix
+
+    rows = []
+    for name in sorted(vars(prompts)):
+        template = getattr(prompts, name)
+        if not name.endswith("_TEMPLATE") or not hasattr(template, "template"):
+            continue
+        prefix_tokens = tokens.estimate_tokens(static_prefix(template.template))
+        fixed_tokens = tokens.template_tokens(template.template)
+        rows.append({
+            "template": name,
+            "fixed_tokens": fixed_tokens,
+            "prefix_tokens": prefix_tokens,
+            "prefix_share": prefix_tokens / fixed_tokens,
+            "cacheable": "yes" if prefix_tokens >= PROMPT_CACHE_MIN_TOKENS else "no"
+        })
+    return rows
+
+
+def _time_live_schema(plan: Dict[str, Any]) -> Dict[str, float]:
+    """Have a model write the same plan in both formats (needs API keys)"""
+    from langchain_core.messages import HumanMessage
+    from backend.chains import get_openrouter_llm
+
+    llm = get_openrouter_llm(model_name="anthropic/claude-3.7-sonnet", temperature=0)
+    source = json.dumps(plan, ensure_ascii=False)
+    formats = {
+        "full": "the JSON format {\"broad_plan\": {\"objectives\": [...], \"outline\": [{\"phase\", "
+                "\"duration\", \"purpose\", \"description\"}]}}, indented",
+        "compact": "the compact JSON format {\"o\": [objectives], \"ph\": [{\"n\": name, \"m\": minutes, "
+                   "\"p\": purpose, \"d\": description}]} on a single line"
+    }
+    row = {}
+    for name, description in formats.items():
+        message = HumanMessage(content=f"Write this lesson plan unchanged in {description}. Output only the JSON.\n\n{source}")
+        start = time.perf_counter()
+        with template_scope("schema_benchmark"):
+            result = llm.invoke([message])
+        row[f"{name}_latency_s"] = time.perf_counter() - start
+        row[f"{name}_reported_output_tokens"] = budgets.usage_of([message], result)[1]
+    return row
+
+
+def benchmark_plan_schema(phase_counts: List[int], live: bool = False) -> List[Dict[str, Any]]:
+    """Compare output tokens (and optionally latency) of the full and compact plan formats
+
+    The full format is measured as models write it (indented, with the
+    "broad_plan" wrapper), the compact one as requested (on one line). Every
+    plan is also checked to expand back from the compact format unchanged.
+    """
+    rows = []
+    for num_phases in phase_counts:
+        plan = synthetic_plan(num_phases)
+        compact = compact_plan(plan)
+        if expand_plan(compact) != plan:
+            raise AssertionError("compact plan format is not lossless")
+        full_tokens = estimate_output_tokens(json.dumps({"broad_plan": plan}, ensure_ascii=False, indent=2))
+        compact_tokens = estimate_output_tokens(json.dumps(compact, ensure_ascii=False, separators=(",", ":")))
+        row = {
+            "phases": num_phases,
+            "full_output_tokens": full_tokens,
+            "compact_output_tokens": compact_tokens,
+            "reduction": 1 - compact_tokens / full_tokens
+        }
+        if live:
+            with priority_scope("batch"):
+                row.update(_time_live_schema(plan))
+        rows.append(row)
+    return rows
+
+
+def _print_rows(rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    print("\t".join(columns))
+    for row in rows:
+        values = []
+        for column in columns:
+            value = row.get(column, "")
+            values.append(f"{value:.2f}" if isinstance(value, float) else str(value))
+        print("\t".join(values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the lesson plan LLM pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    patch_parser = subparsers.add_parser("patch", help="Patch vs full-plan precise revision")
+    patch_parser.add_argument("--phases", type=int, nargs="+", default=[6, 12, 24])
+    patch_parser.add_argument("--live", action="store_true", help="Also time real model calls")
+
+    context_parser = subparsers.add_parser("context", help="Windowed vs full plan revision context")
+    context_parser.add_argument("--phases", type=int, nargs="+", default=[6, 12, 24])
+
+    tiers_parser = subparsers.add_parser("tiers", help="Cost and latency per model tier from recorded traffic")
+    tiers_parser.add_argument("--log", default=traffic.TRAFFIC_LOG or "traffic.jsonl", help="TRAFFIC_LOG file")
+    tiers_parser.add_argument("--quality-model", default="anthropic/claude-3.7-sonnet")
+    tiers_parser.add_argument("--fast-model", default=None, help="Default: OPENROUTER_FAST_MODEL")
+    tiers_parser.add_argument("--replay", type=int, default=0,
+                              help="Re-run this many recorded prompts per template on each tier (live)")
+
+    prompts_parser = subparsers.add_parser("prompts", help="Tokens saved by composing prompts from applicable sections")
+    prompts_parser.add_argument("--log", default=None, help="TRAFFIC_LOG file (default: typical lesson forms)")
+
+    cache_parser = subparsers.add_parser("cache", help="Cacheable prompt prefixes and cached input tokens")
+    cache_parser.add_argument("--log", default=None, help="TRAFFIC_LOG file (default: template layout only)")
+
+    schema_parser = subparsers.add_parser("schema", help="Full vs compact plan output format")
+    schema_parser.add_argument("--phases", type=int, nargs="+", default=[6, 12, 24])
+    schema_parser.add_argument("--live", action="store_true", help="Also time real model calls (needs API keys)")
+
+    args = parser.parse_args()
+    if args.command == "patch":
+        # Live calls queue behind any interactive traffic in the same process
+        with priority_scope("batch"):
+            _print_rows(benchmark_patch_revision(args.phases, live=args.live))
+    elif args.command == "context":
+        _print_rows(benchmark_revision_context(args.phases))
+    elif args.command == "tiers":
+        from backend.chains import OPENROUTER_FAST_MODEL
+        _print_rows(benchmark_model_tiers(args.log, args.quality_model, args.fast_model or OPENROUTER_FAST_MODEL,
+                                          replay=args.replay))
+    elif args.command == "prompts":
+        _print_rows(benchmark_prompt_sections(args.log))
+    elif args.command == "cache":
+        _print_rows(benchmark_prompt_cache(args.log))
+    elif args.command == "schema":
+        _print_rows(benchmark_plan_schema(args.phases, live=args.live))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Token and cost budgets for model calls.
+
+Every model call records its tokens and estimated cost against three
+scopes: the session, the teacher for the day (when the teacher is known)
+and the whole deployment for the day. Each scope has a token and a cost
+limit (BUDGET_* settings, 0 = unlimited):
+
+- below BUDGET_WARN_FRACTION of every limit the budget is "ok";
+- above it the budget is in "warning": the UI shows a notice, speculative
+  work stops and calls are routed to the fast (cheaper) model tier;
+- at a limit the budget is "exceeded" and further calls are refused with
+  BudgetExceededError.
+
+Counters live in the shared state store (backend/state_store.py), so with
+STATE_BACKEND=sqlite the limits hold across workers and restarts; the
+default in-memory store counts per process.
+
+Only scopes keyed on trusted identities are real limits. The teacher must
+come from the server side (a header set by the authenticating proxy, see
+BUDGET_TEACHER_HEADER), never from the URL. The session id is chosen by the
+client, so a session budget only guards against a runaway session; the
+daily deployment budget is the hard stop.
+"""
+# Standard library imports
+import datetime
+import json
+import os
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Local imports
+from backend import metrics, tokens
+from backend.state_store import get_state_store
+
+# Define public API
+__all__ = [
+    'OK',
+    'WARNING',
+    'EXCEEDED',
+    'MODEL_PRICES',
+    'Limit',
+    'LIMITS',
+    'BUDGET_TEACHER_HEADER',
+    'BudgetExceededError',
+    'estimate_cost',
+    'usage_of',
+    'record',
+    'level',
+    'usage',
+    'check'
+]
+
+OK = "ok"
+WARNING = "warning"
+EXCEEDED = "exceeded"
+
+# USD per million (input, output) tokens
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o": (2.5, 10.0),
+    "openai/gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "openai/gpt-4o-mini": (0.15, 0.6),
+    "anthropic/claude-3.7-sonnet": (3.0, 15.0),
+    "anthropic/claude-3.5-haiku": (0.8, 4.0)
+}
+_DEFAULT_PRICE = (3.0, 15.0)
+
+
+class Limit(NamedTuple):
+    tokens: int
+    cost: float
+
+
+LIMITS: Dict[str, Limit] = {
+    "session": Limit(int(os.getenv("BUDGET_SESSION_TOKENS", "400000")),
+                     float(os.getenv("BUDGET_SESSION_COST", "2"))),
+    "teacher_daily": Limit(int(os.getenv("BUDGET_TEACHER_DAILY_TOKENS", "1500000")),
+                           float(os.getenv("BUDGET_TEACHER_DAILY_COST", "8"))),
+    "daily": Limit(int(os.getenv("BUDGET_DAILY_TOKENS", "0")),
+                   float(os.getenv("BUDGET_DAILY_COST", "100")))
+}
+BUDGET_WARN_FRACTION = float(os.getenv("BUDGET_WARN_FRACTION", "0.8"))
+# Request header naming the authenticated teacher, set by the proxy in front of the app (empty = no teacher budget)
+BUDGET_TEACHER_HEADER = os.getenv("BUDGET_TEACHER_HEADER", "")
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised instead of a model call once a budget is used up"""
+
+
+# Counters of days (and sessions) idle for longer than this are removed
+_COUNTER_RETENTION = 2 * 24 * 3600
+
+_lock = threading.Lock()
+_today = ""
+
+
+def _scopes(session: Optional[str], teacher: Optional[str]) -> List[Tuple[str, str]]:
+    today = datetime.date.today().isoformat()
+    scopes = [("daily", today)]
+    if session:
+        scopes.append(("session", session))
+    if teacher:
+        scopes.append(("teacher_daily", f"{teacher}:{today}"))
+    return scopes
+
+
+def _counter_key(scope: Tuple[str, str]) -> str:
+    return f"budget:{scope[0]}:{scope[1]}"
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Estimated USD cost of a call"""
+    input_price, output_price = MODEL_PRICES.get(model, _DEFAULT_PRICE)
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def usage_of(messages: Any, result: Any) -> Tuple[int, int]:
+    """(input, output) tokens of a call: reported usage, else a local estimate"""
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    if hasattr(result, "model_dump"):
+        output = json.dumps(result.model_dump(), ensure_ascii=False)
+    else:
+        output = getattr(result, "content", result)
+    return tokens.estimate_message_tokens(messages), tokens.estimate_tokens(output)
+
+
+def record(model: str, input_tokens: int, output_tokens: int,
+           session: Optional[str] = None, teacher: Optional[str] = None) -> None:
+    """Count a call's tokens and cost against every scope it belongs to"""
+    global _today
+    tokens = input_tokens + output_tokens
+    cost = estimate_cost(model, input_tokens, output_tokens)
+    today = datetime.date.today().isoformat()
+    store = get_state_store()
+    with _lock:
+        expire = today != _today
+        _today = today
+    if expire:
+        # Counters of earlier days are no longer needed
+        store.expire_counters(_COUNTER_RETENTION)
+    store.increment_counters([_counter_key(scope) for scope in _scopes(session, teacher)],
+                             {"tokens": tokens, "cost": cost})
+    metrics.increment("budget.tokens", tokens)
+    metrics.increment("budget.cost_usd", cost)
+
+
+def usage(session: Optional[str] = None, teacher: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """Usage of each scope with its limits and the used fraction of the tighter one"""
+    scopes = _scopes(session, teacher)
+    stored = get_state_store().read_counters([_counter_key(scope) for scope in scopes])
+    report = {}
+    for scope in scopes:
+        counters = {"tokens": 0, "cost": 0.0, **stored.get(_counter_key(scope), {})}
+        limit = LIMITS[scope[0]]
+        fractions = [counters["tokens"] / limit.tokens if limit.tokens else 0.0,
+                     counters["cost"] / limit.cost if limit.cost else 0.0]
+        report[scope[0]] = {**counters, "limit_tokens": limit.tokens, "limit_cost": limit.cost,
+                            "fraction": max(fractions)}
+    return report
+
+
+def level(session: Optional[str] = None, teacher: Optional[str] = None) -> str:
+    """OK, WARNING or EXCEEDED, whichever scope is closest to its limit"""
+    fraction = max((scope["fraction"] for scope in usage(session, teacher).values()), default=0.0)
+    if fraction >= 1:
+        return EXCEEDED
+    if fraction >= BUDGET_WARN_FRACTION:
+        return WARNING
+    return OK
+
+
+def check(session: Optional[str] = None, teacher: Optional[str] = None) -> str:
+    """Return the budget level, raising if a budget is used up
+
+    Raises:
+        BudgetExceededError: If any scope reached its limit
+    """
+    current = level(session, teacher)
+    if current == EXCEEDED:
+        metrics.increment("budget.blocked")
+        raise BudgetExceededError(
+            "The usage limit for AI generation has been reached. Please try again later "
+            "or ask your administrator to raise the limit.")
+    return current
@@ -0,0 +1,118 @@
+"""
+Context of the model call being made.
+
+Policies below the chain layer (hedging, routing, scheduling) need to know
+which template a call belongs to, how urgent it is, which model tier it
+should use, how its prompt was assembled and on whose behalf it is made,
+without every caller passing that through. The values live in
+context variables, so they follow the code that sets them and never leak
+between threads or sessions. Work handed to another thread keeps the
+values only if it is wrapped with bind().
+"""
+# Standard library imports
+import contextvars
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Define public API
+__all__ = [
+    'current_template',
+    'template_scope',
+    'current_priority',
+    'priority_scope',
+    'current_tier',
+    'tier_scope',
+    'current_prompt_stats',
+    'prompt_stats_scope',
+    'current_tenant',
+    'current_teacher',
+    'set_tenant',
+    'bind'
+]
+
+_template: ContextVar[Optional[str]] = ContextVar("template", default=None)
+_priority: ContextVar[Optional[str]] = ContextVar("priority", default=None)
+_tier: ContextVar[Optional[str]] = ContextVar("tier", default=None)
+_prompt_stats: ContextVar[Optional[Dict[str, Any]]] = ContextVar("prompt_stats", default=None)
+_tenant: ContextVar[Optional[str]] = ContextVar("tenant", default=None)
+_teacher: ContextVar[Optional[str]] = ContextVar("teacher", default=None)
+
+
+@contextmanager
+def _scope(var: ContextVar, value: Any) -> Iterator[None]:
+    token = var.set(value)
+    try:
+        yield
+    finally:
+        var.reset(token)
+
+
+def current_template() -> str:
+    """Name of the template being invoked ("unknown" outside a chain)"""
+    return _template.get() or "unknown"
+
+
+def template_scope(name: str):
+    """Attribute model calls made inside the block to template name"""
+    return _scope(_template, name)
+
+
+def current_priority() -> Optional[str]:
+    """Priority class set by the caller, or None to derive it from the template"""
+    return _priority.get()
+
+
+def priority_scope(priority: str):
+    """Run model calls made inside the block in the given priority class"""
+    return _scope(_priority, priority)
+
+
+def current_tier() -> Optional[str]:
+    """Model tier requested for the call, or None for the template's default"""
+    return _tier.get()
+
+
+def tier_scope(tier: str):
+    """Run model calls made inside the block on the given model tier"""
+    return _scope(_tier, tier)
+
+
+def current_prompt_stats() -> Optional[Dict[str, Any]]:
+    """Estimated size of the chain's prompt and what was left out of it, if known"""
+    return _prompt_stats.get()
+
+
+def prompt_stats_scope(stats: Dict[str, Any]):
+    """Attach prompt statistics to the model calls made inside the block"""
+    return _scope(_prompt_stats, stats)
+
+
+def current_tenant() -> str:
+    """Who the call is made for (a session id; "default" if unset)"""
+    return _tenant.get() or "default"
+
+
+def current_teacher() -> Optional[str]:
+    """The teacher the session belongs to, if known"""
+    return _teacher.get()
+
+
+def set_tenant(tenant: str, teacher: Optional[str] = None) -> None:
+    """Make tenant (and teacher) the owner of model calls for the rest of the current context"""
+    _tenant.set(tenant)
+    _teacher.set(teacher)
+
+
+def bind(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap fn to run with the current context values on any thread
+
+    Each call runs in its own copy, so the wrapper may be used by several
+    threads at once.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
@@ -6,78 +6,449 @@ import os
 import openai
 from langchain.llms import OpenAI
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
 from langchain.chat_models import ChatOpenAI
 from langchain_openai import ChatOpenAI
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import AIMessage, HumanMessage
+from pydantic import ValidationError
 
 # Local imports
+from backend import metrics, prompt_cache, tokens
+from backend.call_context import current_tier, prompt_stats_scope, template_scope, tier_scope
+from backend.prompt_composer import ComposedPrompt
+from backend.routing import FAST_TIER, QUALITY_TIER, Backend, RoutedLLM
+from backend.plan_utils import COMPACT_PLAN_OUTPUT
+from backend.schemas import (
+    CompactPhaseListResult,
+    CompactPlanResult,
+    CritiqueResult,
+    PhaseListResult,
+    PlanPatch,
+    PlanResult,
+    QuizResult
+)
 from backend.prompts import (
     BROAD_PLAN_DRAFT_TEMPLATE,
+    COMPLETE_PHASES_TEMPLATE,
     CRITIQUE_TEMPLATE,
+    CRITIQUE_FOLLOWUP_TEMPLATE,
+    CRITIQUE_DIMENSION_TEMPLATE,
     REVISE_SELECTED_TEMPLATE,
+    REVISE_SELECTED_PATCH_TEMPLATE,
     PRECISE_REVISION_TEMPLATE,
+    PRECISE_REVISION_PATCH_TEMPLATE,
     QUIZ_GENERATION_TEMPLATE,
     CODE_PRACTICE_GENERATION_TEMPLATE,
-    SLIDES_GENERATION_TEMPLATE
+    SLIDES_GENERATION_TEMPLATE,
+    MULTI_ARTIFACT_TEMPLATE
 )
 
 # Define public API
 __all__ = [
     'get_llm',
     'get_openrouter_llm',
+    'LessonChain',
     'create_broad_plan_draft_chain',
+    'create_complete_phases_chain',
+    'create_critique_chain',
+    'create_followup_critique_chain',
+    'create_dimension_critique_chain',
     'create_revise_selected_plan_chain',
+    'create_revise_selected_patch_chain',
     'create_precise_revision_chain',
-    'create_artifact_chain'
+    'create_precise_revision_patch_chain',
+    'create_artifact_chain',
+    'create_multi_artifact_chain'
 ]
 
-def get_llm(model_name="gpt-4o", temperature=0.5):
-    """Return a ChatOpenAI LLM."""
-    return ChatOpenAI(model_name=model_name, temperature=temperature)
+# Model on the other provider that backs up a call (see backend/routing.py)
+OPENAI_ALTERNATE_MODEL = os.getenv("OPENAI_ALTERNATE_MODEL", "gpt-4o")
+OPENROUTER_ALTERNATE_MODEL = os.getenv("OPENROUTER_ALTERNATE_MODEL", "anthropic/claude-3.7-sonnet")
+# Cheaper, faster models of each provider
+OPENAI_FAST_MODEL = os.getenv("OPENAI_FAST_MODEL", "gpt-4o-mini")
+OPENROUTER_FAST_MODEL = os.getenv("OPENROUTER_FAST_MODEL", "anthropic/claude-3.5-haiku")
 
-def get_openrouter_llm(model_name="openai/gpt-4o", temperature=0):
-    """
-    Return a ChatOpenAI LLM for OpenRouter.
-    """
-    return ChatOpenAI(
+def _openai_backend(model_name, temperature):
+    # Retries are left to backend/rate_limit.py, which shares backoff across sessions
+    return Backend("openai", model_name, ChatOpenAI(model_name=model_name, temperature=temperature, max_retries=0))
+
+def _openrouter_backend(model_name, temperature):
+    return Backend("openrouter", model_name, ChatOpenAI(
         openai_api_base="https://openrouter.ai/api/v1",  
         openai_api_key=os.getenv("OPEN_ROUTER_API_KEY"),  
         model_name=model_name,
         # model_name='deepseek/deepseek-r1:free',
-        temperature=temperature
-    )
+        temperature=temperature,
+        max_retries=0
+    ))
+
+def get_llm(model_name="gpt-4o", temperature=0.5):
+    """Return an OpenAI chat model, with OpenRouter as the alternate provider."""
+    return RoutedLLM({
+        QUALITY_TIER: [_openai_backend(model_name, temperature),
+                       _openrouter_backend(OPENROUTER_ALTERNATE_MODEL, temperature)],
+        FAST_TIER: [_openai_backend(OPENAI_FAST_MODEL, temperature),
+                    _openrouter_backend(OPENROUTER_FAST_MODEL, temperature)]
+    })
+
+def get_openrouter_llm(model_name="openai/gpt-4o", temperature=0):
+    """
+    Return an OpenRouter chat model, with OpenAI as the alternate provider.
+    """
+    return RoutedLLM({
+        QUALITY_TIER: [_openrouter_backend(model_name, temperature),
+                       _openai_backend(OPENAI_ALTERNATE_MODEL, temperature)],
+        FAST_TIER: [_openrouter_backend(OPENROUTER_FAST_MODEL, temperature),
+                    _openai_backend(OPENAI_FAST_MODEL, temperature)]
+    })
+
+def _parse_tiers(value):
+    """Parse "template=tier,..." into a dict"""
+    tiers = {}
+    for item in value.split(","):
+        name, _, tier = item.partition("=")
+        if name.strip() and tier.strip():
+            tiers[name.strip()] = tier.strip()
+    return tiers
+
+# Model tier of each chain (by LessonChain name); unlisted chains use the quality tier.
+# Short, well-structured outputs do not need the strongest model.
+TEMPLATE_TIERS = {
+    "critique_dimension": FAST_TIER,
+    "critique_followup": FAST_TIER,
+    "precise_revision_patch": FAST_TIER,
+    "quiz": FAST_TIER,
+    **_parse_tiers(os.getenv("MODEL_TIERS", ""))
+}
+
+# With COMPACT_PLAN_OUTPUT=1 plans are generated in the compact wire format and expanded by to_output()
+# (see backend/plan_utils.py)
+_PLAN_SCHEMA = CompactPlanResult if COMPACT_PLAN_OUTPUT else PlanResult
+_PHASE_LIST_SCHEMA = CompactPhaseListResult if COMPACT_PLAN_OUTPUT else PhaseListResult
+
+# Structured output (tool calling) is used whenever the model supports it.
+# Set STRUCTURED_OUTPUT=0 to force the plain text path for every chain.
+STRUCTURED_OUTPUT_ENABLED = os.getenv("STRUCTURED_OUTPUT", "1") != "0"
+
+# Failures of the structured call that the text completion can recover from:
+# the model or provider does not do tool calling, or its arguments do not
+# parse or validate. Anything else (budget stops, preemption, provider
+# outages, rate limits) is raised; repeating the request would not help.
+_STRUCTURED_OUTPUT_ERRORS = (
+    OutputParserException,
+    ValidationError,
+    ValueError,
+    NotImplementedError,
+    openai.BadRequestError
+)
+
+# Maximum follow-up requests used to finish a completion cut off by the output token limit
+MAX_CONTINUATION_ROUNDS = int(os.getenv("MAX_CONTINUATION_ROUNDS", "2"))
+
+# finish_reason (OpenAI-compatible) / stop_reason (Anthropic) values for a length cut-off
+_LENGTH_STOP_REASONS = ("length", "max_tokens")
+
+CONTINUATION_PROMPT = (
+    "Your previous response was cut off by the output length limit. "
+    "Continue EXACTLY from the last character you wrote. Do not repeat any earlier text, "
+    "do not restart the JSON and do not add any commentary or code fences."
+)
+
+# Longest overlap checked when the continuation repeats the end of the previous piece
+_MAX_STITCH_OVERLAP = 500
+_MIN_STITCH_OVERLAP = 8
+
+
+def _looks_like_json(text):
+    """Return True if text parses as JSON after stripping a ```json fence"""
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0]
+    try:
+        json.loads(text.strip())
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+def _was_truncated(response):
+    """Return True if the response stopped because it hit the output token limit"""
+    metadata = getattr(response, "response_metadata", None) or {}
+    reason = metadata.get("finish_reason") or metadata.get("stop_reason")
+    return reason in _LENGTH_STOP_REASONS
+
 
-def create_broad_plan_draft_chain(llm):
+def _stitch(head, tail):
+    """Append a continuation to head, dropping any text the model repeated"""
+    stripped = tail.lstrip()
+    if stripped.startswith("```"):
+        # The model reopened a code fence; drop the fence line
+        stripped = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+        tail = stripped
+    for size in range(min(len(head), len(tail), _MAX_STITCH_OVERLAP), _MIN_STITCH_OVERLAP - 1, -1):
+        if head.endswith(tail[:size]):
+            return head + tail[size:]
+    return head + tail
+
+
+class LessonChain:
+    """
+    Prompt + LLM chain with an optional structured-output path.
+
+    invoke() mirrors LLMChain.invoke: it returns the inputs plus output_key.
+    With a schema the provider is asked for a validated object through tool
+    calling, and output_key holds plain dicts/lists in the usual plan shape.
+    If the model lacks tool calling or its structured output does not parse, the
+    chain falls back to the text completion and output_key holds the raw string.
+    Other errors (budget stops, preemption, unavailable providers) propagate.
+
+    A text completion cut off by the output token limit is resumed with up to
+    max_continuations follow-up requests, and the pieces are stitched together.
+
+    Model calls are attributed to name (default: output_key), which routing
+    policies use to keep per-template statistics and budgets. They run on
+    tier (default: TEMPLATE_TIERS[name]) unless the caller chose a tier with
+    call_context.tier_scope().
+
+    prompt may be a ComposedPrompt, which drops the sections that do not
+    apply to the inputs. Inputs are trimmed to the template's prompt token
+    budget before formatting (see backend/tokens.py); the returned inputs are
+    the originals.
+    """
+
+    def __init__(self, llm, prompt, output_key, schema=None, structured=None, max_continuations=0, name=None,
+                 tier=None):
+        self.llm = llm
+        self.prompt = prompt
+        self.output_key = output_key
+        self.name = name or output_key
+        self.tier = tier or TEMPLATE_TIERS.get(self.name, QUALITY_TIER)
+        self.schema = schema
+        self.max_continuations = max_continuations
+        self.structured_llm = None
+
+        if structured is None:
+            structured = STRUCTURED_OUTPUT_ENABLED
+        if schema is not None and structured:
+            try:
+                # Function calling is the most widely supported mode across providers
+                self.structured_llm = llm.with_structured_output(schema, method="function_calling")
+            except (AttributeError, NotImplementedError):
+                metrics.increment("structured_output.unsupported")
+
+    def invoke(self, inputs):
+        with template_scope(self.name), tier_scope(current_tier() or self.tier):
+            return self._invoke(inputs)
+
+    def _messages(self, inputs):
+        """Prompt messages for inputs, with the prompt's estimated size recorded
+
+        Returns:
+            tuple: (messages, stats for the traffic log)
+        """
+        prompt = self.prompt.compose(inputs) if isinstance(self.prompt, ComposedPrompt) else self.prompt
+        fit = tokens.fit_inputs(self.name, prompt.template, inputs)
+        # Static text of sections left out for these inputs
+        saved = tokens.template_tokens(self.prompt.template) - tokens.template_tokens(prompt.template)
+        metrics.observe(f"prompt.{self.name}.tokens", fit.tokens)
+        if saved:
+            metrics.increment(f"prompt.{self.name}.sections_saved_tokens", saved)
+        if fit.trimmed:
+            metrics.increment("prompt.trimmed")
+            metrics.increment(f"prompt.{self.name}.trimmed")
+        if fit.budget and fit.tokens > fit.budget:
+            metrics.increment(f"prompt.{self.name}.over_budget")
+        # Calls of the template share everything before the first input
+        prefix = prompt_cache.static_prefix(prompt.template)
+        stats = {"tokens": fit.tokens, "sections_saved_tokens": saved, "trimmed": fit.trimmed,
+                 "prefix_chars": len(prefix), "prefix_tokens": tokens.estimate_tokens(prefix)}
+        metrics.observe(f"prompt.{self.name}.prefix_ratio", stats["prefix_tokens"] / max(1, fit.tokens))
+        return prompt.format_prompt(**fit.inputs).to_messages(), stats
+
+    def _invoke(self, inputs):
+        messages, stats = self._messages(inputs)
+        with prompt_stats_scope(stats):
+            return self._complete(inputs, messages)
+
+    def _complete(self, inputs, messages):
+        if self.structured_llm is not None:
+            try:
+                result = self.structured_llm.invoke(messages)
+                if result is None:
+                    raise ValueError("Model returned no structured output")
+                # Each success is a text parse (and possible regeneration) avoided
+                metrics.increment("structured_output.success")
+                metrics.increment(f"structured_output.{self.output_key}.success")
+                return {**inputs, self.output_key: result.to_output()}
+            except _STRUCTURED_OUTPUT_ERRORS:
+                metrics.increment("structured_output.fallback")
+                metrics.increment(f"structured_output.{self.output_key}.fallback")
+
+        text = self._generate_text(messages)
+        if self.schema is not None:
+            metrics.increment("text_output.json_calls")
+            if not _looks_like_json(text):
+                # Outputs like this used to end in an error and a full regeneration
+                metrics.increment("text_output.parse_failed")
+                metrics.increment(f"text_output.{self.output_key}.parse_failed")
+        return {**inputs, self.output_key: text}
+
+    def _generate_text(self, messages):
+        """Run the text completion, continuing it if it hit the output token limit"""
+        response = self.llm.invoke(messages)
+        text = response.content
+
+        rounds = 0
+        while _was_truncated(response):
+            if rounds >= self.max_continuations:
+                metrics.increment("continuation.capped")
+                break
+            rounds += 1
+            metrics.increment("continuation.rounds")
+            metrics.increment(f"continuation.{self.output_key}.rounds")
+            response = self.llm.invoke(messages + [
+                AIMessage(content=text),
+                HumanMessage(content=CONTINUATION_PROMPT)
+            ])
+            text = _stitch(text, response.content)
+        return text
+
+
+def create_broad_plan_draft_chain(llm, structured=None):
     """
     Create a single chain for drafting a broad plan.
     No critique/revise is needed here.
     """
-    return LLMChain(
+    return LessonChain(
         llm=llm,
         prompt=BROAD_PLAN_DRAFT_TEMPLATE,
-        output_key="broad_plan_draft"
+        output_key="broad_plan_draft",
+        schema=_PLAN_SCHEMA,
+        structured=structured,
+        max_continuations=MAX_CONTINUATION_ROUNDS
+    )
+
+def create_complete_phases_chain(llm, structured=None):
+    """
+    Create a chain that writes only the phases missing from a truncated plan.
+
+    Args:
+        llm: Language model for generation
+        structured: Override for the structured-output path
+
+    Returns:
+        LessonChain: Chain whose "remaining_phases" output is {"outline": [...]} (or raw text on fallback)
+    """
+    return LessonChain(
+        llm=llm,
+        prompt=COMPLETE_PHASES_TEMPLATE,
+        output_key="remaining_phases",
+        schema=_PHASE_LIST_SCHEMA,
+        structured=structured
     )
 
-def create_revise_selected_plan_chain(llm):
+def create_critique_chain(llm, structured=None):
+    """
+    Create a chain that critiques a lesson plan.
+
+    Args:
+        llm: Language model for critique
+        structured: Override for the structured-output path (defaults to STRUCTURED_OUTPUT_ENABLED)
+
+    Returns:
+        LessonChain: Chain whose "critique" output is a list of critique points (or raw text on fallback)
+    """
+    return LessonChain(
+        llm=llm,
+        prompt=CRITIQUE_TEMPLATE,
+        output_key="critique",
+        schema=CritiqueResult,
+        structured=structured
+    )
+
+def create_followup_critique_chain(llm, structured=None):
+    """
+    Create a chain that critiques only the phases changed since the last critique.
+
+    Args:
+        llm: Language model for critique
+        structured: Override for the structured-output path
+
+    Returns:
+        LessonChain: Chain whose "critique" output is a list of new critique points (or raw text on fallback)
+    """
+    return LessonChain(
+        llm=llm,
+        prompt=CRITIQUE_FOLLOWUP_TEMPLATE,
+        output_key="critique",
+        name="critique_followup",
+        schema=CritiqueResult,
+        structured=structured
+    )
+
+def create_dimension_critique_chain(llm, structured=None):
+    """
+    Create a chain that critiques a lesson plan for one evaluation dimension.
+
+    Args:
+        llm: Language model for critique
+        structured: Override for the structured-output path
+
+    Returns:
+        LessonChain: Chain whose "critique" output is a list of critique points (or raw text on fallback)
+    """
+    return LessonChain(
+        llm=llm,
+        prompt=CRITIQUE_DIMENSION_TEMPLATE,
+        output_key="critique",
+        name="critique_dimension",
+        schema=CritiqueResult,
+        structured=structured
+    )
+
+def create_revise_selected_plan_chain(llm, structured=None):
     """
     Create a chain for revising a broad plan based on user-selected critique points.
     
     Args:
         llm: Language model for revision
+        structured: Override for the structured-output path
         
     Returns:
-        LLMChain: The revise chain that can be used to improve plans based on selected critique points
+        LessonChain: The revise chain that can be used to improve plans based on selected critique points
     """
     # Create revision chain for selected critique points
-    revise_selected_chain = LLMChain(
+    revise_selected_chain = LessonChain(
         llm=llm,
         prompt=REVISE_SELECTED_TEMPLATE,
-        output_key="revised_plan"
+        output_key="revised_plan",
+        schema=_PLAN_SCHEMA,
+        structured=structured,
+        max_continuations=MAX_CONTINUATION_ROUNDS
     )
     
     return revise_selected_chain
 
-def create_precise_revision_chain(llm):
+def create_revise_selected_patch_chain(llm, structured=None):
+    """
+    Create a chain that applies selected critique points to a window of phases.
+
+    Args:
+        llm: Language model for revision
+        structured: Override for the structured-output path
+
+    Returns:
+        LessonChain: Chain whose "plan_patch" output is a patch for the phases shown (or raw text on fallback)
+    """
+    return LessonChain(
+        llm=llm,
+        prompt=REVISE_SELECTED_PATCH_TEMPLATE,
+        output_key="plan_patch",
+        name="revise_selected_patch",
+        schema=PlanPatch,
+        structured=structured
+    )
+
+def create_precise_revision_chain(llm, structured=None):
     """
     Create a chain for making precise, targeted revisions to a lesson plan.
     This chain ensures that only the specific changes requested by the user are applied,
@@ -85,43 +456,89 @@ def create_precise_revision_chain(llm):
     
     Args:
         llm: Language model for revision
+        structured: Override for the structured-output path
         
     Returns:
-        LLMChain: The chain for precise revision
+        LessonChain: The chain for precise revision
     """
-    return LLMChain(
+    return LessonChain(
         llm=llm,
         prompt=PRECISE_REVISION_TEMPLATE,
-        output_key="precisely_revised_plan"
+        output_key="precisely_revised_plan",
+        schema=_PLAN_SCHEMA,
+        structured=structured,
+        max_continuations=MAX_CONTINUATION_ROUNDS
+    )
+
+def create_precise_revision_patch_chain(llm, structured=None):
+    """
+    Create a chain for precise revisions that returns only the changed phases.
+
+    The output is a patch (see backend/plan_patch.py) to be applied locally,
+    so output size scales with the edit instead of the plan.
+
+    Args:
+        llm: Language model for revision
+        structured: Override for the structured-output path
+
+    Returns:
+        LessonChain: Chain whose "plan_patch" output is the patch (or raw text on fallback)
+    """
+    return LessonChain(
+        llm=llm,
+        prompt=PRECISE_REVISION_PATCH_TEMPLATE,
+        output_key="plan_patch",
+        name="precise_revision_patch",
+        schema=PlanPatch,
+        structured=structured
     )
 
-def create_artifact_chain(llm, artifact_type: str):
+def create_artifact_chain(llm, artifact_type: str, structured=None):
     """Create a chain for generating specific type of artifact
     
     Args:
         llm: The language model to use
         artifact_type: Type of artifact to generate ('quiz', 'code_practice', or 'slides')
+        structured: Override for the structured-output path (quiz only; the others are Markdown)
         
     Returns:
-        LLMChain for the specified artifact type
+        LessonChain for the specified artifact type
     """
     if artifact_type == "quiz":
-        return LLMChain(
+        return LessonChain(
             llm=llm,
             prompt=QUIZ_GENERATION_TEMPLATE,
-            output_key="quiz"
+            output_key="quiz",
+            schema=QuizResult,
+            structured=structured
         )
     elif artifact_type == "code_practice":
-        return LLMChain(
+        return LessonChain(
             llm=llm,
             prompt=CODE_PRACTICE_GENERATION_TEMPLATE,
             output_key="code_practice"
         )
     elif artifact_type == "slides":
-        return LLMChain(
+        return LessonChain(
             llm=llm,
             prompt=SLIDES_GENERATION_TEMPLATE,
             output_key="slides"
         )
     else:
-        raise ValueError(f"Unsupported artifact type: {artifact_type}")
\ No newline at end of file
+        raise ValueError(f"Unsupported artifact type: {artifact_type}")
+
+def create_multi_artifact_chain(llm):
+    """Create a chain that generates several artifact types for one phase in one completion
+
+    Args:
+        llm: The language model to use
+
+    Returns:
+        LessonChain whose "materials" output holds one marked section per artifact
+    """
+    return LessonChain(
+        llm=llm,
+        prompt=MULTI_ARTIFACT_TEMPLATE,
+        output_key="materials",
+        max_continuations=MAX_CONTINUATION_ROUNDS
+    )
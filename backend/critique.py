@@ -0,0 +1,289 @@
+"""
+Incremental critique bookkeeping.
+
+Critique points are cached together with content hashes of the phases they
+concern. On a follow-up critique only phases whose content changed are sent
+to the model (with a summary of the rest); cached points whose phases are
+untouched and unmoved stay valid and are merged with the new ones. The cache
+is plain JSON-serializable data so it can live in the session state.
+"""
+# Standard library imports
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Local imports
+from backend import metrics
+from backend.call_context import bind
+from backend.chains import create_critique_chain, create_followup_critique_chain
+from backend.json_repair import parse_llm_json
+from backend.plan_context import (
+    build_plan_context,
+    context_window,
+    find_referenced_phases,
+    is_global_request,
+    strip_artifacts
+)
+
+# Define public API
+__all__ = [
+    'INCREMENTAL_MAX_CHANGED_FRACTION',
+    'CRITIQUE_DIMENSIONS',
+    'CritiqueParseError',
+    'normalize_critique_points',
+    'is_duplicate_point',
+    'stream_dimension_critiques',
+    'phase_hash',
+    'plan_hashes',
+    'plan_hash',
+    'run_critique',
+    'build_critique_cache',
+    'changed_phases',
+    'retained_points',
+    'forget_points'
+]
+
+# Above this share of changed phases a full critique is as cheap and more coherent
+INCREMENTAL_MAX_CHANGED_FRACTION = 0.5
+
+# Metadata that does not change what a critique would say about a phase
+_IGNORED_FIELDS = ("summary of changes",)
+
+# (name, criteria) of the evaluation dimensions critiqued concurrently
+CRITIQUE_DIMENSIONS: Tuple[Tuple[str, str], ...] = (
+    ("Content Quality",
+     "clarity of instructions, alignment with learning objectives, appropriateness of activities"),
+    ("Implementation",
+     "time management, resource utilization, activity transitions"),
+    ("Student Engagement",
+     "activity variety, interaction opportunities, learning assessment methods")
+)
+
+# Word overlap (Jaccard) above which two points are treated as the same issue
+_DUPLICATE_SIMILARITY = 0.6
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _digest(value: Any) -> str:
+    canonical = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def phase_hash(phase: Dict[str, Any]) -> str:
+    """Hash of the critique-relevant content of a phase"""
+    content = {key: value for key, value in strip_artifacts(phase).items() if key not in _IGNORED_FIELDS}
+    return _digest(content)
+
+
+def plan_hashes(plan: Dict[str, Any]) -> List[str]:
+    return [phase_hash(phase) for phase in plan.get("outline", [])]
+
+
+def plan_hash(plan: Dict[str, Any]) -> str:
+    """Hash of the critique-relevant content of the whole plan"""
+    return _digest([plan.get("objectives", []), plan_hashes(plan)])
+
+
+def _position_key(index: int, value: str) -> str:
+    # Points name phases by number, so a phase that moved invalidates them too
+    return f"{index}:{value}"
+
+
+def _point_text(point: Dict[str, Any]) -> str:
+    return f"{point.get('issue', '')} {point.get('suggestion', '')}"
+
+
+class CritiqueParseError(ValueError):
+    """Raised when critique output cannot be parsed; raw holds the model output"""
+
+    def __init__(self, message: str, raw: Any):
+        super().__init__(message)
+        self.raw = raw
+
+
+def _parse_points(output: Any) -> List[Dict[str, Any]]:
+    try:
+        return normalize_critique_points(parse_llm_json(output).data)
+    except ValueError as e:
+        raise CritiqueParseError(str(e), output) from e
+
+
+def normalize_critique_points(data: Any) -> List[Dict[str, Any]]:
+    """Keep the complete points of parsed critique output (a list or {"points": [...]})"""
+    if isinstance(data, dict):
+        data = data.get("points", [])
+    if not isinstance(data, list):
+        return []
+    return [
+        point for point in data
+        if isinstance(point, dict) and "id" in point and "issue" in point and "suggestion" in point
+    ]
+
+
+def _words(point: Dict[str, Any]) -> set:
+    return {word for word in _WORD_PATTERN.findall(_point_text(point).lower()) if len(word) > 3}
+
+
+def is_duplicate_point(point: Dict[str, Any], others: Sequence[Dict[str, Any]]) -> bool:
+    """Return True if point raises the same issue as one of others"""
+    words = _words(point)
+    for other in others:
+        other_words = _words(other)
+        if words and other_words and len(words & other_words) / len(words | other_words) >= _DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+
+def stream_dimension_critiques(critique_dimension: Callable[[str, str], List[Dict[str, Any]]],
+                               dimensions: Sequence[Tuple[str, str]] = CRITIQUE_DIMENSIONS,
+                               failed: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Critique every dimension concurrently and yield unique points as they arrive
+
+    A dimension that fails does not stop the others; its name is appended to
+    failed, so the caller can tell the critique is incomplete.
+
+    Args:
+        critique_dimension: Called as critique_dimension(name, criteria) in a worker
+            thread; returns that dimension's points
+        dimensions: The dimensions to critique
+        failed: List that receives the names of failed dimensions
+
+    Yields:
+        Points in completion order, without duplicates of earlier points
+    """
+    seen: List[Dict[str, Any]] = []
+    with ThreadPoolExecutor(max_workers=len(dimensions)) as executor:
+        futures = {executor.submit(bind(critique_dimension), name, criteria): name for name, criteria in dimensions}
+        for future in as_completed(futures):
+            try:
+                points = future.result()
+            except Exception:
+                # The other dimensions still produce useful points
+                metrics.increment("critique.dimension_failed")
+                if failed is not None:
+                    failed.append(futures[future])
+                continue
+            for point in points:
+                if is_duplicate_point(point, seen):
+                    metrics.increment("critique.duplicate_points")
+                    continue
+                seen.append(point)
+                yield point
+
+
+def build_critique_cache(plan: Dict[str, Any], points: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Record critique points with the positions and hashes of the phases they refer to
+
+    Points that concern the plan as a whole, or name no phase, are stored with
+    phases=None and are only reused while the plan is unchanged.
+    """
+    hashes = plan_hashes(plan)
+    cached_points = []
+    for point in points:
+        text = _point_text(point)
+        referenced = find_referenced_phases(plan, text)
+        phases = None
+        if referenced and not is_global_request(text):
+            phases = [_position_key(i, hashes[i]) for i in sorted(referenced)]
+        cached_points.append({"issue": point["issue"], "suggestion": point["suggestion"], "phases": phases})
+    return {
+        "objectives": _digest(plan.get("objectives", [])),
+        "phases": hashes,
+        "points": cached_points
+    }
+
+
+def changed_phases(cache: Optional[Dict[str, Any]], plan: Dict[str, Any]) -> Optional[List[int]]:
+    """Indices of phases whose content is new since the cached critique
+
+    Returns:
+        [] if nothing changed, the changed indices for an incremental critique,
+        or None if a full critique is needed (no cache, new objectives, phases
+        only deleted or reordered, or too much changed)
+    """
+    if not cache or cache.get("objectives") != _digest(plan.get("objectives", [])):
+        return None
+    hashes = plan_hashes(plan)
+    known = set(cache.get("phases", []))
+    changed = [i for i, value in enumerate(hashes) if value not in known]
+    if not changed and hashes != cache.get("phases"):
+        # Only deletions or reordering: transitions need a fresh look
+        return None
+    if hashes and len(changed) > INCREMENTAL_MAX_CHANGED_FRACTION * len(hashes):
+        return None
+    return changed
+
+
+def retained_points(cache: Optional[Dict[str, Any]], plan: Dict[str, Any],
+                    unchanged: bool = False) -> List[Dict[str, Any]]:
+    """Cached points that still apply to the plan
+
+    Args:
+        cache: The critique cache
+        plan: The current plan
+        unchanged: The plan is identical to the critiqued one, so global points apply too
+
+    Returns:
+        Points with "issue" and "suggestion" (ids are assigned by the caller)
+    """
+    if not cache:
+        return []
+    current = {_position_key(i, value) for i, value in enumerate(plan_hashes(plan))}
+    points = []
+    for point in cache.get("points", []):
+        phases = point.get("phases")
+        if (phases is None and unchanged) or (phases is not None and set(phases) <= current):
+            points.append({"issue": point["issue"], "suggestion": point["suggestion"]})
+    return points
+
+
+def forget_points(cache: Optional[Dict[str, Any]], points: List[Dict[str, Any]]) -> None:
+    """Drop points that were applied so they are not suggested again"""
+    if not cache:
+        return
+    applied = {(point.get("issue"), point.get("suggestion")) for point in points}
+    cache["points"] = [
+        point for point in cache.get("points", [])
+        if (point["issue"], point["suggestion"]) not in applied
+    ]
+
+
+def run_critique(llm, plan: Dict[str, Any], cache: Optional[Dict[str, Any]],
+                 known_issues: str) -> Tuple[List[Dict[str, Any]], str]:
+    """Critique a plan, re-analyzing only phases changed since the cached critique
+
+    Safe to call from a worker thread.
+
+    Args:
+        llm: Language model for critique
+        plan: The plan being critiqued
+        cache: Critique cache of the previous critique, if any
+        known_issues: Findings of the rule-based checks, formatted for the prompt
+
+    Returns:
+        Tuple of (points without ids, mode), mode being "cache_hit", "incremental" or "full"
+
+    Raises:
+        CritiqueParseError: If the model output cannot be parsed
+    """
+    changed = changed_phases(cache, plan)
+    if changed == []:
+        # Nothing changed since the last critique: reuse it without a model call
+        return retained_points(cache, plan, unchanged=True), "cache_hit"
+
+    if changed:
+        previous_points = retained_points(cache, plan)
+        result = create_followup_critique_chain(llm).invoke({
+            "plan_context": build_plan_context(plan, context_window(plan, "", changed)),
+            "previous_points": json.dumps(previous_points, ensure_ascii=False) if previous_points else "None.",
+            "known_issues": known_issues
+        })
+        return previous_points + _parse_points(result["critique"]), "incremental"
+
+    result = create_critique_chain(llm).invoke({
+        "broad_plan_json": json.dumps({"broad_plan": plan}, ensure_ascii=False),
+        "known_issues": known_issues
+    })
+    return _parse_points(result["critique"]), "full"
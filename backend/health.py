@@ -0,0 +1,243 @@
+"""
+Per-backend health tracking and circuit breaking.
+
+Every model call reports its outcome and latency here, keyed by
+"provider:model". A backend whose calls keep failing (CIRCUIT_FAILURES in a
+row, or an error rate of CIRCUIT_ERROR_RATE over the recent window) has its
+circuit opened: routing skips it for CIRCUIT_COOLDOWN seconds. After that
+the circuit is half-open: a single call is admitted as a probe (acquire())
+while every other call is turned away, so a backend that is still unwell
+only sees that one request. Success closes the circuit, failure opens it
+again; any other outcome frees the probe for the next call (release()).
+
+A backend is also reported as degraded while its recent latency is
+CIRCUIT_SLOW_FACTOR times its own long-run average, so routing can prefer
+the alternate without waiting for timeouts.
+"""
+# Standard library imports
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+# Third-party imports
+import openai
+
+# Local imports
+from backend import metrics
+
+# Define public API
+__all__ = [
+    'CLOSED',
+    'OPEN',
+    'HALF_OPEN',
+    'ProviderUnavailableError',
+    'is_provider_failure',
+    'record_success',
+    'record_failure',
+    'acquire',
+    'release',
+    'state',
+    'is_available',
+    'is_degraded',
+    'route',
+    'snapshot',
+    'reset'
+]
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "5"))
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "30"))
+CIRCUIT_SLOW_FACTOR = float(os.getenv("CIRCUIT_SLOW_FACTOR", "3"))
+
+# Outcomes considered for the error rate, and how many are needed first
+_WINDOW = 20
+_MIN_CALLS = 10
+# Smoothing of the recent and long-run latency averages
+_FAST_ALPHA = 0.3
+_SLOW_ALPHA = 0.02
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class ProviderUnavailableError(RuntimeError):
+    """Raised when a call finds no backend to use (open circuits, or a half-open one already probing)"""
+
+
+class _Health:
+    def __init__(self) -> None:
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.outcomes: Deque[bool] = deque(maxlen=_WINDOW)
+        # Thread running the half-open probe, if any
+        self.probe: Optional[int] = None
+        self.latency_calls = 0
+        self.recent_latency: Optional[float] = None
+        self.baseline_latency: Optional[float] = None
+
+
+_lock = threading.Lock()
+_backends: Dict[str, _Health] = {}
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """Return True if error says something about the backend's health
+
+    Rejected requests (bad input, auth) and unparsable output do not.
+    """
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (openai.APIConnectionError, TimeoutError, ConnectionError))
+
+
+def _get(key: str) -> _Health:
+    health = _backends.get(key)
+    if health is None:
+        health = _backends[key] = _Health()
+    return health
+
+
+def _current_state(key: str, health: _Health) -> str:
+    """State with the cooldown applied (caller holds the lock)"""
+    if health.state == OPEN and time.monotonic() - health.opened_at >= CIRCUIT_COOLDOWN:
+        _set_state(key, health, HALF_OPEN)
+    return health.state
+
+
+def _set_state(key: str, health: _Health, new_state: str) -> None:
+    """Change state and report the transition (caller holds the lock)"""
+    if health.state == new_state:
+        return
+    health.state = new_state
+    health.probe = None
+    if new_state == OPEN:
+        health.opened_at = time.monotonic()
+    elif new_state == CLOSED:
+        # Failures from before the outage must not reopen the circuit
+        health.outcomes.clear()
+    metrics.increment(f"circuit.{key}.{new_state}")
+    metrics.gauge(f"circuit.{key}.state", _STATE_GAUGE[new_state])
+
+
+def record_success(key: str, seconds: float) -> None:
+    """Report a successful call and its latency"""
+    with _lock:
+        health = _get(key)
+        health.consecutive_failures = 0
+        health.latency_calls += 1
+        if health.recent_latency is None:
+            health.recent_latency = health.baseline_latency = seconds
+        else:
+            health.recent_latency += _FAST_ALPHA * (seconds - health.recent_latency)
+            health.baseline_latency += _SLOW_ALPHA * (seconds - health.baseline_latency)
+        if _current_state(key, health) != CLOSED:
+            _set_state(key, health, CLOSED)
+        health.outcomes.append(True)
+    metrics.observe(f"llm.call_seconds.{key}", seconds)
+
+
+def record_failure(key: str) -> None:
+    """Report a failed call, opening the circuit on sustained failures"""
+    with _lock:
+        health = _get(key)
+        health.consecutive_failures += 1
+        health.outcomes.append(False)
+        error_rate = health.outcomes.count(False) / len(health.outcomes)
+        current = _current_state(key, health)
+        if current == HALF_OPEN or (current == CLOSED and (
+                health.consecutive_failures >= CIRCUIT_FAILURES
+                or (len(health.outcomes) >= _MIN_CALLS and error_rate >= CIRCUIT_ERROR_RATE))):
+            _set_state(key, health, OPEN)
+    metrics.increment(f"llm.failures.{key}")
+
+
+def acquire(key: str) -> bool:
+    """Admit a call to the backend: always when closed, never when open, one probe when half-open
+
+    A call that was admitted must be followed by release() once it is over.
+    """
+    with _lock:
+        health = _get(key)
+        current = _current_state(key, health)
+        if current == CLOSED:
+            return True
+        if current == OPEN or health.probe is not None:
+            metrics.increment(f"circuit.{key}.rejected")
+            return False
+        health.probe = threading.get_ident()
+        metrics.increment(f"circuit.{key}.probe")
+        return True
+
+
+def release(key: str) -> None:
+    """End an admitted call; frees the half-open probe if this thread held it"""
+    with _lock:
+        health = _get(key)
+        if health.probe == threading.get_ident():
+            health.probe = None
+
+
+def state(key: str) -> str:
+    with _lock:
+        return _current_state(key, _get(key))
+
+
+def is_available(key: str) -> bool:
+    """Return True unless the backend's circuit is open or its half-open probe is under way"""
+    with _lock:
+        health = _get(key)
+        current = _current_state(key, health)
+        return current == CLOSED or (current == HALF_OPEN and health.probe is None)
+
+
+def is_degraded(key: str) -> bool:
+    """Return True while the backend is much slower than it usually is"""
+    with _lock:
+        health = _get(key)
+        return (health.latency_calls >= _MIN_CALLS
+                and health.recent_latency > CIRCUIT_SLOW_FACTOR * health.baseline_latency)
+
+
+def route(keys: Sequence[str]) -> List[str]:
+    """Order backends for a call: available ones only, degraded ones last
+
+    Args:
+        keys: Backend keys in order of preference
+
+    Returns:
+        The keys to try, in order (empty if every circuit is open)
+    """
+    available = [key for key in keys if is_available(key)]
+    ordered = [key for key in available if not is_degraded(key)] + [key for key in available if is_degraded(key)]
+    if ordered and keys and ordered[0] != keys[0]:
+        metrics.increment("routing.rerouted")
+    if ordered:
+        metrics.increment(f"routing.selected.{ordered[0]}")
+    else:
+        metrics.increment("routing.unavailable")
+    return ordered
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """State, error rate and latencies of every backend seen so far"""
+    with _lock:
+        return {
+            key: {
+                "state": _current_state(key, health),
+                "error_rate": health.outcomes.count(False) / len(health.outcomes) if health.outcomes else 0.0,
+                "recent_latency": health.recent_latency,
+                "baseline_latency": health.baseline_latency
+            }
+            for key, health in _backends.items()
+        }
+
+
+def reset() -> None:
+    """Forget all health data"""
+    with _lock:
+        _backends.clear()
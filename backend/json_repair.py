@@ -0,0 +1,188 @@
+"""
+Tolerant parsing of JSON produced by language models.
+
+Model output often wraps JSON in ```json fences or prose, leaves trailing
+commas, forgets to escape quotes inside strings, or stops mid-structure when
+the output limit is hit. parse_llm_json() repairs these faults and, for
+truncated output, keeps every element that was completely emitted so callers
+can show partial results instead of regenerating everything.
+"""
+# Standard library imports
+import json
+from typing import Any, List, NamedTuple, Tuple
+
+# Local imports
+from backend import metrics
+
+# Define public API
+__all__ = [
+    'ParseResult',
+    'repair_json',
+    'parse_llm_json'
+]
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+# How many cut points to try, newest first, when closing a truncated structure
+_MAX_CUT_ATTEMPTS = 200
+
+
+class ParseResult(NamedTuple):
+    data: Any
+    repaired: bool  # Input needed fixing before it parsed
+    truncated: bool  # Input ended before its outer structure was closed
+
+
+def _next_significant(text: str, index: int) -> str:
+    """Return the next non-whitespace character at or after index ('' at end)"""
+    while index < len(text) and text[index] in " \t\r\n":
+        index += 1
+    return text[index] if index < len(text) else ""
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    """Remove a comma (and following whitespace) at the end of out"""
+    i = len(out) - 1
+    while i >= 0 and out[i] in (" ", "\t", "\r", "\n"):
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i:]
+
+
+def _strip_fences(text: str) -> str:
+    if "```json" in text:
+        text = text.split("```json", 1)[1]
+        if "```" in text:
+            text = text.split("```", 1)[0]
+    return text
+
+
+def repair_json(text: str) -> Tuple[str, bool]:
+    """Repair common syntax faults in model JSON
+
+    Args:
+        text: Raw model output
+
+    Returns:
+        Tuple of (json_text, truncated)
+
+    Raises:
+        ValueError: If no JSON object or array can be found
+    """
+    text = _strip_fences(text)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise ValueError("No JSON object or array found in model output")
+
+    out: List[str] = []
+    stack: List[str] = []
+    # (length of out, stack depth) after which a value boundary was reached
+    cut_points: List[Tuple[int, int]] = []
+    in_string = False
+    escaped = False
+    i = min(starts)
+
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                out.append(ch)
+                escaped = False
+            elif ch == "\\":
+                out.append(ch)
+                escaped = True
+            elif ch == '"':
+                # A quote that is not followed by a delimiter is part of the text
+                if _next_significant(text, i + 1) in (",", ":", "}", "]", ""):
+                    out.append(ch)
+                    in_string = False
+                else:
+                    out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\r":
+                out.append("\\r")
+            elif ch == "\t":
+                out.append("\\t")
+            else:
+                out.append(ch)
+        elif ch == '"':
+            out.append(ch)
+            in_string = True
+        elif ch in _CLOSERS:
+            # An array element counts only once it is complete, so a truncated
+            # one is dropped rather than kept as an empty {} or []
+            in_array = bool(stack) and stack[-1] == "["
+            if in_array:
+                cut_points.append((len(out), len(stack)))
+            out.append(ch)
+            stack.append(ch)
+            if not in_array:
+                cut_points.append((len(out), len(stack)))
+        elif ch in ("}", "]"):
+            _drop_trailing_comma(out)
+            if not stack:
+                break
+            # Close whatever is open, even if the model used the wrong bracket
+            out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                # Anything after the outer structure is prose
+                break
+            cut_points.append((len(out), len(stack)))
+        elif ch == ",":
+            cut_points.append((len(out), len(stack)))
+            out.append(ch)
+        else:
+            out.append(ch)
+        i += 1
+
+    if not stack:
+        return "".join(out), False
+
+    # Truncated: close the structure at the latest point where it is valid
+    for length, depth in reversed(cut_points[-_MAX_CUT_ATTEMPTS:]):
+        candidate = out[:length]
+        _drop_trailing_comma(candidate)
+        joined = "".join(candidate) + "".join(_CLOSERS[c] for c in reversed(stack[:depth]))
+        try:
+            json.loads(joined)
+            return joined, True
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("Could not recover JSON from truncated model output")
+
+
+def parse_llm_json(value: Any) -> ParseResult:
+    """Parse model output into Python data, repairing it if needed
+
+    Args:
+        value: Model output; dicts and lists (e.g. from structured output) pass through
+
+    Returns:
+        ParseResult with the data and whether repair or truncation recovery was needed
+
+    Raises:
+        ValueError: If nothing could be recovered
+    """
+    if isinstance(value, (dict, list)):
+        return ParseResult(value, False, False)
+    if not isinstance(value, str):
+        raise ValueError(f"Cannot parse model output of type {type(value).__name__}")
+
+    stripped = _strip_fences(value).strip()
+    try:
+        data = json.loads(stripped)
+        metrics.increment("json_parse.clean")
+        return ParseResult(data, False, False)
+    except json.JSONDecodeError:
+        pass
+
+    try:
+        repaired, truncated = repair_json(value)
+        data = json.loads(repaired)
+    except (ValueError, json.JSONDecodeError) as e:
+        metrics.increment("json_parse.failed")
+        raise ValueError(f"Could not parse model output as JSON: {e}") from e
+
+    metrics.increment("json_parse.truncated" if truncated else "json_parse.repaired")
+    return ParseResult(data, True, truncated)
@@ -0,0 +1,282 @@
+"""
+Generation of learning materials (artifacts) for lesson phases.
+
+Shared by the single-artifact dialog and the bulk mode, which generates every
+phase x artifact type combination concurrently on a bounded worker pool and
+reports each item as it finishes. When several types are requested for the
+same phase they are generated in one completion (the phase content is sent
+once) and split into separate artifacts; any type missing from the combined
+output falls back to its own call, and a type that fails there as well is
+reported on its own without discarding the others.
+"""
+# Standard library imports
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+# Local imports
+from backend import metrics
+from backend.call_context import bind
+from backend.chains import create_artifact_chain, create_multi_artifact_chain
+from backend.json_repair import parse_llm_json
+from backend.prompts import (
+    CODE_PRACTICE_GENERATION_TEMPLATE,
+    QUIZ_GENERATION_TEMPLATE,
+    SLIDES_GENERATION_TEMPLATE
+)
+
+# Define public API
+__all__ = [
+    'ARTIFACT_TYPES',
+    'MATERIALS_WORKERS',
+    'COMBINED_MATERIALS_ENABLED',
+    'DEFAULT_REQUIREMENTS',
+    'MaterialRequest',
+    'MaterialResult',
+    'PhaseMaterials',
+    'phase_content',
+    'artifact_inputs',
+    'parse_artifact_output',
+    'generate_material',
+    'section_marker',
+    'split_artifact_sections',
+    'generate_phase_materials',
+    'generate_materials'
+]
+
+ARTIFACT_TYPES = ("quiz", "code_practice", "slides")
+
+# Concurrent artifact calls in bulk mode
+MATERIALS_WORKERS = int(os.getenv("MATERIALS_WORKERS", "4"))
+
+# Generate all types requested for a phase in one completion
+COMBINED_MATERIALS_ENABLED = os.getenv("COMBINED_MATERIALS", "1") == "1"
+
+# Settings the material dialog starts with (also what prefetching generates)
+DEFAULT_REQUIREMENTS: Dict[str, Dict[str, Any]] = {
+    "quiz": {
+        "num_questions": 3,
+        "difficulty": "Easy",
+        "question_type": "Multiple choice",
+        "additional_notes": ""
+    },
+    "code_practice": {
+        "programming_language": "Python",
+        "difficulty": "Easy",
+        "question_type": "Complete the function",
+        "additional_requirements": ""
+    },
+    "slides": {
+        "slide_style": "Academic",
+        "num_slides": 3,
+        "additional_requirements": ""
+    }
+}
+
+_ARTIFACT_TEMPLATES = {
+    "quiz": QUIZ_GENERATION_TEMPLATE,
+    "code_practice": CODE_PRACTICE_GENERATION_TEMPLATE,
+    "slides": SLIDES_GENERATION_TEMPLATE
+}
+# Stands in for the phase content inside each type's instructions
+_CONTENT_PLACEHOLDER = "[the PHASE CONTENT given at the end]"
+_MARKER_PATTERN = re.compile(r"^[ \t]*=== ([A-Z_]+) ===[ \t]*$", re.MULTILINE)
+
+
+class MaterialRequest(NamedTuple):
+    phase_index: int
+    artifact_type: str
+    requirements: Dict[str, Any]
+
+
+class MaterialResult(NamedTuple):
+    request: MaterialRequest
+    content: Any  # None if generation failed
+    error: Optional[str] = None
+
+
+class PhaseMaterials(NamedTuple):
+    artifacts: Dict[str, Any]  # Content by artifact type
+    errors: Dict[str, str]  # Error message by artifact type that failed
+
+
+def phase_content(phase: Dict[str, Any]) -> Dict[str, str]:
+    """The part of a phase that artifact prompts see"""
+    return {
+        "phase": phase["phase"],
+        "purpose": phase.get("purpose", ""),
+        "description": phase.get("description", "")
+    }
+
+
+def artifact_inputs(artifact_type: str, content: Dict[str, Any], requirements: Dict[str, Any],
+                    objectives: List[str]) -> Dict[str, Any]:
+    """Build the prompt inputs of an artifact chain"""
+    params = {
+        "phase_content": json.dumps(content, ensure_ascii=False),
+        **requirements
+    }
+    # Quizzes are aligned with the lesson objectives
+    if artifact_type == "quiz":
+        params["lesson_objectives"] = json.dumps(objectives, ensure_ascii=False)
+    return params
+
+
+def parse_artifact_output(artifact_type: str, result: Any) -> Any:
+    """Extract the artifact from a chain result (quizzes are parsed into dicts)
+
+    Raises:
+        ValueError: If quiz output cannot be parsed
+    """
+    if isinstance(result, dict) and artifact_type in result:
+        result = result[artifact_type]
+    if artifact_type == "quiz":
+        return parse_llm_json(result).data
+    return result
+
+
+def generate_material(llm, artifact_type: str, content: Dict[str, Any], requirements: Dict[str, Any],
+                      objectives: List[str]) -> Any:
+    """Generate one artifact and return its content"""
+    chain = create_artifact_chain(llm, artifact_type)
+    result = chain.invoke(artifact_inputs(artifact_type, content, requirements, objectives))
+    return parse_artifact_output(artifact_type, result)
+
+
+def section_marker(artifact_type: str) -> str:
+    """Line that opens an artifact's section in combined output"""
+    return f"=== {artifact_type.upper()} ==="
+
+
+def split_artifact_sections(text: str, artifact_types: Sequence[str]) -> Dict[str, str]:
+    """Split combined output into the sections of the requested types
+
+    Unknown markers are ignored; empty sections are left out.
+
+    Returns:
+        dict: Section text by artifact type
+    """
+    wanted = {artifact_type.upper(): artifact_type for artifact_type in artifact_types}
+    matches = list(_MARKER_PATTERN.finditer(text or ""))
+    sections = {}
+    for i, match in enumerate(matches):
+        artifact_type = wanted.get(match.group(1))
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        if artifact_type and body and artifact_type not in sections:
+            sections[artifact_type] = body
+    return sections
+
+
+def _artifact_instructions(requirements_by_type: Dict[str, Dict[str, Any]], objectives: List[str]) -> str:
+    """Each type's own template, with the shared phase content replaced by a reference"""
+    parts = []
+    for n, (artifact_type, requirements) in enumerate(requirements_by_type.items(), start=1):
+        params = artifact_inputs(artifact_type, {}, requirements, objectives)
+        params["phase_content"] = _CONTENT_PLACEHOLDER
+        instructions = _ARTIFACT_TEMPLATES[artifact_type].format(**params).strip()
+        parts.append(f"#### Material {n}: section {section_marker(artifact_type)}\n{instructions}")
+    return "\n\n".join(parts)
+
+
+def generate_phase_materials(llm, content: Dict[str, Any], requirements_by_type: Dict[str, Dict[str, Any]],
+                             objectives: List[str]) -> PhaseMaterials:
+    """Generate several artifact types for one phase in a single completion
+
+    Types missing from the combined output, or whose section cannot be parsed,
+    are generated with their own call, as are all types if the combined call
+    fails. Each type succeeds or fails independently.
+
+    Args:
+        llm: Language model for generation
+        content: The phase content (see phase_content)
+        requirements_by_type: Requirements of each requested artifact type
+        objectives: The lesson objectives
+
+    Returns:
+        PhaseMaterials: Content of the generated types and errors of the failed ones
+    """
+    sections: Dict[str, str] = {}
+    if len(requirements_by_type) > 1:
+        try:
+            result = create_multi_artifact_chain(llm).invoke({
+                "phase_content": json.dumps(content, ensure_ascii=False),
+                "artifact_instructions": _artifact_instructions(requirements_by_type, objectives),
+                "section_markers": "\n".join(section_marker(artifact_type) for artifact_type in requirements_by_type)
+            })
+            sections = split_artifact_sections(result["materials"], list(requirements_by_type))
+            metrics.increment("materials.combined_calls")
+        except Exception:
+            metrics.increment("materials.combined_failed")
+
+    materials = PhaseMaterials({}, {})
+    for artifact_type, requirements in requirements_by_type.items():
+        if artifact_type in sections:
+            try:
+                materials.artifacts[artifact_type] = parse_artifact_output(artifact_type, sections[artifact_type])
+                continue
+            except ValueError:
+                pass
+        if len(requirements_by_type) > 1:
+            metrics.increment("materials.combined_fallback")
+        try:
+            materials.artifacts[artifact_type] = generate_material(
+                llm, artifact_type, content, requirements, objectives
+            )
+        except Exception as e:
+            materials.errors[artifact_type] = str(e)
+    return materials
+
+
+def generate_materials(llm, plan: Dict[str, Any], requests: List[MaterialRequest],
+                       max_workers: int = MATERIALS_WORKERS) -> Iterator[MaterialResult]:
+    """Generate many artifacts concurrently, yielding each result as it finishes
+
+    With COMBINED_MATERIALS_ENABLED, all types of one phase share a single
+    completion, so their results arrive together. A failed item is reported
+    with its error and does not stop the others, even within the same phase.
+
+    Args:
+        llm: Language model for generation
+        plan: The lesson plan (not modified)
+        requests: Phase and artifact type combinations to generate
+        max_workers: Upper bound on concurrent model calls
+
+    Yields:
+        MaterialResult in completion order
+    """
+    outline = plan.get("outline", [])
+    objectives = plan.get("objectives", [])
+    if not requests:
+        return
+    # Each job generates a batch of requests; batches are per phase when combining
+    batches: Dict[Any, List[MaterialRequest]] = {}
+    for position, request in enumerate(requests):
+        key = request.phase_index if COMBINED_MATERIALS_ENABLED else position
+        batches.setdefault(key, []).append(request)
+
+    def generate(batch: List[MaterialRequest]) -> PhaseMaterials:
+        return generate_phase_materials(
+            llm,
+            phase_content(outline[batch[0].phase_index]),
+            {request.artifact_type: request.requirements for request in batch},
+            objectives
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        futures = {executor.submit(bind(generate), batch): batch for batch in batches.values()}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                materials = future.result()
+            except Exception as e:
+                materials = PhaseMaterials({}, {request.artifact_type: str(e) for request in batch})
+            for request in batch:
+                if request.artifact_type in materials.artifacts:
+                    metrics.increment("materials.generated")
+                    yield MaterialResult(request, materials.artifacts[request.artifact_type])
+                else:
+                    metrics.increment("materials.failed")
+                    yield MaterialResult(request, None, materials.errors.get(request.artifact_type))
@@ -0,0 +1,66 @@
+"""
+Process-wide counters and observations for the LLM pipeline.
+
+Kept deliberately small: values live in memory and can be read with snapshot().
+"""
+# Standard library imports
+import threading
+from collections import defaultdict
+from typing import Dict
+
+# Define public API
+__all__ = [
+    'increment',
+    'observe',
+    'gauge',
+    'snapshot',
+    'reset'
+]
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_observations: Dict[str, Dict[str, float]] = {}
+_gauges: Dict[str, float] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Add value to the named counter"""
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, value: float) -> None:
+    """Record one observation (e.g. a latency) under name"""
+    with _lock:
+        stats = _observations.get(name)
+        if stats is None:
+            _observations[name] = {"count": 1, "sum": value, "min": value, "max": value}
+        else:
+            stats["count"] += 1
+            stats["sum"] += value
+            stats["min"] = min(stats["min"], value)
+            stats["max"] = max(stats["max"], value)
+
+
+def gauge(name: str, value: float) -> None:
+    """Set the current value of a gauge (e.g. a circuit state)"""
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot() -> Dict[str, Dict]:
+    """Return a copy of all counters, observation summaries and gauges"""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "observations": {name: dict(stats) for name, stats in _observations.items()},
+            "gauges": dict(_gauges)
+        }
+
+
+def reset() -> None:
+    """Clear all metrics"""
+    with _lock:
+        _counters.clear()
+        _observations.clear()
+        _gauges.clear()
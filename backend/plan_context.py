@@ -0,0 +1,145 @@
+"""
+Context windows for revision prompts.
+
+A revision usually concerns one or two phases, so the prompt only needs those
+phases in full, their neighbours for continuity, and a compact summary of the
+rest of the plan. Results come back as patches keyed by the original phase
+index (see backend/plan_patch.py) and are merged locally.
+"""
+# Standard library imports
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Define public API
+__all__ = [
+    'strip_artifacts',
+    'plan_summary',
+    'find_referenced_phases',
+    'is_global_request',
+    'select_context_phases',
+    'context_window',
+    'build_plan_context'
+]
+
+# Number of phases on each side of a target that are sent in full
+NEIGHBOUR_PHASES = 1
+
+_PHASE_NUMBER_PATTERN = re.compile(r"\bphases?\s+(\d+)(?:\s*(?:-|to|and|&|,)\s*(\d+))?", re.IGNORECASE)
+_ORDINALS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5,
+    "sixth": 6, "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10
+}
+_ORDINAL_PATTERN = re.compile(r"\b(" + "|".join(_ORDINALS) + r")\s+phase\b", re.IGNORECASE)
+
+# Wording that concerns the plan as a whole rather than specific phases
+_GLOBAL_PATTERN = re.compile(
+    r"\b(objectives?|overall|whole (?:lesson|plan)|entire (?:lesson|plan)|all (?:the )?phases|"
+    r"every phase|each phase|throughout|total (?:time|duration)|reorder|sequence of phases|"
+    r"more phases|fewer phases|new phase|add(?:ing)? (?:a |an )?(?:phase|activity))\b",
+    re.IGNORECASE
+)
+
+# Phase names shorter than this are too generic to match reliably
+_MIN_NAME_LENGTH = 4
+
+
+def strip_artifacts(phase: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the phase without generated learning materials"""
+    return {key: value for key, value in phase.items() if key != "artifacts"}
+
+
+def plan_summary(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Index, name and duration of every phase"""
+    return [
+        {"index": i, "phase": phase.get("phase", ""), "duration": phase.get("duration", "")}
+        for i, phase in enumerate(plan.get("outline", []))
+    ]
+
+
+def find_referenced_phases(plan: Dict[str, Any], text: str) -> Set[int]:
+    """Return indices of phases that text refers to by number, ordinal or name"""
+    outline = plan.get("outline", [])
+    indices: Set[int] = set()
+    if not text:
+        return indices
+
+    for match in _PHASE_NUMBER_PATTERN.finditer(text):
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else first
+        for number in range(min(first, last), max(first, last) + 1):
+            if 1 <= number <= len(outline):
+                indices.add(number - 1)
+
+    for match in _ORDINAL_PATTERN.finditer(text):
+        number = _ORDINALS[match.group(1).lower()]
+        if number <= len(outline):
+            indices.add(number - 1)
+
+    lowered = text.lower()
+    for i, phase in enumerate(outline):
+        name = str(phase.get("phase", "")).strip().lower()
+        # Also match the name without a leading "Phase N:" label
+        short_name = re.sub(r"^phase\s+\d+\s*[:\-–]\s*", "", name)
+        for candidate in {name, short_name}:
+            if len(candidate) >= _MIN_NAME_LENGTH and candidate in lowered:
+                indices.add(i)
+    return indices
+
+
+def is_global_request(text: str) -> bool:
+    """Return True if text asks for changes that concern the plan as a whole"""
+    return bool(text and _GLOBAL_PATTERN.search(text))
+
+
+def select_context_phases(plan: Dict[str, Any], targets: Iterable[int],
+                          neighbours: int = NEIGHBOUR_PHASES) -> List[int]:
+    """Targets plus their neighbours, in outline order"""
+    length = len(plan.get("outline", []))
+    selected = set()
+    for index in targets:
+        for offset in range(-neighbours, neighbours + 1):
+            if 0 <= index + offset < length:
+                selected.add(index + offset)
+    return sorted(selected)
+
+
+def context_window(plan: Dict[str, Any], request_text: str,
+                   targets: Iterable[int] = ()) -> Optional[List[int]]:
+    """Pick the phases a revision prompt needs in full
+
+    Args:
+        plan: The lesson plan
+        request_text: Feedback or critique text describing the revision
+        targets: Phases already known to change (e.g. edited in the UI)
+
+    Returns:
+        Indices of targets plus neighbours, or None if the request concerns the whole
+        plan or no phase can be identified (callers then send the full plan)
+    """
+    if is_global_request(request_text):
+        return None
+    indices = set(targets) | find_referenced_phases(plan, request_text)
+    if not indices:
+        return None
+    return select_context_phases(plan, indices)
+
+
+def build_plan_context(plan: Dict[str, Any], indices: Optional[List[int]] = None) -> str:
+    """Serialize the plan context for revision prompts
+
+    Args:
+        plan: The lesson plan
+        indices: Phases to include in full; None includes every phase and omits the summary
+
+    Returns:
+        str: JSON with objectives, an optional plan_summary and the phases (each with its index)
+    """
+    outline = plan.get("outline", [])
+    context: Dict[str, Any] = {"objectives": plan.get("objectives", [])}
+    if indices is None:
+        indices = list(range(len(outline)))
+    else:
+        context["plan_summary"] = plan_summary(plan)
+    context["phases"] = [{"index": i, **strip_artifacts(outline[i])} for i in indices]
+    return json.dumps(context, ensure_ascii=False)
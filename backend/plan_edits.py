@@ -0,0 +1,179 @@
+"""
+Local edits to a lesson plan that need no model call.
+
+Renaming phases, changing durations, reordering and deleting phases are
+applied directly to the plan. The durations of phases the teacher did not
+touch are rebalanced deterministically so the lesson keeps its total length.
+"""
+# Standard library imports
+import math
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+# Local imports
+from backend.plan_utils import parse_duration_minutes
+
+# Define public API
+__all__ = [
+    'PlanEditError',
+    'PhaseEdit',
+    'MIN_PHASE_MINUTES',
+    'format_duration',
+    'rebalance_durations',
+    'describe_phase_edits',
+    'apply_phase_edits'
+]
+
+# Rebalancing never shrinks a phase below this
+MIN_PHASE_MINUTES = 1
+
+
+class PlanEditError(ValueError):
+    """Raised when edits cannot be applied without the model"""
+
+
+class PhaseEdit(NamedTuple):
+    index: int  # Position of the phase in the ORIGINAL outline
+    phase: str
+    duration: str
+
+
+def format_duration(minutes: int) -> str:
+    return f"{minutes} minute" if minutes == 1 else f"{minutes} minutes"
+
+
+def rebalance_durations(weights: Dict[int, int], amount: int) -> Dict[int, int]:
+    """Split amount minutes across phases in proportion to their current durations
+
+    Uses largest-remainder rounding (ties go to the earlier phase) and keeps every
+    phase at MIN_PHASE_MINUTES or more. If amount equals the current total, the
+    durations are returned unchanged.
+
+    Args:
+        weights: Current minutes per phase index
+        amount: Minutes to distribute
+
+    Raises:
+        PlanEditError: If amount cannot give every phase the minimum duration
+    """
+    if not weights:
+        return {}
+    if amount < MIN_PHASE_MINUTES * len(weights):
+        raise PlanEditError(
+            f"Not enough time left: {amount} minutes for {len(weights)} phases")
+
+    result: Dict[int, int] = {}
+    pool = dict(weights)
+    remaining = amount
+    while True:
+        total_weight = sum(pool.values())
+        shares = {
+            index: remaining * weight / total_weight if total_weight else remaining / len(pool)
+            for index, weight in pool.items()
+        }
+        too_short = [index for index, share in shares.items() if share < MIN_PHASE_MINUTES]
+        if not too_short:
+            break
+        for index in too_short:
+            result[index] = MIN_PHASE_MINUTES
+            remaining -= MIN_PHASE_MINUTES
+            del pool[index]
+
+    floors = {index: math.floor(share) for index, share in shares.items()}
+    leftover = remaining - sum(floors.values())
+    by_remainder = sorted(shares, key=lambda index: (floors[index] - shares[index], index))
+    for index in by_remainder[:leftover]:
+        floors[index] += 1
+    result.update(floors)
+    return result
+
+
+def describe_phase_edits(plan: Dict[str, Any], edits: Sequence[PhaseEdit]) -> List[str]:
+    """Describe edits as lines for a revision prompt (used when they cannot be applied locally)"""
+    outline = plan.get("outline", [])
+    lines = []
+    kept = {edit.index for edit in edits}
+    for index, phase in enumerate(outline):
+        if index not in kept:
+            lines.append(f"- Phase {index+1}: Delete '{phase['phase']}'")
+    for edit in edits:
+        original = outline[edit.index]
+        if original["phase"] != edit.phase or original["duration"] != edit.duration:
+            lines.append(f"- Phase {edit.index+1}: Change '{original['phase']}' ({original['duration']}) "
+                         f"to '{edit.phase}' ({edit.duration})")
+    order = [edit.index for edit in edits]
+    if order != sorted(order):
+        lines.append("- Reorder the phases to: " + ", ".join(f"Phase {index+1}" for index in order))
+    return lines
+
+
+def apply_phase_edits(plan: Dict[str, Any], edits: Sequence[PhaseEdit]) -> Dict[str, Any]:
+    """Apply renames, duration changes, reordering and deletions to a plan
+
+    Args:
+        plan: The plan being edited (not modified)
+        edits: The phases to keep, in their new order, with their new names and durations
+
+    Returns:
+        dict: The edited plan; phases keep their purpose, description and artifacts
+
+    Raises:
+        PlanEditError: If the edits are inconsistent or a duration cannot be parsed
+    """
+    outline = plan.get("outline", [])
+    if not edits:
+        raise PlanEditError("A lesson plan needs at least one phase")
+    indices = [edit.index for edit in edits]
+    if len(set(indices)) != len(indices) or not all(0 <= index < len(outline) for index in indices):
+        raise PlanEditError("Edited phases do not match the plan")
+
+    original_minutes = []
+    for phase in outline:
+        minutes = parse_duration_minutes(phase.get("duration"))
+        if minutes is None:
+            raise PlanEditError(f"Cannot read the duration of '{phase.get('phase', '')}'")
+        original_minutes.append(minutes)
+    lesson_minutes = sum(original_minutes)
+
+    new_minutes: Dict[int, int] = {}
+    fixed = set()
+    for edit in edits:
+        if not edit.phase.strip():
+            raise PlanEditError("Phase names cannot be empty")
+        minutes = parse_duration_minutes(edit.duration)
+        if minutes is None or minutes < MIN_PHASE_MINUTES:
+            raise PlanEditError(f"Cannot read the duration '{edit.duration}'")
+        new_minutes[edit.index] = minutes
+        if minutes != original_minutes[edit.index]:
+            fixed.add(edit.index)
+
+    # Phases the teacher did not retime absorb added, removed or deleted time
+    flexible = {index: new_minutes[index] for index in indices if index not in fixed}
+    if flexible:
+        amount = lesson_minutes - sum(new_minutes[index] for index in fixed)
+        new_minutes.update(rebalance_durations(flexible, amount))
+
+    new_outline = []
+    for edit in edits:
+        original = outline[edit.index]
+        minutes = new_minutes[edit.index]
+        phase = dict(original)
+        changes = []
+        if edit.phase != original["phase"]:
+            phase["phase"] = edit.phase
+            changes.append(f"Renamed from '{original['phase']}'")
+        if edit.index in fixed:
+            phase["duration"] = edit.duration
+            changes.append(f"Duration changed from {original['duration']} to {edit.duration}")
+        elif minutes != original_minutes[edit.index]:
+            phase["duration"] = format_duration(minutes)
+            changes.append(f"Duration adjusted from {original['duration']} to keep the total lesson time")
+        elif edit.duration != original["duration"]:
+            # Same length, different wording
+            phase["duration"] = edit.duration
+        if changes:
+            phase["summary of changes"] = "; ".join(changes)
+        new_outline.append(phase)
+
+    new_plan = dict(plan)
+    new_plan["outline"] = new_outline
+    return new_plan
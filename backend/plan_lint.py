@@ -0,0 +1,169 @@
+"""
+Rule-based checks for lesson plans.
+
+These catch issues that need no expert judgement (time that does not add
+up, empty fields, objectives or requirements the outline never mentions)
+in well under a millisecond, so they can run on every plan version. Their
+findings are shown next to the model's critique and passed to the critique
+prompt as already-known issues.
+"""
+# Standard library imports
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+
+# Local imports
+from backend.plan_utils import parse_duration_minutes
+
+# Define public API
+__all__ = [
+    'LINT_SOURCE',
+    'LintIssue',
+    'lint_plan',
+    'lint_to_critique_points',
+    'format_known_issues'
+]
+
+# Source marker on critique points produced by the linter
+LINT_SOURCE = "check"
+
+_WORD_PATTERN = re.compile(r"[a-z][a-z\-]+")
+_STOPWORDS = {
+    "able", "about", "after", "also", "among", "apply", "being", "between", "both", "class",
+    "could", "demonstrate", "describe", "each", "explain", "from", "have", "identify", "into",
+    "learn", "lesson", "more", "most", "must", "objective", "objectives", "other", "over",
+    "should", "some", "students", "student", "such", "that", "their", "them", "then", "there",
+    "these", "they", "this", "through", "understand", "using", "what", "when", "where", "which",
+    "will", "with", "within", "would", "your"
+}
+# Crude stemming: compare the first letters of each keyword
+_STEM_LENGTH = 6
+
+
+class LintIssue(NamedTuple):
+    rule: str
+    issue: str
+    suggestion: str
+    phase_index: Optional[int] = None
+
+
+def _keywords(text: str) -> Set[str]:
+    words = _WORD_PATTERN.findall(text.lower())
+    return {word[:_STEM_LENGTH] for word in words if len(word) >= 4 and word not in _STOPWORDS}
+
+
+def _is_covered(text: str, outline_keywords: Set[str]) -> bool:
+    """Return True if enough of text's keywords appear in the outline"""
+    keywords = _keywords(text)
+    if not keywords:
+        return True
+    return len(keywords & outline_keywords) >= min(2, len(keywords))
+
+
+def _check_durations(outline: List[Dict[str, Any]], duration: Optional[int]) -> List[LintIssue]:
+    issues = []
+    total = 0
+    for i, phase in enumerate(outline):
+        minutes = parse_duration_minutes(phase.get("duration"))
+        if minutes is None or minutes <= 0:
+            issues.append(LintIssue(
+                "invalid_duration",
+                f"Phase {i+1} ('{phase.get('phase', '')}') has no usable duration ({phase.get('duration')!r})",
+                "Give the phase a duration in minutes, e.g. '10 minutes'",
+                i
+            ))
+        else:
+            total += minutes
+    if duration and not issues and total != duration:
+        direction = "exceed" if total > duration else "fall short of"
+        issues.append(LintIssue(
+            "duration_mismatch",
+            f"Phase durations add up to {total} minutes and {direction} the {duration}-minute lesson",
+            f"Adjust phase durations so the total lesson time is exactly {duration} minutes"
+        ))
+    return issues
+
+
+def _check_fields(outline: List[Dict[str, Any]]) -> List[LintIssue]:
+    issues = []
+    seen: Dict[str, int] = {}
+    for i, phase in enumerate(outline):
+        missing = [field for field in ("phase", "purpose", "description")
+                   if not str(phase.get(field) or "").strip()]
+        if missing:
+            issues.append(LintIssue(
+                "empty_field",
+                f"Phase {i+1} has an empty {' and '.join(missing)}",
+                f"Write a {' and '.join(missing)} for phase {i+1}",
+                i
+            ))
+        name = str(phase.get("phase") or "").strip().lower()
+        if name and name in seen:
+            issues.append(LintIssue(
+                "duplicate_phase",
+                f"Phases {seen[name]+1} and {i+1} have the same name '{phase.get('phase')}'",
+                f"Rename phase {i+1} to describe what is different about it",
+                i
+            ))
+        seen.setdefault(name, i)
+    return issues
+
+
+def _check_coverage(outline: List[Dict[str, Any]], objectives: Iterable[str],
+                    requirements: Iterable[str]) -> List[LintIssue]:
+    outline_text = " ".join(
+        f"{phase.get('phase', '')} {phase.get('purpose', '')} {phase.get('description', '')}"
+        for phase in outline
+    )
+    outline_keywords = _keywords(outline_text)
+    issues = []
+    for objective in objectives:
+        if isinstance(objective, str) and not _is_covered(objective, outline_keywords):
+            issues.append(LintIssue(
+                "objective_unreferenced",
+                f"No phase clearly addresses the objective: \"{objective}\"",
+                "Add or adapt an activity so that a phase explicitly works towards this objective"
+            ))
+    for requirement in requirements:
+        if isinstance(requirement, str) and requirement.strip() and not _is_covered(requirement, outline_keywords):
+            issues.append(LintIssue(
+                "requirement_missing",
+                f"The requirement \"{requirement}\" is not reflected in the outline",
+                "Incorporate this requirement into the relevant phase descriptions"
+            ))
+    return issues
+
+
+def lint_plan(plan: Dict[str, Any], duration: Optional[int] = None,
+              requirements: Optional[Iterable[str]] = None) -> List[LintIssue]:
+    """Run every rule over a plan
+
+    Args:
+        plan: The lesson plan (objectives and outline)
+        duration: Requested lesson length in minutes, if known
+        requirements: Requirements from the lesson form, if any
+
+    Returns:
+        List of issues, in rule order
+    """
+    outline = [phase for phase in plan.get("outline", []) if isinstance(phase, dict)]
+    if not outline:
+        return [LintIssue("empty_outline", "The plan has no teaching phases", "Add teaching phases to the plan")]
+    issues = _check_durations(outline, duration)
+    issues += _check_fields(outline)
+    issues += _check_coverage(outline, plan.get("objectives") or [], requirements or [])
+    return issues
+
+
+def lint_to_critique_points(issues: List[LintIssue], start_id: int = 1) -> List[Dict[str, Any]]:
+    """Convert issues to critique points for the critique dialog"""
+    return [
+        {"id": start_id + i, "issue": issue.issue, "suggestion": issue.suggestion, "source": LINT_SOURCE}
+        for i, issue in enumerate(issues)
+    ]
+
+
+def format_known_issues(issues: List[LintIssue]) -> str:
+    """List issues for the critique prompt"""
+    if not issues:
+        return "None."
+    return "\n".join(f"- {issue.issue}" for issue in issues)
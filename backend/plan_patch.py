@@ -0,0 +1,150 @@
+"""
+Compact patches for lesson plan revisions.
+
+Instead of re-emitting the whole plan, the model returns per-phase operations
+keyed by the index of the phase in the ORIGINAL outline:
+
+    {"objectives": null,
+     "operations": [
+        {"op": "replace", "index": 1, "phase": {"duration": "15 minutes"}},
+        {"op": "insert", "index": 3, "phase": {<complete phase>}},
+        {"op": "delete", "index": 4}
+     ]}
+
+"replace" merges only the given fields into the phase, "insert" adds a new
+phase before the original phase at index (index == len(outline) appends) and
+"delete" removes the phase. Phases without operations are carried over as the
+same objects, so they serialize byte-identically.
+"""
+# Standard library imports
+from typing import Any, Collection, Dict, List, Optional
+
+# Local imports
+from backend.plan_utils import PHASE_FIELDS, is_complete_phase
+
+# Define public API
+__all__ = [
+    'PatchError',
+    'PATCH_OPERATIONS',
+    'validate_plan_patch',
+    'apply_plan_patch'
+]
+
+PATCH_OPERATIONS = ("replace", "insert", "delete")
+
+# Fields a patch may set on a phase
+_PATCHABLE_FIELDS = PHASE_FIELDS + ("summary of changes",)
+
+
+class PatchError(ValueError):
+    """Raised when a patch is malformed or does not fit the plan"""
+
+
+def validate_plan_patch(plan: Dict[str, Any], patch: Any,
+                        allowed_indices: Optional[Collection[int]] = None,
+                        insert_indices: Optional[Collection[int]] = None) -> List[Dict[str, Any]]:
+    """Check a patch against a plan and return its operations
+
+    Args:
+        plan: The plan the patch was generated for
+        patch: The patch
+        allowed_indices: Phases the model was shown in full; replace/delete may only
+            target these, and inserts must sit next to one of them (None allows all)
+        insert_indices: Positions inserts may use, overriding the default of
+            allowed_indices and the positions right after them
+
+    Raises:
+        PatchError: If any operation is invalid or operations conflict
+    """
+    if not isinstance(patch, dict) or not isinstance(patch.get("operations", []), list):
+        raise PatchError("Patch must be an object with an 'operations' list")
+    objectives = patch.get("objectives")
+    if objectives is not None and not (
+            isinstance(objectives, list) and all(isinstance(obj, str) for obj in objectives)):
+        raise PatchError("Patch objectives must be null or a list of strings")
+
+    outline_length = len(plan.get("outline", []))
+    touched = set()
+    operations = patch.get("operations", [])
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get("op") not in PATCH_OPERATIONS:
+            raise PatchError(f"Unknown patch operation: {operation!r}")
+        op = operation["op"]
+        index = operation.get("index")
+        if not isinstance(index, int) or isinstance(index, bool):
+            raise PatchError(f"Operation {op} needs an integer index")
+
+        if op == "insert":
+            if not 0 <= index <= outline_length:
+                raise PatchError(f"Insert index {index} is outside the outline")
+            if not is_complete_phase(operation.get("phase")):
+                raise PatchError(f"Inserted phase at {index} must have {', '.join(PHASE_FIELDS)}")
+            if insert_indices is not None:
+                if index not in insert_indices:
+                    raise PatchError(f"Insert at {index} is outside the positions open to this patch")
+            elif allowed_indices is not None and index not in allowed_indices and index - 1 not in allowed_indices:
+                raise PatchError(f"Insert at {index} is outside the phases shown to the model")
+            continue
+
+        if not 0 <= index < outline_length:
+            raise PatchError(f"{op.title()} index {index} is outside the outline")
+        if allowed_indices is not None and index not in allowed_indices:
+            raise PatchError(f"{op.title()} at {index} targets a phase not shown to the model")
+        if index in touched:
+            raise PatchError(f"Phase {index} is targeted by more than one replace/delete")
+        touched.add(index)
+
+        if op == "replace":
+            fields = operation.get("phase")
+            if not isinstance(fields, dict) or not fields:
+                raise PatchError(f"Replace at {index} needs the changed phase fields")
+            unknown = set(fields) - set(_PATCHABLE_FIELDS)
+            if unknown:
+                raise PatchError(f"Replace at {index} sets unknown fields: {', '.join(sorted(unknown))}")
+            if any(not isinstance(value, str) or not value for field, value in fields.items()
+                   if field in PHASE_FIELDS):
+                raise PatchError(f"Replace at {index} sets an empty phase field")
+    return operations
+
+
+def apply_plan_patch(plan: Dict[str, Any], patch: Any,
+                     allowed_indices: Optional[Collection[int]] = None,
+                     insert_indices: Optional[Collection[int]] = None) -> Dict[str, Any]:
+    """Apply a validated patch and return the new plan (the input is not modified)
+
+    Raises:
+        PatchError: If the patch is invalid for this plan (see validate_plan_patch)
+    """
+    operations = validate_plan_patch(plan, patch, allowed_indices, insert_indices)
+    outline = plan.get("outline", [])
+
+    inserts: Dict[int, List[Dict[str, Any]]] = {}
+    replacements: Dict[int, Dict[str, Any]] = {}
+    deletions = set()
+    for operation in operations:
+        index = operation["index"]
+        if operation["op"] == "insert":
+            inserts.setdefault(index, []).append(dict(operation["phase"]))
+        elif operation["op"] == "replace":
+            replacements[index] = operation["phase"]
+        else:
+            deletions.add(index)
+
+    new_outline = []
+    for index in range(len(outline) + 1):
+        new_outline.extend(inserts.get(index, []))
+        if index == len(outline) or index in deletions:
+            continue
+        if index in replacements:
+            new_outline.append({**outline[index], **replacements[index]})
+        else:
+            new_outline.append(outline[index])
+
+    if not new_outline:
+        raise PatchError("Patch would remove every phase")
+
+    new_plan = dict(plan)
+    if patch.get("objectives") is not None:
+        new_plan["objectives"] = list(patch["objectives"])
+    new_plan["outline"] = new_outline
+    return new_plan
@@ -0,0 +1,199 @@
+"""
+Helpers for working with the lesson plan structure
+({"objectives": [...], "outline": [{"phase", "duration", "purpose", "description"}]}).
+
+With COMPACT_PLAN_OUTPUT=1 models write plans in a compact wire format:
+{"o": [objectives], "ph": [{"n": phase, "m": minutes, "p": purpose,
+"d": description, "c": summary of changes}]}, without the "broad_plan"
+wrapper and with durations as plain minutes. expand_plan() turns it into
+the plan structure above and compact_plan() back, losslessly.
+"""
+# Standard library imports
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Local imports
+from backend.json_repair import parse_llm_json
+
+# Define public API
+__all__ = [
+    'PHASE_FIELDS',
+    'COMPACT_PLAN_OUTPUT',
+    'COMPACT_PHASE_KEYS',
+    'PlanExtraction',
+    'parse_duration_minutes',
+    'total_minutes',
+    'is_complete_phase',
+    'is_compact_plan',
+    'expand_phase',
+    'expand_plan',
+    'compact_plan',
+    'extract_broad_plan',
+    'extract_phases'
+]
+
+PHASE_FIELDS = ("phase", "duration", "purpose", "description")
+
+# Ask models for plans in the compact wire format (off by default: it saves
+# under 10% of output tokens and changes what the plan prompts ask for)
+COMPACT_PLAN_OUTPUT = os.getenv("COMPACT_PLAN_OUTPUT", "0") == "1"
+
+# Compact key -> plan key
+COMPACT_PHASE_KEYS = {
+    "n": "phase",
+    "m": "duration",
+    "p": "purpose",
+    "d": "description",
+    "c": "summary of changes"
+}
+_PHASE_KEYS = {key: compact for compact, key in COMPACT_PHASE_KEYS.items()}
+_MINUTES_FORMAT = "{} minutes"
+
+# Keys under which chains and the app store a (possibly serialized) plan
+_RESULT_KEYS = ("revised_plan", "precisely_revised_plan", "broad_plan_draft")
+
+# One duration component ("1 hour", "15m", "10-15 minutes"; a range counts as its lower bound)
+_DURATION_COMPONENT = (r"(\d+(?:\.\d+)?)(?:\s*(?:-|–|to)\s*\d+(?:\.\d+)?)?\s*"
+                       r"(hours|hour|hrs|hr|h|minutes|minute|mins|min|m)\b")
+_DURATION_PATTERN = re.compile(_DURATION_COMPONENT, re.IGNORECASE)
+# A further component right after the previous one ("1 hour 30 minutes", "1h, 15m")
+_NEXT_COMPONENT_PATTERN = re.compile(r"\s*(?:,|and)?\s*" + _DURATION_COMPONENT, re.IGNORECASE)
+_BARE_NUMBER_PATTERN = re.compile(r"\s*\d+(?:\.\d+)?\s*")
+
+
+class PlanExtraction(NamedTuple):
+    plan: Dict[str, Any]
+    truncated: bool  # Model output was cut off; trailing phases may be missing
+
+
+def parse_duration_minutes(duration: Any) -> Optional[int]:
+    """Parse a phase duration such as "10 minutes", "1 hour 30 minutes" or "1h 15m" into minutes
+
+    Only the first run of hour and minute components is read; parsing stops
+    at the first other text, so a breakdown that follows ("15 minutes (5 min
+    intro + 10 min practice)") is not counted again. Numbers without a unit
+    ("Day 1: ...") or with another unit ("45 seconds") are skipped, a range
+    ("10-15 minutes") counts as its lower bound and a bare number as minutes.
+
+    Returns:
+        The duration in minutes, or None if it has no hour or minute component
+    """
+    if isinstance(duration, (int, float)):
+        return int(duration)
+    if not isinstance(duration, str):
+        return None
+    if _BARE_NUMBER_PATTERN.fullmatch(duration):
+        return int(round(float(duration)))
+    match = _DURATION_PATTERN.search(duration)
+    if not match:
+        return None
+    value = 0.0
+    while match:
+        number, unit = match.groups()
+        value += float(number) * (60 if unit.lower().startswith("h") else 1)
+        match = _NEXT_COMPONENT_PATTERN.match(duration, match.end())
+    return int(round(value))
+
+
+def total_minutes(outline: List[Dict[str, Any]]) -> int:
+    """Sum the parseable phase durations of an outline"""
+    return sum(parse_duration_minutes(phase.get("duration")) or 0 for phase in outline)
+
+
+def is_complete_phase(phase: Any) -> bool:
+    """Return True if phase has every required field"""
+    return isinstance(phase, dict) and all(field in phase for field in PHASE_FIELDS)
+
+
+def is_compact_plan(data: Any) -> bool:
+    """Return True if data is a plan (or phase list) in the compact wire format"""
+    return isinstance(data, dict) and "ph" in data and "outline" not in data
+
+
+def expand_phase(phase: Any) -> Any:
+    """Plan form of a compact phase; fields missing from a cut-off phase stay missing"""
+    if not isinstance(phase, dict):
+        return phase
+    expanded = {}
+    for key, value in phase.items():
+        if key == "m" and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = _MINUTES_FORMAT.format(int(value) if float(value).is_integer() else value)
+        expanded[COMPACT_PHASE_KEYS.get(key, key)] = value
+    return expanded
+
+
+def expand_plan(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan structure ({"objectives", "outline"}) of a compact plan"""
+    plan = {key: value for key, value in data.items() if key not in ("o", "ph")}
+    plan["objectives"] = list(data.get("o") or [])
+    plan["outline"] = [expand_phase(phase) for phase in data.get("ph") or []]
+    return plan
+
+
+def compact_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact wire form of a plan; expand_plan() restores it exactly"""
+    phases = []
+    for phase in plan.get("outline", []):
+        compact = {}
+        for key, value in phase.items():
+            if key == "duration" and isinstance(value, str):
+                minutes = parse_duration_minutes(value)
+                if minutes is not None and value == _MINUTES_FORMAT.format(minutes):
+                    value = minutes
+            compact[_PHASE_KEYS.get(key, key)] = value
+        phases.append(compact)
+    data = {key: value for key, value in plan.items() if key not in ("objectives", "outline")}
+    data["o"] = list(plan.get("objectives") or [])
+    data["ph"] = phases
+    return data
+
+
+def extract_broad_plan(value: Any) -> PlanExtraction:
+    """Find the broad plan in any of the result shapes the app stores
+
+    Accepts chain results, {"broad_plan_draft": ...}, {"revised_plan": ...},
+    {"broad_plan": ...}, the bare plan or a compact plan, as dicts or
+    (possibly malformed) JSON text.
+
+    Raises:
+        ValueError: If no plan with objectives and outline can be recovered
+    """
+    data, _, truncated = parse_llm_json(value)
+
+    if isinstance(data, dict):
+        for key in _RESULT_KEYS:
+            if key in data:
+                inner = extract_broad_plan(data[key])
+                return PlanExtraction(inner.plan, inner.truncated or truncated)
+        if isinstance(data.get("broad_plan"), dict):
+            data = data["broad_plan"]
+        if is_compact_plan(data):
+            data = expand_plan(data)
+
+    if not isinstance(data, dict) or "outline" not in data:
+        raise ValueError("Could not find a lesson plan structure in the model output")
+
+    outline = data.get("outline") or []
+    if truncated:
+        # Keep only phases that were emitted completely
+        outline = [phase for phase in outline if is_complete_phase(phase)]
+    plan = dict(data)
+    plan["objectives"] = list(data.get("objectives") or [])
+    plan["outline"] = outline
+    return PlanExtraction(plan, truncated)
+
+
+def extract_phases(value: Any) -> List[Dict[str, Any]]:
+    """Complete phases of a phase list result, in any format
+
+    Accepts a list of phases, {"outline": [...]} or the compact {"ph": [...]},
+    as data or (possibly malformed) JSON text.
+    """
+    data = parse_llm_json(value).data
+    if is_compact_plan(data):
+        data = expand_plan(data)
+    phases = data.get("outline", []) if isinstance(data, dict) else data
+    if not isinstance(phases, list):
+        return []
+    return [phase for phase in phases if is_complete_phase(phase)]
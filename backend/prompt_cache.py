@@ -0,0 +1,103 @@
+"""
+Provider-side prompt prefix caching.
+
+Templates put their fixed instructions first and their inputs last (see
+backend/prompts.py), so every call of a template starts with the same text:
+the static prefix, everything before the first input. Providers can then
+reuse the processed prefix:
+
+- OpenAI caches prompt prefixes of 1024+ tokens automatically.
+- Anthropic models (through OpenRouter) only cache up to an explicit
+  cache_control breakpoint. With PROMPT_CACHE_HINTS=1, the static prefix of
+  such requests is sent as its own content block marked as cacheable, when
+  it is long enough to be cached (PROMPT_CACHE_MIN_TOKENS).
+
+record() reports how many input tokens the provider served from its cache
+(metrics "prompt_cache.<template>.*" and the traffic log).
+"""
+# Standard library imports
+import os
+import re
+from typing import Any, List, Optional
+
+# Third-party imports
+from langchain_core.messages import BaseMessage
+
+# Local imports
+from backend import metrics
+
+# Define public API
+__all__ = [
+    'PROMPT_CACHE_HINTS',
+    'static_prefix',
+    'supports_cache_hints',
+    'with_cache_hints',
+    'cached_tokens',
+    'record'
+]
+
+PROMPT_CACHE_HINTS = os.getenv("PROMPT_CACHE_HINTS", "1") == "1"
+# Shortest prefix worth a breakpoint (Anthropic ignores shorter ones)
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+
+_PLACEHOLDER_PATTERN = re.compile(r"(?<!\{)\{[a-z_]+\}(?!\})")
+
+
+def static_prefix(template: str) -> str:
+    """Text a template's prompts start with: everything before its first input"""
+    match = _PLACEHOLDER_PATTERN.search(template)
+    prefix = template[:match.start()] if match else template
+    return prefix.replace("{{", "{").replace("}}", "}")
+
+
+def supports_cache_hints(provider: str, model: str) -> bool:
+    """Return True if requests to model need an explicit cache breakpoint"""
+    return PROMPT_CACHE_HINTS and provider == "openrouter" and model.startswith("anthropic/")
+
+
+def with_cache_hints(messages: Any, prefix_chars: int, prefix_tokens: int) -> Any:
+    """Mark the static prefix of the first message as cacheable
+
+    Args:
+        messages: Request messages (returned unchanged unless a list of chat messages)
+        prefix_chars: Length of the static prefix in the first message's text
+        prefix_tokens: Estimated tokens of the prefix
+
+    Returns:
+        A copy of messages whose first message has the prefix as a separate,
+        cacheable content block
+    """
+    if (not isinstance(messages, list) or not messages or not isinstance(messages[0], BaseMessage)
+            or prefix_tokens < PROMPT_CACHE_MIN_TOKENS):
+        return messages
+    first = messages[0]
+    if not isinstance(first.content, str) or len(first.content) <= prefix_chars:
+        return messages
+    content: List[dict] = [
+        {"type": "text", "text": first.content[:prefix_chars], "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": first.content[prefix_chars:]}
+    ]
+    return [first.model_copy(update={"content": content})] + messages[1:]
+
+
+def cached_tokens(result: Any) -> Optional[int]:
+    """Input tokens the provider read from its prompt cache, if it said"""
+    usage = getattr(result, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    if "cache_read" in details:
+        return details["cache_read"] or 0
+    # OpenAI-compatible raw usage (OpenRouter)
+    metadata = getattr(result, "response_metadata", None) or {}
+    raw = (metadata.get("token_usage") or {}).get("prompt_tokens_details") or {}
+    if "cached_tokens" in raw:
+        return raw["cached_tokens"] or 0
+    return None
+
+
+def record(template: str, input_tokens: int, cached: Optional[int]) -> None:
+    """Count a call's input tokens and the cached part"""
+    if cached is None or not input_tokens:
+        return
+    metrics.increment(f"prompt_cache.{template}.input_tokens", input_tokens)
+    metrics.increment(f"prompt_cache.{template}.cached_tokens", cached)
+    metrics.observe(f"prompt_cache.{template}.cached_ratio", cached / input_tokens)
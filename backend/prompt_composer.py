@@ -0,0 +1,133 @@
+"""
+Prompts assembled from optional sections.
+
+A ComposedPrompt is a list of PromptSections. Each section may have a
+condition on the chain inputs and is left out of the prompt when the
+condition fails, e.g. the guidance for teaching styles the teacher did not
+pick, or instructions about reference material that was not provided.
+Numbered list items start with "#" ("#. " or "#) "), which is replaced by
+their position among the included items of the same list, so leaving out
+an item never leaves a gap in the numbering.
+
+compose(inputs) returns an ordinary PromptTemplate; templates are cached per
+combination of included sections. The complete prompt (.template) is the
+one for complete_inputs, the inputs that every optional section applies to;
+it is the baseline against which the savings of composing are measured.
+"""
+# Standard library imports
+import json
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# Third-party imports
+from langchain.prompts import PromptTemplate
+
+# Define public API
+__all__ = [
+    'PromptSection',
+    'ComposedPrompt',
+    'is_provided',
+    'selected_styles',
+    'has_style',
+    'has_styles'
+]
+
+
+class PromptSection(NamedTuple):
+    """A piece of a composed prompt
+
+    text: Template text (PromptTemplate syntax)
+    when: Inclusion condition on the chain inputs (None = always)
+    numbered: Name of the numbered list the section is an item of
+    """
+    text: str
+    when: Optional[Callable[[Dict[str, Any]], bool]] = None
+    numbered: Optional[str] = None
+
+
+class ComposedPrompt:
+    """Prompt built from the sections that apply to the inputs"""
+
+    def __init__(self, input_variables: List[str], sections: List[PromptSection],
+                 complete_inputs: Optional[Dict[str, Any]] = None):
+        self.input_variables = input_variables
+        self.sections = sections
+        self.complete_inputs = complete_inputs
+        self._cache: Dict[Tuple[int, ...], PromptTemplate] = {}
+        self._lock = threading.Lock()
+
+    def _render(self, included: Tuple[int, ...]) -> str:
+        counters: Dict[str, int] = {}
+        parts = []
+        for index in included:
+            section = self.sections[index]
+            text = section.text
+            if section.numbered:
+                counters[section.numbered] = counters.get(section.numbered, 0) + 1
+                indent = len(text) - len(text.lstrip())
+                text = text[:indent] + text[indent:].replace("#", str(counters[section.numbered]), 1)
+            parts.append(text)
+        return "".join(parts)
+
+    def compose(self, inputs: Optional[Dict[str, Any]] = None) -> PromptTemplate:
+        """The prompt for inputs (all sections if inputs is None)"""
+        included = tuple(
+            index for index, section in enumerate(self.sections)
+            if inputs is None or section.when is None or section.when(inputs)
+        )
+        with self._lock:
+            template = self._cache.get(included)
+            if template is None:
+                template = self._cache[included] = PromptTemplate(
+                    input_variables=self.input_variables, template=self._render(included))
+        return template
+
+    @property
+    def template(self) -> str:
+        """Text of the complete prompt (every section applies to complete_inputs)"""
+        return self.compose(self.complete_inputs).template
+
+    def format_prompt(self, **inputs: Any):
+        return self.compose(inputs).format_prompt(**inputs)
+
+    def format(self, **inputs: Any) -> str:
+        return self.compose(inputs).format(**inputs)
+
+
+def _parse_list(value: Any) -> List[Any]:
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if not isinstance(value, str):
+        return [value] if value else []
+    try:
+        parsed = json.loads(value)
+    except json.JSONDecodeError:
+        return [item for item in value.split(",") if item.strip()]
+    return _parse_list(parsed) if parsed != value else [parsed]
+
+
+def is_provided(name: str) -> Callable[[Dict[str, Any]], bool]:
+    """Condition: input name is non-empty (empty strings, "[]" and "{}" count as empty)"""
+    def check(inputs: Dict[str, Any]) -> bool:
+        value = inputs.get(name)
+        if isinstance(value, str):
+            return value.strip() not in ("", "[]", "{}", "null", "None")
+        return bool(value)
+    return check
+
+
+def selected_styles(inputs: Dict[str, Any], known: List[str]) -> List[str]:
+    """Teaching styles named in inputs["style"], all of known if none is recognised"""
+    names = {str(item).strip().lower() for item in _parse_list(inputs.get("style"))}
+    selected = [style for style in known if style.lower() in names]
+    return selected or list(known)
+
+
+def has_style(style: str, known: List[str]) -> Callable[[Dict[str, Any]], bool]:
+    """Condition: style is one of the selected teaching styles"""
+    return lambda inputs: style in selected_styles(inputs, known)
+
+
+def has_styles(known: List[str]) -> Callable[[Dict[str, Any]], bool]:
+    """Condition: more than one teaching style is selected"""
+    return lambda inputs: len(selected_styles(inputs, known)) > 1
@@ -1,9 +1,47 @@
 from langchain.prompts import PromptTemplate
 
+from backend.plan_utils import COMPACT_PLAN_OUTPUT
+from backend.prompt_composer import ComposedPrompt, PromptSection, has_style, has_styles, is_provided
+
+# Every template starts with its fixed instructions and output format and ends
+# with its inputs, so calls of the same template share a long identical prefix
+# that providers can cache (see backend/prompt_cache.py). Instructions refer to
+# the inputs by name instead of repeating them; keep new templates in this order.
+
+
+def _plan_format(full, compact):
+    """Output format of a plan: the compact wire format if COMPACT_PLAN_OUTPUT=1"""
+    return compact if COMPACT_PLAN_OUTPUT else full
+
+
+# Key legend of the compact plan format (see backend/plan_utils.py)
+_COMPACT_KEYS = """Keys: "o" = learning objectives, "ph" = teaching phases in order, "n" = phase name, "m" = duration in minutes (a number), "p" = purpose, "d" = description"""
+_COMPACT_REVISION_KEYS = _COMPACT_KEYS + """, "c" = summary of changes (only for phases you changed)"""
+_COMPACT_RULE = "Write the JSON on a single line, without indentation."
+
 # ==========================================
 # A) BROAD PLAN (Draft Only, No Critique/Revise)
 # ==========================================
-BROAD_PLAN_DRAFT_TEMPLATE = PromptTemplate(
+# Only the guidance for the selected teaching styles and the instructions for
+# inputs that were actually provided are sent (see backend/prompt_composer.py).
+TEACHING_STYLE_GUIDANCE = {
+    "Expert": "A teacher-centered approach where teachers hold knowledge and expertise, focusing on sharing knowledge and providing direct feedback. Strong in content delivery and demonstrations.",
+    "Formal Authority": "A teacher-centered approach focused on lecturing in a structured environment, ideal for delivering large amounts of information efficiently. Strong in clarity of goals and expectations.",
+    "Personal Model": "A teacher-centered approach using real-life examples with direct observation, where teacher acts as a coach/mentor. Strong in demonstrations and modeling behavior.",
+    "Facilitator": "A student-centered approach focused on guiding critical thinking through activities, emphasizing teacher-student interactions. Strong in fostering independent learning and discovery.",
+    "Delegator": "A student-centered approach where teacher serves as an observer while students work independently or in groups. Strong in promoting collaboration and peer learning."
+}
+_STYLES = list(TEACHING_STYLE_GUIDANCE)
+_BLENDED = has_styles(_STYLES)
+_REFERENCE = is_provided("reference_context")
+_FEEDBACK = is_provided("broad_plan_feedback")
+
+
+def _no(condition):
+    return lambda inputs: not condition(inputs)
+
+
+BROAD_PLAN_DRAFT_TEMPLATE = ComposedPrompt(
     input_variables=[
         "grade_level",
         "topic",
@@ -14,62 +52,26 @@ BROAD_PLAN_DRAFT_TEMPLATE = PromptTemplate(
         "broad_plan_feedback",
         "reference_context"
     ],
-    template="""
-You are an expert instructional designer specializing in {grade_level} education.
-
-INPUTS:
-1. Core Parameters:
-   - Topic: {topic}
-   - Duration: {duration} minutes total
-   - Grade Level: {grade_level}
-
-2. Teaching Approach:
-   - Selected Teaching Style(s): {style}
-   
-   * Understanding Teaching Styles:
-     - Expert: A teacher-centered approach where teachers hold knowledge and expertise, focusing on sharing knowledge and providing direct feedback. Strong in content delivery and demonstrations.
-     - Formal Authority: A teacher-centered approach focused on lecturing in a structured environment, ideal for delivering large amounts of information efficiently. Strong in clarity of goals and expectations.
-     - Personal Model: A teacher-centered approach using real-life examples with direct observation, where teacher acts as a coach/mentor. Strong in demonstrations and modeling behavior.
-     - Facilitator: A student-centered approach focused on guiding critical thinking through activities, emphasizing teacher-student interactions. Strong in fostering independent learning and discovery.
-     - Delegator: A student-centered approach where teacher serves as an observer while students work independently or in groups. Strong in promoting collaboration and peer learning.
-   
-   * Blended Style Approach:
-     - When multiple styles are selected, they should be integrated to create a balanced approach
-     - Teacher-centered styles (Expert, Formal Authority, Personal Model) should be balanced with student-centered approaches (Facilitator, Delegator)
-     - The beginning phases often utilize more structured approaches (Expert/Formal Authority)
-     - The middle phases should transition to more interactive approaches (Personal Model/Facilitator)
-     - The final phases can incorporate more independent work (Facilitator/Delegator)
-     - Each phase should clearly reflect elements of the selected teaching styles
-     - Time allocation should be balanced appropriately between teacher-led and student-centered activities based on the combination of selected styles
-
-3. Learning Goals:
-   - Objectives: {learning_objectives}
-     * These are the specific outcomes students should achieve by the end of the lesson
-     * Each phase should contribute to one or more of these objectives
-     * All objectives must be addressed in the lesson plan
-     * if there are only one or two objectives, then add more objectives that are related to the topic
-
-4. Structural Requirements:
-   - Requirements: {requirements}
-     * These are specific activities or elements that must be included
-     * Each requirement should be naturally integrated into appropriate phases
-     * The placement should make pedagogical sense within the lesson flow
-
-5. Additional Inputs:
-   - Reference Materials: {reference_context}
-   - User Feedback and Phase Structure: {broad_plan_feedback}
+    sections=[
+        PromptSection("""
+You are an expert instructional designer specializing in school education.
+Design a lesson plan for the INPUTS given at the end of this prompt.
 
 TASK:
-1) Process Reference Materials (if provided):
+"""),
+        PromptSection("""#) Process Reference Materials:
    - Extract key concepts and main ideas
    - Identify important examples and case studies
    - Note key terminology and definitions
    - Map content to learning objectives
    - Ensure at least 60% of lesson content is based on references
    - Seamlessly integrate reference-based content without explicit markers
-   - If there is no reference material, generate content based on best practices
 
-2) Process User Feedback and Phase Changes:
+""", when=_REFERENCE, numbered="task"),
+        PromptSection("""#) No reference material is provided: generate content based on best practices
+
+""", when=_no(_REFERENCE), numbered="task"),
+        PromptSection("""#) Process User Feedback and Phase Changes:
    - User feedback has the highest priority
    - If feedback suggests removing phases:
      * Remove specified phases
@@ -84,7 +86,8 @@ TASK:
      * Apply suggested improvements
      * Maintain overall structure unless explicitly told to change
 
-3) Design or Adapt Lesson Structure:
+""", when=_FEEDBACK, numbered="task"),
+        PromptSection("""#) Design or Adapt Lesson Structure:
    A. If modifying existing structure:
       - First apply any structural changes from feedback
       - Then apply any phase modifications
@@ -92,38 +95,49 @@ TASK:
       - Enhance content within fixed structure
       
    B. If creating new structure:
-      - Break {duration} minutes into logical phases
+""", when=_FEEDBACK, numbered="task"),
+        PromptSection("""#) Design Lesson Structure:
+""", when=_no(_FEEDBACK), numbered="task"),
+        PromptSection("""      - Break the lesson duration into logical phases
       - Ensure progression toward objectives
       - Incorporate all requirements
       - Follow pedagogical sequence
       - CRITICALLY IMPORTANT: Ensure each phase reflects the selected teaching style(s)
-      - If multiple styles are selected, create a balanced progression:
+"""),
+        PromptSection("""      - If multiple styles are selected, create a balanced progression:
         * Opening phases might be more structured/teacher-led
         * Middle phases should include more guided interaction
         * Later phases can involve more student independence and application
         * The overall balance should reflect the combination of selected styles
-
-4) Teaching Style Integration in Phases:
+""", when=_BLENDED),
+        PromptSection("""
+#) Teaching Style Integration in Phases:
    - For each phase, explicitly consider how the selected teaching style(s) influence:
      * The teacher's role in the phase
      * The level of student participation
      * The types of activities and interactions
      * The delivery methods for content
      * The assessment approaches
-   - When blending styles, maintain coherence by:
+""", numbered="task"),
+        PromptSection("""   - When blending styles, maintain coherence by:
      * Creating clear transitions between different teaching approaches
      * Ensuring the overall flow feels natural, not disjointed
      * Maintaining alignment with the learning objectives throughout
-
-5) Quality Check:
-   - Verify all feedback has been addressed
+""", when=_BLENDED),
+        PromptSection("""
+#) Quality Check:
+""", numbered="task"),
+        PromptSection("""   - Verify all feedback has been addressed
    - Ensure phase modifications are applied exactly
-   - Check alignment with objectives
-   - Validate reference material usage
-   - Confirm total duration matches {duration}
+""", when=_FEEDBACK),
+        PromptSection("""   - Check alignment with objectives
+"""),
+        PromptSection("""   - Validate reference material usage
+""", when=_REFERENCE),
+        PromptSection("""   - Confirm total duration matches the lesson duration
    - Verify that teaching phases accurately reflect the selected teaching style(s)
 
-OUTPUT FORMAT (JSON):
+""" + _plan_format("""OUTPUT FORMAT (JSON):
 {{
   "broad_plan": {{
     "objectives": [
@@ -139,29 +153,150 @@ OUTPUT FORMAT (JSON):
     ]
   }}
 }}
-
+""", """OUTPUT FORMAT (compact JSON):
+{{"o": ["Refined learning goal (should consider the reference materials)"], "ph": [{{"n": "Phase name (must match if specified in feedback)", "m": 10, "p": "What students will achieve in this phase", "d": "Detailed explanation of how this phase will unfold and how it contributes to objectives"}}]}}
+""" + _COMPACT_KEYS + "\n" + _COMPACT_RULE + "\n") + """
 CONSTRAINTS:
-1. Reference Materials:
-   * When provided, at least 60% of content must be reference-based
+"""),
+        PromptSection("""#. Reference Materials:
+   * At least 60% of content must be reference-based
    * Integrate reference material seamlessly without explicit markers
    * Maintain academic level and teaching style
 
-2. User Feedback:
+""", when=_REFERENCE, numbered="constraints"),
+        PromptSection("""#. User Feedback:
    * User feedback has absolute priority
    * Apply ALL requested changes exactly as specified
    * Maintain exact phase names and durations when provided
    * Only modify structure if explicitly requested
 
-3. Teaching Style Integration:
+""", when=_FEEDBACK, numbered="constraints"),
+        PromptSection("""#. Teaching Style Integration:
    * Each phase must clearly reflect the selected teaching style(s)
-   * If multiple styles are selected, create a thoughtful blend that leverages the strengths of each
-   * Ensure the overall lesson structure creates a coherent learning experience
+""", numbered="constraints"),
+        PromptSection("""   * If multiple styles are selected, create a thoughtful blend that leverages the strengths of each
+""", when=_BLENDED),
+        PromptSection("""   * Ensure the overall lesson structure creates a coherent learning experience
    * Maintain appropriate balance between teacher-led and student-centered activities
 
-4. Technical Requirements:
+"""),
+        PromptSection("""#. Technical Requirements:
    * Output only valid JSON
    * Include all required fields
-   * Ensure total duration matches {duration} minutes
+   * Ensure total duration matches the lesson duration
+
+UNDERSTANDING THE SELECTED TEACHING STYLES:
+""", numbered="constraints"),
+        *[
+            PromptSection(f"   - {style}: {guidance}\n", when=has_style(style, _STYLES))
+            for style, guidance in TEACHING_STYLE_GUIDANCE.items()
+        ],
+        PromptSection("""
+BLENDED STYLE APPROACH:
+   - When multiple styles are selected, they should be integrated to create a balanced approach
+   - Teacher-centered styles (Expert, Formal Authority, Personal Model) should be balanced with student-centered approaches (Facilitator, Delegator)
+   - The beginning phases often utilize more structured approaches (Expert/Formal Authority)
+   - The middle phases should transition to more interactive approaches (Personal Model/Facilitator)
+   - The final phases can incorporate more independent work (Facilitator/Delegator)
+   - Each phase should clearly reflect elements of the selected teaching styles
+   - Time allocation should be balanced appropriately between teacher-led and student-centered activities based on the combination of selected styles
+""", when=_BLENDED),
+        PromptSection("""
+INPUTS:
+#. Core Parameters:
+   - Topic: {topic}
+   - Duration (lesson duration): {duration} minutes total
+   - Grade Level: {grade_level}
+
+""", numbered="inputs"),
+        PromptSection("""#. Teaching Approach:
+   - Selected Teaching Style(s): {style}
+
+""", numbered="inputs"),
+        PromptSection("""#. Learning Goals:
+   - Objectives: {learning_objectives}
+     * These are the specific outcomes students should achieve by the end of the lesson
+     * Each phase should contribute to one or more of these objectives
+     * All objectives must be addressed in the lesson plan
+     * if there are only one or two objectives, then add more objectives that are related to the topic
+
+""", numbered="inputs"),
+        PromptSection("""#. Structural Requirements:
+   - Requirements: {requirements}
+     * These are specific activities or elements that must be included
+     * Each requirement should be naturally integrated into appropriate phases
+     * The placement should make pedagogical sense within the lesson flow
+
+""", when=is_provided("requirements"), numbered="inputs"),
+        PromptSection("""#. User Feedback and Phase Structure: {broad_plan_feedback}
+
+""", when=_FEEDBACK, numbered="inputs"),
+        PromptSection("""#. Reference Materials:
+{reference_context}
+""", when=_REFERENCE, numbered="inputs")
+    ],
+    # Every style and every optional input: the baseline for measuring what composing saves
+    complete_inputs={
+        "style": _STYLES,
+        "requirements": "provided",
+        "reference_context": "provided",
+        "broad_plan_feedback": "provided"
+    }
+)
+
+# Template for completing a plan whose output was cut off
+COMPLETE_PHASES_TEMPLATE = PromptTemplate(
+    input_variables=[
+        "grade_level",
+        "topic",
+        "duration",
+        "style",
+        "learning_objectives",
+        "requirements",
+        "partial_plan_json",
+        "remaining_minutes"
+    ],
+    template="""
+You are an expert instructional designer. A lesson plan was cut off before all teaching phases were written; the partial plan and the lesson parameters are given at the end of this prompt.
+
+### **TASK**
+Write ONLY the remaining teaching phases that follow the last phase of the partial plan:
+1. Continue the lesson flow naturally from the last existing phase
+2. Cover objectives and requirements that the existing phases do not address yet
+3. The durations of the new phases must add up to exactly the minutes not yet allocated
+4. Reflect the selected teaching style(s) in every new phase
+5. Do NOT repeat or modify the existing phases
+
+""" + _plan_format("""### **OUTPUT FORMAT (JSON)**
+{{
+  "outline": [
+    {{
+      "phase": "Phase name",
+      "duration": "Duration",
+      "purpose": "What students will achieve in this phase",
+      "description": "Detailed explanation of how this phase will unfold and how it contributes to objectives"
+    }}
+  ]
+}}
+
+Output valid JSON only, no additional text.
+""", """### **OUTPUT FORMAT (compact JSON)**
+{{"ph": [{{"n": "Phase name", "m": 10, "p": "What students will achieve in this phase", "d": "Detailed explanation of how this phase will unfold and how it contributes to objectives"}}]}}
+Keys: "ph" = the new teaching phases in order, "n" = phase name, "m" = duration in minutes (a number), "p" = purpose, "d" = description
+
+Output valid JSON only, on a single line without indentation, no additional text.
+""") + """
+### **LESSON PARAMETERS**
+- Topic: {topic}
+- Duration: {duration} minutes total
+- Grade Level: {grade_level}
+- Selected Teaching Style(s): {style}
+- Objectives: {learning_objectives}
+- Requirements: {requirements}
+- Minutes not yet allocated: {remaining_minutes}
+
+### **PARTIAL PLAN (complete phases only)**
+{partial_plan_json}
 """
 )
 
@@ -170,12 +305,9 @@ CONSTRAINTS:
 # B) RVISE PLAN (Critique, Revise)
 # ==========================================
 CRITIQUE_TEMPLATE = PromptTemplate(
-    input_variables=["broad_plan_json"],
+    input_variables=["broad_plan_json", "known_issues"],
     template="""
-You are an expert educational consultant reviewing a detailed lesson plan.
-
-### **ANALYZE THE PLAN**
-{broad_plan_json}
+You are an expert educational consultant reviewing a detailed lesson plan. The plan to analyze is given at the end of this prompt.
 
 ### **EVALUATION CRITERIA**
 1. Content Quality
@@ -216,24 +348,111 @@ Your output must be a valid JSON array containing 1-7 critique points, each with
 5. NUMBER your critique points from 1 to however many you provide (1-7), no need to be 4 critique points everytime
 6. If this is likely a follow-up critique after previous improvements, focus on remaining issues
 7. If the plan is already high quality, it's acceptable to provide fewer critique points (as few as 1-2)
-8. STRICTLY follow the JSON format specified above
-9. Do NOT include any explanatory text outside the JSON structure
+8. Do NOT repeat or rephrase the already known issues; focus on issues that need an expert's judgement
+9. STRICTLY follow the JSON format specified above
+10. Do NOT include any explanatory text outside the JSON structure
+
+### **ALREADY KNOWN ISSUES**
+Automatic checks found the following issues; they are shown to the teacher separately:
+{known_issues}
+
+### **ANALYZE THE PLAN**
+{broad_plan_json}
 """
 )
 
-# Template for revising based on user-selected critique points
-REVISE_SELECTED_TEMPLATE = PromptTemplate(
-    input_variables=["broad_plan_json", "selected_critique_points"],
+# Critique of a single evaluation dimension; dimensions run concurrently
+CRITIQUE_DIMENSION_TEMPLATE = PromptTemplate(
+    input_variables=["broad_plan_json", "known_issues", "dimension", "criteria"],
     template="""
-You are an expert instructional designer improving a lesson plan based on selected critique points.
+You are an expert educational consultant reviewing a detailed lesson plan for ONE evaluation dimension only. The plan, the known issues and the dimension with its criteria are given at the end of this prompt.
 
-### **1) REVIEW ORIGINAL PLAN**
+### **OUTPUT FORMAT**
+Your output must be a valid JSON array containing 0-3 critique points, each with the following structure:
+```json
+[
+  {{
+    "id": 1,
+    "issue": "Clear description of a specific issue in the lesson plan",
+    "suggestion": "Specific, actionable suggestion to address the issue"
+  }}
+]
+```
+
+### **REQUIREMENTS**
+1. Only report issues that belong to the given dimension; other reviewers cover the other aspects
+2. Each critique point must be specific and actionable, naming the phase it concerns
+3. Do NOT repeat the already known issues
+4. If there is nothing meaningful to improve for the dimension, return an empty array []
+5. STRICTLY follow the JSON format specified above
+6. Do NOT include any explanatory text outside the JSON structure
+
+### **ANALYZE THE PLAN**
 {broad_plan_json}
 
-### **2) SELECTED CRITIQUE POINTS**
-{selected_critique_points}
+### **ALREADY KNOWN ISSUES**
+Automatic checks found the following issues; they are shown to the teacher separately:
+{known_issues}
+
+### **EVALUATION CRITERIA: {dimension}**
+{criteria}
+"""
+)
+
+# Follow-up critique that only reviews phases changed since the previous critique
+CRITIQUE_FOLLOWUP_TEMPLATE = PromptTemplate(
+    input_variables=["plan_context", "previous_points", "known_issues"],
+    template="""
+You are an expert educational consultant reviewing a lesson plan that was changed after an earlier review. The plan context, the earlier points and the known issues are given at the end of this prompt.
+
+### **PLAN CONTEXT FORMAT**
+"phases" holds the full content of the phases that changed since the earlier review (with their neighbours), each with its "index" in the outline.
+"plan_summary" lists every phase of the plan (index, name, duration) for orientation.
+
+### **EVALUATION CRITERIA**
+1. Content Quality: clarity of instructions, alignment with learning objectives, appropriateness of activities
+2. Implementation: time management, resource utilization, transitions between the changed phases and their neighbours
+3. Student Engagement: activity variety, interaction opportunities, learning assessment methods
+
+### **OUTPUT FORMAT**
+Your output must be a valid JSON array containing 0-5 critique points about the phases shown, each with the following structure:
+```json
+[
+  {{
+    "id": 1,
+    "issue": "Clear description of a specific issue, naming the phase (e.g. 'Phase 3: ...')",
+    "suggestion": "Specific, actionable suggestion to address the issue"
+  }}
+]
+```
+
+### **REQUIREMENTS**
+1. Only critique the phases shown in full; name the phase in every issue
+2. Do NOT repeat the earlier points or the already known issues
+3. If the changed phases are already high quality, return an empty array []
+4. STRICTLY follow the JSON format specified above
+5. Do NOT include any explanatory text outside the JSON structure
+
+### **PLAN CONTEXT**
+{plan_context}
+
+### **POINTS FROM THE EARLIER REVIEW THAT STILL APPLY**
+These concern unchanged phases and will be shown to the teacher again:
+{previous_points}
+
+### **ALREADY KNOWN ISSUES**
+Automatic checks found the following issues; they are shown to the teacher separately:
+{known_issues}
+"""
+)
+
+# Template for revising based on user-selected critique points
+REVISE_SELECTED_TEMPLATE = PromptTemplate(
+    input_variables=["broad_plan_json", "selected_critique_points"],
+    template="""
+You are an expert instructional designer improving a lesson plan based on selected critique points. The original plan and the selected critique points are given at the end of this prompt.
 
-### **3) IMPROVE THE PLAN**
+### **IMPROVE THE PLAN**
 Apply ONLY the selected critique points while following these rules:
 1. You CAN add new phases if the selected critique points suggest the plan needs more activities
 2. You CAN modify phase names and durations if the selected critique points suggest improvements
@@ -244,7 +463,7 @@ Apply ONLY the selected critique points while following these rules:
 7. If you make any changes to any teaching phase, please provide a brief summary of the changes that were made to that phase based on selected critique points
 8. If any phases have a summary of changes from previous revisions, please update that summary to reflect the changes made in this revision or remove it if no changes were made
 
-### **OUTPUT FORMAT (JSON)**
+""" + _plan_format("""### **OUTPUT FORMAT (JSON)**
 {{
   "broad_plan": {{
     "objectives": [
@@ -261,32 +480,75 @@ Apply ONLY the selected critique points while following these rules:
     ]
   }}
 }}
-
+""", """### **OUTPUT FORMAT (compact JSON)**
+Return the complete improved plan, every phase included:
+{{"o": ["Improved learning objective based on selected critique points"], "ph": [{{"n": "Phase name (can be modified based on selected critique)", "m": 10, "p": "Enhanced purpose statement addressing selected critique points", "d": "Improved description with more clarity and detail", "c": "Summary of changes made to this phase based on selected critique points (if applicable)"}}]}}
+""" + _COMPACT_REVISION_KEYS + """
+""") + """
 ### **REQUIREMENTS**
 1. Make meaningful improvements based ONLY on the selected critique points
 2. Ensure the total duration still matches the original plan's total time
 3. Focus on improving content quality, clarity, and student engagement
 4. Output valid JSON only, no additional text
+""" + _plan_format("", "5. " + _COMPACT_RULE + "\n") + """
+### **ORIGINAL PLAN**
+{broad_plan_json}
+
+### **SELECTED CRITIQUE POINTS**
+{selected_critique_points}
 """
 )
 
-# New template for precisely revising a lesson plan
-PRECISE_REVISION_TEMPLATE = PromptTemplate(
-    input_variables=["original_plan_json", "revised_phases", "user_feedback"],
+# Patch variant of the critique revision: only the phases the critique points concern are sent
+REVISE_SELECTED_PATCH_TEMPLATE = PromptTemplate(
+    input_variables=["plan_context", "selected_critique_points"],
     template="""
-You are an expert instructional designer tasked with making precise, targeted revisions to a lesson plan.
+You are an expert instructional designer improving a lesson plan based on selected critique points. The lesson plan context and the selected critique points are given at the end of this prompt.
 
-### **ORIGINAL LESSON PLAN**
-{original_plan_json}
+### **LESSON PLAN CONTEXT FORMAT**
+"phases" holds the full content of the phases the critique points concern, each with its "index" in the outline.
+If present, "plan_summary" lists every phase of the plan (index, name, duration) for orientation.
 
-### **USER REVISION REQUESTS**
-The user has requested the following changes:
+### **IMPROVE THE PLAN**
+Apply ONLY the selected critique points while following these rules:
+1. Improve phase names, durations, purposes and descriptions as the selected critique points require
+2. You CAN insert new phases next to the phases shown if the critique points call for more activities
+3. Do NOT make changes related to critique points that were NOT selected
+4. Keep the total duration of the phases you change equal to their original total
+5. Only phases listed in "phases" may be replaced or deleted
+6. Add a brief "summary of changes" to every phase you change
+
+### **OUTPUT FORMAT (JSON PATCH)**
+Return ONLY the changes as operations keyed by the ORIGINAL phase index:
+{{
+  "objectives": null,
+  "operations": [
+    {{"op": "replace", "index": 1, "phase": {{"description": "Improved description", "summary of changes": "What changed and why"}}}},
+    {{"op": "insert", "index": 2, "phase": {{"phase": "New phase name", "duration": "10 minutes", "purpose": "Purpose", "description": "Description", "summary of changes": "Added to address a critique point"}}}}
+  ]
+}}
 
-1. Phase name and duration changes:
-{revised_phases}
+### **PATCH RULES**
+1. "replace": include ONLY the fields that change ("phase", "duration", "purpose", "description", "summary of changes")
+2. "insert": a complete new phase placed before the original phase at "index"
+3. "delete": removes the original phase at "index"
+4. Each original index may appear in at most one replace or delete operation
+5. Keep "objectives" null
+6. Output valid JSON only, no additional text
 
-2. Additional feedback:
-{user_feedback}
+### **LESSON PLAN CONTEXT**
+{plan_context}
+
+### **SELECTED CRITIQUE POINTS**
+{selected_critique_points}
+"""
+)
+
+# New template for precisely revising a lesson plan
+PRECISE_REVISION_TEMPLATE = PromptTemplate(
+    input_variables=["original_plan_json", "revised_phases", "user_feedback"],
+    template="""
+You are an expert instructional designer tasked with making precise, targeted revisions to a lesson plan. The original lesson plan and the user's revision requests are given at the end of this prompt.
 
 ### **INSTRUCTIONS FOR PRECISE REVISION**
 1. Make specific changes requested by the user
@@ -330,7 +592,7 @@ For all types of user feedback:
 8. If you make any changes to any teaching phase, please provide a brief summary of the changes that were made to that phase based on user feedback
 8. If any phases have a summary of changes from previous revisions, please update that summary to reflect the changes made in this revision or remove it if no changes were made
 
-### **OUTPUT FORMAT (JSON)**
+""" + _plan_format("""### **OUTPUT FORMAT (JSON)**
 You must return a valid JSON object with the same structure as the original plan:
 {{
   "broad_plan": {{
@@ -349,7 +611,11 @@ You must return a valid JSON object with the same structure as the original plan
     ]
   }}
 }}
-
+""", """### **OUTPUT FORMAT (compact JSON)**
+You must return the complete revised plan, every phase included, as a valid JSON object in this compact format (the original plan below uses the full format):
+{{"o": ["Original objective (unchanged unless explicitly requested to modify)"], "ph": [{{"n": "Phase name (modified if specified in request)", "m": 10, "p": "Purpose statement (updated for any modified phase)", "d": "Description (updated for any modified phase to match new phase name and content)", "c": "Summary of changes made to this phase based on user feedback (if applicable)"}}]}}
+""" + _COMPACT_REVISION_KEYS + """
+""") + """
 ### **CRITICAL REQUIREMENTS**
 1. Your output MUST be valid JSON
 2. When a phase name is changed, its description and purpose MUST be updated to match
@@ -364,6 +630,69 @@ You must return a valid JSON object with the same structure as the original plan
    - Document any duration changes in the phase descriptions
 8. ALWAYS return JUST the JSON content, nothing else (no preamble, no explanation)
 9. Handle all types of user feedback gracefully - from specific changes to vague requests
+""" + _plan_format("", "10. " + _COMPACT_RULE + "\n") + """
+### **ORIGINAL LESSON PLAN**
+{original_plan_json}
+
+### **USER REVISION REQUESTS**
+The user has requested the following changes:
+
+1. Phase name and duration changes:
+{revised_phases}
+
+2. Additional feedback:
+{user_feedback}
+"""
+)
+
+# Patch variant of the precise revision: returns only the changed phases
+PRECISE_REVISION_PATCH_TEMPLATE = PromptTemplate(
+    input_variables=["plan_context", "revised_phases", "user_feedback"],
+    template="""
+You are an expert instructional designer tasked with making precise, targeted revisions to a lesson plan. The lesson plan context and the user's revision requests are given at the end of this prompt.
+
+### **LESSON PLAN CONTEXT FORMAT**
+"phases" holds the full content of the phases relevant to this request, each with its "index" in the outline.
+If present, "plan_summary" lists every phase of the plan (index, name, duration) for orientation.
+
+### **INSTRUCTIONS**
+1. Apply exactly the changes requested by the user; for vague feedback, make intelligent improvements to the phases it refers to
+2. When a phase name changes, update its purpose and description to match the new name
+3. When only a duration changes, adjust the durations of other phases in "phases" so the total lesson time stays exactly the same
+4. Do NOT modify phases that the request does not concern, except to redistribute time
+5. Only phases listed in "phases" may be replaced or deleted; new phases may only be inserted next to them
+6. Do NOT alter the learning objectives unless explicitly requested
+7. Add a brief "summary of changes" to every phase you change
+
+### **OUTPUT FORMAT (JSON PATCH)**
+Return ONLY the changes as operations keyed by the ORIGINAL phase index:
+{{
+  "objectives": null,
+  "operations": [
+    {{"op": "replace", "index": 1, "phase": {{"duration": "15 minutes", "summary of changes": "Extended to allow more practice"}}}},
+    {{"op": "insert", "index": 3, "phase": {{"phase": "New phase name", "duration": "10 minutes", "purpose": "Purpose", "description": "Description", "summary of changes": "Added per user feedback"}}}},
+    {{"op": "delete", "index": 4}}
+  ]
+}}
+
+### **PATCH RULES**
+1. "replace": include ONLY the fields that change ("phase", "duration", "purpose", "description", "summary of changes")
+2. "insert": a complete new phase placed before the original phase at "index" (use the outline length to append)
+3. "delete": removes the original phase at "index"
+4. Each original index may appear in at most one replace or delete operation
+5. Set "objectives" to the complete new list only if the user asked to change objectives, otherwise null
+6. Unchanged phases must NOT appear in the operations
+7. Output valid JSON only, no additional text
+
+### **LESSON PLAN CONTEXT**
+{plan_context}
+
+### **USER REVISION REQUESTS**
+1. Phase name and duration changes:
+{revised_phases}
+
+2. Additional feedback:
+{user_feedback}
 """
 )
 
@@ -381,23 +710,13 @@ QUIZ_GENERATION_TEMPLATE = PromptTemplate(
         "lesson_objectives"
     ],
     template="""
-You are creating a STUDENT-FOCUSED quiz for a lesson phase with the following content:
-{phase_content}
-
-Overall lesson objectives:
-{lesson_objectives}
-
-Requirements:
-- Number of questions: {num_questions}
-- Difficulty: {difficulty} 
-- Question type: {question_type}
-- Additional notes: {additional_notes}
+You are creating a STUDENT-FOCUSED quiz for a lesson phase. The quiz requirements, the overall lesson objectives and the phase content are given at the end of this prompt.
 
 ## QUIZ GUIDELINES:
 1. TARGET AUDIENCE: This quiz is EXCLUSIVELY for STUDENTS, not for teachers or instructors. Questions should directly test student understanding of concepts.
 
 2. CONTENT FOCUS:
-   - Questions must primarily relate to the current phase content provided above
+   - Questions must primarily relate to the phase content given at the end of this prompt
    - However, ensure questions align with the overall lesson objectives
    - Test understanding of key concepts, not memorization of trivial details
 
@@ -458,7 +777,7 @@ Output the quiz in the following JSON format:
   }}
 }}
 
-Requirements:
+Output rules:
 1. Output must be valid JSON
 2. Each question must have:
    - Unique ID (starting from 1)
@@ -470,6 +789,18 @@ Requirements:
    - Detailed explanation
 4. Questions should be relevant to the phase content
 5. Explanations should be educational and thorough
+
+Quiz requirements:
+- Number of questions: {num_questions}
+- Difficulty: {difficulty} 
+- Question type: {question_type}
+- Additional notes: {additional_notes}
+
+Overall lesson objectives:
+{lesson_objectives}
+
+Phase content:
+{phase_content}
 """
 )
 
@@ -482,14 +813,7 @@ CODE_PRACTICE_GENERATION_TEMPLATE = PromptTemplate(
         "additional_requirements"
     ],
     template="""
-You are creating a coding practice exercise for a lesson phase with the following content:
-{phase_content}
-
-Requirements:
-- Programming language: {programming_language}
-- Difficulty: {difficulty}
-- Question type: {question_type} (possible types: "complete function", "fill in the blanks", "debug")
-- Additional requirements: {additional_requirements}
+You are creating a coding practice exercise for a lesson phase. The exercise requirements and the phase content are given at the end of this prompt.
 
 Format your output in the following structure:
 
@@ -500,7 +824,7 @@ Format your output in the following structure:
 Keep this introduction concise but informative.]
 
 #### Starter Code
-```{programming_language}
+```<language>
 # For "complete function" type:
 # Provide function signature and docstring, with TODO comments where student should implement
 # Example:
@@ -534,7 +858,7 @@ Keep this introduction concise but informative.]
 - [Optional second hint if really needed]
 
 #### Solution
-```{programming_language}
+```<language>
 # Complete, correct solution with brief comments explaining key concepts
 # Make sure this solution matches the question_type:
 # - For "complete function": Show the full implementation
@@ -548,6 +872,16 @@ Important notes:
 3. Ensure the solution directly addresses the learning objectives
 4. Do NOT include Example or Test Cases sections
 5. Make sure hints are genuinely helpful without giving away the solution
+6. Write all code in the programming language given in the requirements and use it in place of <language> for the code fences
+
+Requirements:
+- Programming language: {programming_language}
+- Difficulty: {difficulty}
+- Question type: {question_type} (possible types: "complete function", "fill in the blanks", "debug")
+- Additional requirements: {additional_requirements}
+
+Phase content:
+{phase_content}
 """
 )
 
@@ -559,13 +893,7 @@ SLIDES_GENERATION_TEMPLATE = PromptTemplate(
         "additional_requirements"
     ],
     template="""
-You are a professional instructional slide designer tasked with creating slides for the following teaching phase content:
-{phase_content}
-
-Requirements:
-- Slide style: {slide_style}
-- Number of slides: {num_slides}
-- Additional requirements: {additional_requirements}
+You are a professional instructional slide designer tasked with creating slides for a teaching phase. The slide requirements and the phase content are given at the end of this prompt.
 
 Please output the slide content in the following structure:
 
@@ -631,5 +959,38 @@ Important notes:
 6. Create a narrative flow from beginning to end
 7. For each slide, suggest specific visual elements that enhance learning, not just decorative
 8. Keep instructor notes brief but actionable
+
+Requirements:
+- Slide style: {slide_style}
+- Number of slides: {num_slides}
+- Additional requirements: {additional_requirements}
+
+Teaching phase content:
+{phase_content}
+"""
+)
+
+# Several materials for one phase in a single completion; the phase content is sent once
+MULTI_ARTIFACT_TEMPLATE = PromptTemplate(
+    input_variables=["phase_content", "artifact_instructions", "section_markers"],
+    template="""
+You are creating several learning materials for ONE lesson phase. The phase content, given at the end of this prompt, applies to every material.
+
+### **OUTPUT FORMAT**
+Output every requested material in its own section, in the order listed under MATERIALS TO CREATE. Start each section with its marker (listed under SECTION MARKERS) on a line of its own.
+
+Requirements:
+1. Inside each section, follow that material's own output format exactly (JSON for a quiz, Markdown otherwise)
+2. Do NOT wrap a quiz in code fences and do NOT add text before the first marker
+3. Every requested material must be complete
+
+### **MATERIALS TO CREATE**
+{artifact_instructions}
+
+### **SECTION MARKERS**
+{section_markers}
+
+### **PHASE CONTENT**
+{phase_content}
 """
 )
@@ -0,0 +1,227 @@
+"""
+Process-wide rate limiting, adaptive concurrency and retries for provider calls.
+
+All sessions, background jobs and bulk generation run in one process and
+share one limiter per provider:
+
+- Token buckets cap requests and (estimated) tokens per minute
+  ({PROVIDER}_RPM / {PROVIDER}_TPM, 0 = unlimited). A request reserves its
+  share up front and sleeps until the reservation is due, so waiting
+  callers are spaced out instead of firing together.
+- Concurrency adapts AIMD-style: every success raises the limit by
+  1/limit, every 429 or timeout halves it (down to 1).
+- Retryable failures are retried up to RETRY_ATTEMPTS times with jittered
+  exponential backoff. A Retry-After from the provider pauses every caller
+  of that provider, not just the one that was told.
+"""
+# Standard library imports
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Third-party imports
+import openai
+
+# Local imports
+from backend import metrics, tokens
+
+# Define public API
+__all__ = [
+    'RETRY_ATTEMPTS',
+    'MAX_CONCURRENCY',
+    'estimate_message_tokens',
+    'is_retryable',
+    'retry_after',
+    'call'
+]
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "16"))
+# Output tokens reserved per request before the real usage is known
+EXPECTED_OUTPUT_TOKENS = int(os.getenv("EXPECTED_OUTPUT_TOKENS", "1500"))
+
+_DEFAULT_LIMITS = {
+    "openai": (500, 300000),
+    "openrouter": (200, 400000)
+}
+_AIMD_DECREASE = 0.5
+
+
+def _limits(provider: str):
+    default_rpm, default_tpm = _DEFAULT_LIMITS.get(provider, (0, 0))
+    prefix = provider.upper()
+    return (int(os.getenv(f"{prefix}_RPM", str(default_rpm))),
+            int(os.getenv(f"{prefix}_TPM", str(default_tpm))))
+
+
+class _Bucket:
+    """Token bucket refilled continuously at per_minute / 60 per second"""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """Take amount (possibly into debt) and return the seconds until it is covered"""
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def credit(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _ProviderLimiter:
+    def __init__(self, provider: str):
+        rpm, tpm = _limits(provider)
+        self.provider = provider
+        self.requests = _Bucket(rpm) if rpm > 0 else None
+        self.tokens = _Bucket(tpm) if tpm > 0 else None
+        self.limit = float(MAX_CONCURRENCY)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self, tokens: int) -> None:
+        """Block until the request fits the rate limits and the concurrency limit"""
+        with self.condition:
+            wait = max(
+                self.paused_until - time.monotonic(),
+                self.requests.reserve(1) if self.requests else 0.0,
+                self.tokens.reserve(tokens) if self.tokens else 0.0
+            )
+        if wait > 0:
+            metrics.increment(f"rate_limit.{self.provider}.throttled")
+            metrics.observe(f"rate_limit.{self.provider}.wait_seconds", wait)
+            time.sleep(wait)
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, overloaded: bool) -> None:
+        with self.condition:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(1.0, self.limit * _AIMD_DECREASE)
+                metrics.increment(f"rate_limit.{self.provider}.backoff")
+            else:
+                self.limit = min(float(MAX_CONCURRENCY), self.limit + 1.0 / self.limit)
+            metrics.gauge(f"rate_limit.{self.provider}.concurrency", int(self.limit))
+            self.condition.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller of the provider, as the provider asked"""
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def settle(self, reserved: int, used: Optional[int]) -> None:
+        """Correct the token reservation once the real usage is known"""
+        if self.tokens is None or used is None:
+            return
+        with self.condition:
+            self.tokens.credit(reserved - used)
+
+
+_lock = threading.Lock()
+_limiters: Dict[str, _ProviderLimiter] = {}
+
+
+def _limiter(provider: str) -> _ProviderLimiter:
+    with _lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = _limiters[provider] = _ProviderLimiter(provider)
+        return limiter
+
+
+def estimate_message_tokens(messages: Any) -> int:
+    """Estimated input size of a request"""
+    return max(1, tokens.estimate_message_tokens(messages))
+
+
+def _used_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage_metadata", None)
+    if not usage:
+        return None
+    return usage.get("total_tokens") or usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+
+def _is_overload(error: BaseException) -> bool:
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (429, 503, 529)
+    return isinstance(error, (openai.APITimeoutError, TimeoutError))
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Return True for failures that may succeed when repeated"""
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return isinstance(error, (openai.APIConnectionError, TimeoutError, ConnectionError))
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, if it did"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return min(RETRY_MAX_DELAY, max(0.0, float(value) * scale))
+        except ValueError:
+            # An HTTP date; the jittered backoff is close enough
+            continue
+    return None
+
+
+def _backoff(attempt: int) -> float:
+    """Full jitter: anywhere up to the exponential ceiling"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def call(provider: str, messages: Any, request: Callable[[], Any],
+         keep_trying: Callable[[], bool] = lambda: True) -> Any:
+    """Run request() under the provider's limits, retrying retryable failures
+
+    Args:
+        provider: Provider name ("openai", "openrouter")
+        messages: The request's messages, for the token estimate
+        request: Makes the call
+        keep_trying: Checked before each retry (e.g. the circuit is still closed)
+
+    Returns:
+        The result of request()
+    """
+    limiter = _limiter(provider)
+    reserved = estimate_message_tokens(messages) + EXPECTED_OUTPUT_TOKENS
+    for attempt in range(RETRY_ATTEMPTS + 1):
+        limiter.acquire(reserved)
+        try:
+            result = request()
+        except Exception as e:
+            limiter.release(overloaded=_is_overload(e))
+            # A failed attempt produced no output; the next attempt reserves again
+            limiter.settle(reserved, 0)
+            if attempt == RETRY_ATTEMPTS or not is_retryable(e) or not keep_trying():
+                raise
+            delay = retry_after(e)
+            if delay is not None:
+                limiter.pause(delay)
+            else:
+                delay = _backoff(attempt)
+            metrics.increment(f"rate_limit.{provider}.retries")
+            time.sleep(delay)
+            continue
+        limiter.release(overloaded=False)
+        limiter.settle(reserved, _used_tokens(result))
+        return result
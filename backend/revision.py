@@ -0,0 +1,162 @@
+"""
+Parallel application of critique points.
+
+Selected critique points are grouped by the phases they concern. Points whose
+context windows overlap are revised together; independent groups are revised
+concurrently, each returning a patch limited to its own window (see
+backend/plan_patch.py), and the patches are merged locally. A position
+between two windows is open to inserts from one group only, so merged
+patches never insert at the same place. Each group adjusts durations
+without seeing the others, so after merging the phases no patch retimed
+are rebalanced to keep the lesson's total length.
+"""
+# Standard library imports
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Local imports
+from backend.call_context import bind
+from backend.chains import create_revise_selected_patch_chain
+from backend import metrics
+from backend.json_repair import parse_llm_json
+from backend.plan_context import build_plan_context, context_window
+from backend.plan_edits import PlanEditError, format_duration, rebalance_durations
+from backend.plan_patch import PatchError, apply_plan_patch, validate_plan_patch
+from backend.plan_utils import parse_duration_minutes
+
+# Define public API
+__all__ = [
+    'MAX_PARALLEL_REVISIONS',
+    'group_critique_points',
+    'revise_point_groups'
+]
+
+# Upper bound on concurrent revision calls for one improvement request
+MAX_PARALLEL_REVISIONS = int(os.getenv("MAX_PARALLEL_REVISIONS", "4"))
+
+PointGroup = Tuple[List[Dict[str, Any]], List[int]]
+
+
+def group_critique_points(plan: Dict[str, Any], points: List[Dict[str, Any]]) -> Optional[List[PointGroup]]:
+    """Group points whose context windows overlap
+
+    Args:
+        plan: The plan being improved
+        points: Selected critique points
+
+    Returns:
+        (points, window) groups in outline order with pairwise disjoint windows,
+        or None if any point concerns the plan as a whole
+    """
+    groups: List[Tuple[List[Dict[str, Any]], set]] = []
+    for point in points:
+        window = context_window(plan, f"{point.get('issue', '')} {point.get('suggestion', '')}")
+        if window is None:
+            return None
+        merged_points, merged_window = [point], set(window)
+        remaining = []
+        for group_points, group_window in groups:
+            if group_window & merged_window:
+                merged_points = group_points + merged_points
+                merged_window |= group_window
+            else:
+                remaining.append((group_points, group_window))
+        groups = remaining + [(merged_points, merged_window)]
+    return [(group_points, sorted(window)) for group_points, window in sorted(groups, key=lambda g: min(g[1]))]
+
+
+def _insert_positions(groups: List[PointGroup]) -> List[Set[int]]:
+    """Insert positions of each group: its phases, and the place after each of
+    them unless that place belongs to another group's window"""
+    owned = {index for _, window in groups for index in window}
+    return [set(window) | {index + 1 for index in window if index + 1 not in owned}
+            for _, window in groups]
+
+
+def _keep_total_duration(plan: Dict[str, Any], operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Add duration changes so the merged operations keep the plan's total time
+
+    Phases that no operation retimes, deletes or inserts absorb the
+    difference. Operations are returned unchanged if a duration cannot be
+    read or the difference cannot be absorbed.
+    """
+    original = [parse_duration_minutes(phase.get("duration")) for phase in plan.get("outline", [])]
+    if None in original:
+        return operations
+    deleted = {op["index"] for op in operations if op["op"] == "delete"}
+    replaced = {op["index"]: op for op in operations if op["op"] == "replace"}
+    retimed = {index for index, op in replaced.items() if "duration" in op["phase"]}
+    added = [parse_duration_minutes(op["phase"].get("duration")) for op in operations if op["op"] == "insert"]
+    added += [parse_duration_minutes(replaced[index]["phase"]["duration"]) for index in retimed - deleted]
+    if None in added:
+        return operations
+
+    flexible = {index: minutes for index, minutes in enumerate(original)
+                if index not in deleted and index not in retimed}
+    amount = sum(original) - sum(added)
+    if not flexible or amount == sum(flexible.values()):
+        return operations
+    try:
+        minutes = rebalance_durations(flexible, amount)
+    except PlanEditError:
+        metrics.increment("revision.total_duration_unbalanced")
+        return operations
+
+    metrics.increment("revision.total_duration_rebalanced")
+    operations = list(operations)
+    note = "Duration adjusted to keep the total lesson time"
+    for index, new in minutes.items():
+        if new == original[index]:
+            continue
+        op = replaced.get(index)
+        if op is None:
+            operations.append({"op": "replace", "index": index,
+                               "phase": {"duration": format_duration(new), "summary of changes": note}})
+            continue
+        fields = {**op["phase"], "duration": format_duration(new)}
+        summary = fields.get("summary of changes")
+        fields["summary of changes"] = f"{summary}; {note}" if summary else note
+        operations[operations.index(op)] = {**op, "phase": fields}
+    return operations
+
+
+def revise_point_groups(llm, plan: Dict[str, Any], groups: List[PointGroup]) -> Dict[str, Any]:
+    """Revise every group concurrently and merge the patches into the plan
+
+    Args:
+        llm: Language model for revision
+        plan: The plan being improved (not modified)
+        groups: Groups from group_critique_points
+
+    Returns:
+        dict: The revised plan
+
+    Raises:
+        ValueError: If any group's output is unreadable, cut off or outside its window
+    """
+    chain = create_revise_selected_patch_chain(llm)
+    positions = _insert_positions(groups)
+
+    def revise(group: PointGroup, inserts: Set[int]) -> Dict[str, Any]:
+        points, window = group
+        result = chain.invoke({
+            "plan_context": build_plan_context(plan, window),
+            "selected_critique_points": json.dumps(points, ensure_ascii=False)
+        })
+        parsed = parse_llm_json(result["plan_patch"])
+        if parsed.truncated:
+            raise PatchError("Patch output was cut off")
+        return {"operations": validate_plan_patch(plan, parsed.data, window, inserts)}
+
+    if len(groups) == 1:
+        patches = [revise(groups[0], positions[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(groups), MAX_PARALLEL_REVISIONS)) as executor:
+            patches = list(executor.map(bind(revise), groups, positions))
+
+    # Windows and insert positions are disjoint, so the operations cannot conflict.
+    # Each patch was checked against its window; rebalancing may retime any phase.
+    operations = [op for patch in patches for op in patch["operations"]]
+    return apply_plan_patch(plan, {"objectives": None, "operations": _keep_total_duration(plan, operations)})
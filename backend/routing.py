@@ -0,0 +1,352 @@
+"""
+Provider routing for model calls.
+
+get_llm and get_openrouter_llm return a RoutedLLM: the requested model
+(primary) plus the same task on the other provider (alternate), and a
+cheaper fast tier of both. Chains use it like any chat model. A call uses
+the tier its chain asks for (see TEMPLATE_TIERS in backend/chains.py) or
+the caller overrides with tier_scope(), and the fast tier once the caller's
+budget reaches its warning level (see backend/budgets.py); a used-up budget
+refuses the call.
+
+With HEDGING=1, a call whose primary has not produced its first token by the
+HEDGE_PERCENTILE first-token latency of earlier calls of the same template
+fires a backup request to the alternate. The first valid response wins and
+the other request is cancelled. Text calls are streamed so the first token
+is observable and a losing stream can be closed; structured (tool calling)
+calls are not streamed, so for them the deadline covers the whole response
+and a losing request is only discarded. Hedges per template are capped at a
+share of its calls (HEDGE_BUDGET, overridable per template with
+HEDGE_BUDGETS="critique=0.2,quiz=0").
+
+Backends are ordered per call by backend/health.py: a backend with an open
+circuit is skipped and a degraded one is tried last. Without hedging, a
+call that fails for provider reasons (after the retries of
+backend/rate_limit.py) is retried once on the next backend. Calls wait for
+a slot of backend/scheduler.py before any of this starts.
+"""
+# Standard library imports
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+# Local imports
+from backend import budgets, health, metrics, prompt_cache, rate_limit, scheduler, tokens, traffic
+from backend.call_context import (
+    bind,
+    current_prompt_stats,
+    current_teacher,
+    current_template,
+    current_tenant,
+    current_tier,
+    tier_scope
+)
+
+# Define public API
+__all__ = [
+    'HEDGING_ENABLED',
+    'HEDGE_PERCENTILE',
+    'HEDGE_DEFAULT_DELAY',
+    'QUALITY_TIER',
+    'FAST_TIER',
+    'Backend',
+    'RoutedLLM',
+    'hedge_delay',
+    'hedge_budget'
+]
+
+
+def _parse_budgets(value: str) -> Dict[str, float]:
+    """Parse "template=share,..." into a dict"""
+    budgets = {}
+    for item in value.split(","):
+        name, _, share = item.partition("=")
+        if name.strip() and share.strip():
+            budgets[name.strip()] = float(share)
+    return budgets
+
+
+HEDGING_ENABLED = os.getenv("HEDGING", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+# Deadline in seconds until a template has HEDGE_MIN_SAMPLES latencies
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "20"))
+HEDGE_MIN_SAMPLES = 20
+# Share of a template's calls that may be hedged
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))
+HEDGE_BUDGETS = _parse_budgets(os.getenv("HEDGE_BUDGETS", ""))
+
+QUALITY_TIER = "quality"
+FAST_TIER = "fast"
+
+# First-token latencies kept per (template, backend)
+_LATENCY_WINDOW = 200
+
+_lock = threading.Lock()
+_latencies: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=_LATENCY_WINDOW))
+_calls: Dict[str, int] = defaultdict(int)
+_hedges: Dict[str, int] = defaultdict(int)
+
+
+class Backend(NamedTuple):
+    provider: str
+    model: str
+    llm: Any
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+class _Cancelled(Exception):
+    """Raised inside a request that lost the race"""
+
+
+def _record_latency(template: str, backend: Backend, seconds: float) -> None:
+    with _lock:
+        _latencies[(template, backend.key)].append(seconds)
+    metrics.observe(f"llm.first_token_seconds.{backend.key}", seconds)
+
+
+def hedge_delay(template: str, backend: Backend) -> float:
+    """Seconds to wait for the first token of backend before hedging a template's call"""
+    with _lock:
+        samples = sorted(_latencies.get((template, backend.key), ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return samples[min(len(samples) - 1, int(HEDGE_PERCENTILE * len(samples)))]
+
+
+def hedge_budget(template: str) -> float:
+    """Share of a template's calls that may be hedged"""
+    return HEDGE_BUDGETS.get(template, HEDGE_BUDGET)
+
+
+def _take_hedge(template: str) -> bool:
+    """Count a hedge against the template's budget; False if it is used up"""
+    budget = hedge_budget(template)
+    with _lock:
+        # One hedge is allowed before the budget has calls to be a share of
+        if budget <= 0 or _hedges[template] >= budget * _calls[template] + 1:
+            return False
+        _hedges[template] += 1
+        return True
+
+
+def _start(fn: Callable[..., Any], *args: Any) -> Future:
+    """Run fn on its own thread; a pool could queue a backup behind the request it backs up"""
+    future: Future = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=bind(run), name="llm-request", daemon=True).start()
+    return future
+
+
+def _is_valid(result: Any) -> bool:
+    if result is None:
+        return False
+    content = getattr(result, "content", None)
+    return content is None or bool(content) or bool(getattr(result, "tool_calls", None))
+
+
+def _should_fail_over(error: BaseException) -> bool:
+    """Whether a failed request should be retried on the next backend"""
+    return health.is_provider_failure(error) or isinstance(error, health.ProviderUnavailableError)
+
+
+class RoutedLLM:
+    """
+    Chat model facade over model tiers, each a primary backend and alternates.
+
+    Supports invoke(messages) and with_structured_output(), which is all the
+    chain layer uses.
+    """
+
+    def __init__(self, tiers: Dict[str, List[Backend]], streaming: bool = True):
+        self.tiers = tiers
+        self.streaming = streaming
+
+    def with_structured_output(self, schema, **kwargs) -> "RoutedLLM":
+        return RoutedLLM(
+            {
+                tier: [backend._replace(llm=backend.llm.with_structured_output(schema, **kwargs))
+                       for backend in backends]
+                for tier, backends in self.tiers.items()
+            },
+            streaming=False
+        )
+
+    def _tier(self, budget_level: str) -> str:
+        """Model tier of a call: the requested one, or the fast tier once the caller's budget is in warning"""
+        tier = current_tier() or QUALITY_TIER
+        if budget_level == budgets.WARNING and tier != FAST_TIER and FAST_TIER in self.tiers:
+            metrics.increment("budget.downgraded")
+            return FAST_TIER
+        return tier if tier in self.tiers else QUALITY_TIER
+
+    def _request(self, backend: Backend, messages: Any, template: str,
+                 first_token: Optional[threading.Event] = None,
+                 cancel: Optional[threading.Event] = None) -> Any:
+        """One request to backend under the provider's rate limits, reported to the health tracker
+
+        With first_token (a hedged call) text requests are streamed:
+        first_token is set when the first token arrives and cancel stops the
+        request between chunks.
+        """
+        request_messages = messages
+        stats = current_prompt_stats()
+        if stats and prompt_cache.supports_cache_hints(backend.provider, backend.model):
+            request_messages = prompt_cache.with_cache_hints(messages, stats["prefix_chars"], stats["prefix_tokens"])
+
+        elapsed = [0.0]
+
+        def attempt() -> Any:
+            start = time.monotonic()
+            try:
+                if first_token is None:
+                    result = backend.llm.invoke(request_messages)
+                elif not self.streaming:
+                    result = backend.llm.invoke(request_messages)
+                    _record_latency(template, backend, time.monotonic() - start)
+                else:
+                    result = self._stream(backend, request_messages, template, start, first_token, cancel)
+            except _Cancelled:
+                raise
+            except Exception as e:
+                if health.is_provider_failure(e):
+                    health.record_failure(backend.key)
+                raise
+            elapsed[0] = time.monotonic() - start
+            health.record_success(backend.key, elapsed[0])
+            return result
+
+        # While half-open only one call (the probe) gets through; the others fail over
+        if not health.acquire(backend.key):
+            raise health.ProviderUnavailableError(f"{backend.key} is recovering from an outage")
+        try:
+            # Retries stop once the circuit opens (failover takes over) or the race is lost
+            result = rate_limit.call(
+                backend.provider, messages, attempt,
+                keep_trying=lambda: health.state(backend.key) != health.OPEN and not (cancel and cancel.is_set())
+            )
+        finally:
+            health.release(backend.key)
+        # Accounted once the call has succeeded, outside the retries
+        self._account(backend, messages, template, result, elapsed[0], stats)
+        return result
+
+    def _account(self, backend: Backend, messages: Any, template: str, result: Any,
+                 seconds: float, stats: Optional[Dict[str, Any]]) -> None:
+        """Charge a successful call to the budgets and record it; never fails the call"""
+        input_tokens, output_tokens = budgets.usage_of(messages, result)
+        cached = prompt_cache.cached_tokens(result)
+        try:
+            budgets.record(backend.model, input_tokens, output_tokens,
+                           session=current_tenant(), teacher=current_teacher())
+        except Exception:
+            # The answer is already paid for; losing it over a counter would waste it
+            metrics.increment("budget.record_failed")
+        prompt_cache.record(template, input_tokens, cached)
+        traffic.record(template, current_tier() or QUALITY_TIER, backend.key,
+                       input_tokens, output_tokens, seconds, messages,
+                       estimated_input_tokens=tokens.estimate_message_tokens(messages),
+                       prompt_stats=stats, cached_input_tokens=cached)
+        metrics.increment(f"llm.tokens.{backend.key}", input_tokens + output_tokens)
+
+    def _stream(self, backend: Backend, messages: Any, template: str, start: float,
+                first_token: threading.Event, cancel: threading.Event) -> Any:
+        response = None
+        stream = backend.llm.stream(messages)
+        try:
+            for chunk in stream:
+                if response is None:
+                    _record_latency(template, backend, time.monotonic() - start)
+                    first_token.set()
+                if cancel.is_set():
+                    raise _Cancelled()
+                response = chunk if response is None else response + chunk
+        finally:
+            # Closing the generator closes the HTTP stream
+            stream.close()
+        return response
+
+    def invoke(self, messages: Any) -> Any:
+        template = current_template()
+        tier = self._tier(budgets.check(current_tenant(), current_teacher()))
+        metrics.increment(f"routing.tier.{tier}")
+        with scheduler.slot(template), tier_scope(tier):
+            return self._invoke(messages, template, self.tiers[tier])
+
+    def _invoke(self, messages: Any, template: str, backends: List[Backend]) -> Any:
+        with _lock:
+            _calls[template] += 1
+        by_key = {backend.key: backend for backend in backends}
+        candidates = [by_key[key] for key in health.route(list(by_key))]
+        if not candidates:
+            raise health.ProviderUnavailableError(
+                "All model providers are temporarily unavailable. Please try again shortly.")
+        if HEDGING_ENABLED and len(candidates) > 1:
+            return self._hedged(candidates[0], candidates[1], messages, template)
+
+        try:
+            return self._request(candidates[0], messages, template)
+        except Exception as e:
+            if len(candidates) < 2 or not _should_fail_over(e):
+                raise
+        metrics.increment("routing.failover")
+        return self._request(candidates[1], messages, template)
+
+    def _hedged(self, primary: Backend, backup: Backend, messages: Any, template: str) -> Any:
+        """Race primary against backup if primary's first token is late"""
+        first_token, cancel = threading.Event(), threading.Event()
+        primary_future = _start(self._request, primary, messages, template, first_token, cancel)
+        # A request that ends (even with an error) stops the wait as well
+        primary_future.add_done_callback(lambda _: first_token.set())
+        if first_token.wait(hedge_delay(template, primary)) and not (
+                primary_future.done() and primary_future.exception() is not None):
+            return primary_future.result()
+        if not _take_hedge(template):
+            metrics.increment("hedging.budget_exhausted")
+            # Without a hedge this is a plain request, so a failed primary still fails over
+            try:
+                return primary_future.result()
+            except Exception as e:
+                if not _should_fail_over(e):
+                    raise
+            metrics.increment("routing.failover")
+            return self._request(backup, messages, template)
+
+        metrics.increment("hedging.fired")
+        metrics.increment(f"hedging.{template}.fired")
+        backup_cancel = threading.Event()
+        backup_future = _start(self._request, backup, messages, template, threading.Event(), backup_cancel)
+        racers = {primary_future: ("primary", cancel), backup_future: ("backup", backup_cancel)}
+
+        pending = set(racers)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                result = future.result()
+                if not _is_valid(result):
+                    continue
+                for loser in pending:
+                    racers[loser][1].set()
+                    loser.cancel()
+                metrics.increment(f"hedging.won.{racers[future][0]}")
+                return result
+        if error is not None:
+            raise error
+        raise ValueError("No backend returned a valid response")
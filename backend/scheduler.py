@@ -0,0 +1,181 @@
+"""
+Priority scheduling of model calls.
+
+Every model call takes one of SCHEDULER_SLOTS process-wide slots before it
+is sent. Waiting calls are admitted by priority class (interactive >
+revision > artifact > speculative > batch) and, within a class, the tenant
+with the fewest running calls goes first, so one session's bulk work cannot
+starve another's.
+
+Only interactive and revision calls may hold the last
+SCHEDULER_RESERVED_SLOTS slots, so they find a free slot even while bulk
+material generation or background work is piling up. When an interactive
+or revision call has to wait anyway, queued speculative and batch calls are
+preempted: they fail with PreemptedError instead of running later. Running
+calls are never interrupted.
+
+The class comes from priority_scope() when the caller set one (background
+work does), otherwise from the template being invoked.
+"""
+# Standard library imports
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# Local imports
+from backend import metrics
+from backend.call_context import current_priority, current_template, current_tenant
+
+# Define public API
+__all__ = [
+    'PRIORITY_CLASSES',
+    'TEMPLATE_PRIORITIES',
+    'SCHEDULER_SLOTS',
+    'PreemptedError',
+    'priority_for',
+    'slot',
+    'queue_depths'
+]
+
+# Highest priority first
+PRIORITY_CLASSES = ("interactive", "revision", "artifact", "speculative", "batch")
+_RANK = {name: rank for rank, name in enumerate(PRIORITY_CLASSES)}
+
+# Class of each chain's calls unless the caller says otherwise
+TEMPLATE_PRIORITIES: Dict[str, str] = {
+    "broad_plan_draft": "interactive",
+    "remaining_phases": "interactive",
+    "critique": "revision",
+    "critique_followup": "revision",
+    "critique_dimension": "revision",
+    "revised_plan": "revision",
+    "revise_selected_patch": "revision",
+    "precisely_revised_plan": "revision",
+    "precise_revision_patch": "revision",
+    "quiz": "artifact",
+    "code_practice": "artifact",
+    "slides": "artifact",
+    "materials": "artifact"
+}
+
+SCHEDULER_SLOTS = int(os.getenv("SCHEDULER_SLOTS", "16"))
+SCHEDULER_RESERVED_SLOTS = int(os.getenv("SCHEDULER_RESERVED_SLOTS", "4"))
+_PREEMPTIBLE_CLASSES = ("speculative", "batch")
+_URGENT_CLASSES = ("interactive", "revision")
+
+
+class PreemptedError(RuntimeError):
+    """Raised in a queued call that gave way to more urgent work"""
+
+
+class _Waiter:
+    def __init__(self, priority: str, tenant: str, seq: int):
+        self.priority = priority
+        self.tenant = tenant
+        self.seq = seq
+        self.granted = False
+        self.preempted = False
+
+
+_condition = threading.Condition()
+_sequence = itertools.count()
+_waiting: List[_Waiter] = []
+_running: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+_tenant_running: Dict[str, int] = {}
+
+
+def priority_for(template: str) -> str:
+    """Priority class of a call to template in the current context"""
+    priority = current_priority() or TEMPLATE_PRIORITIES.get(template, "interactive")
+    return priority if priority in _RANK else "interactive"
+
+
+def _can_start(priority: str) -> bool:
+    """Return True if a call of priority fits now (caller holds the lock)"""
+    if sum(_running.values()) >= SCHEDULER_SLOTS:
+        return False
+    if priority not in _URGENT_CLASSES:
+        # The reserved slots are kept free for urgent calls
+        other = sum(count for name, count in _running.items() if name not in _URGENT_CLASSES)
+        return other < SCHEDULER_SLOTS - SCHEDULER_RESERVED_SLOTS
+    return True
+
+
+def _report_depths() -> None:
+    for name in PRIORITY_CLASSES:
+        metrics.gauge(f"scheduler.{name}.queued", sum(1 for w in _waiting if w.priority == name))
+        metrics.gauge(f"scheduler.{name}.running", _running[name])
+
+
+def _dispatch() -> None:
+    """Admit waiting calls while slots allow (caller holds the lock)"""
+    while True:
+        candidates = [waiter for waiter in _waiting if _can_start(waiter.priority)]
+        if not candidates:
+            break
+        waiter = min(candidates, key=lambda w: (_RANK[w.priority], _tenant_running.get(w.tenant, 0), w.seq))
+        _waiting.remove(waiter)
+        waiter.granted = True
+        _running[waiter.priority] += 1
+        _tenant_running[waiter.tenant] = _tenant_running.get(waiter.tenant, 0) + 1
+    _report_depths()
+    _condition.notify_all()
+
+
+def _preempt() -> None:
+    """Drop queued preemptible calls (caller holds the lock)"""
+    for waiter in [w for w in _waiting if w.priority in _PREEMPTIBLE_CLASSES]:
+        _waiting.remove(waiter)
+        waiter.preempted = True
+        metrics.increment(f"scheduler.{waiter.priority}.preempted")
+    # Wake the dropped calls so they raise instead of waiting for the next dispatch
+    _condition.notify_all()
+
+
+@contextmanager
+def slot(template: Optional[str] = None) -> Iterator[str]:
+    """Hold a call slot for the block, waiting for it by priority
+
+    Args:
+        template: Template being invoked (default: the current template)
+
+    Yields:
+        The call's priority class
+
+    Raises:
+        PreemptedError: If the call was preempted while queued
+    """
+    priority = priority_for(template or current_template())
+    tenant = current_tenant()
+    waiter = _Waiter(priority, tenant, next(_sequence))
+    start = time.monotonic()
+    with _condition:
+        _waiting.append(waiter)
+        _dispatch()
+        if not waiter.granted and priority in _URGENT_CLASSES:
+            _preempt()
+            _report_depths()
+        while not waiter.granted and not waiter.preempted:
+            _condition.wait()
+    metrics.observe(f"scheduler.{priority}.wait_seconds", time.monotonic() - start)
+    if waiter.preempted:
+        raise PreemptedError(f"{priority} call preempted by more urgent work")
+
+    try:
+        yield priority
+    finally:
+        with _condition:
+            _running[priority] -= 1
+            _tenant_running[tenant] -= 1
+            if not _tenant_running[tenant]:
+                del _tenant_running[tenant]
+            _dispatch()
+
+
+def queue_depths() -> Dict[str, int]:
+    """Number of queued calls per priority class"""
+    with _condition:
+        return {name: sum(1 for w in _waiting if w.priority == name) for name in PRIORITY_CLASSES}
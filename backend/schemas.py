@@ -0,0 +1,204 @@
+"""
+Output schemas for the structured-output (tool-calling) path of the chains.
+
+They mirror the JSON formats requested in backend/prompts.py, so a validated
+object dumps to exactly the shape the frontend already consumes. The
+Compact* schemas mirror the compact plan wire format (see
+backend/plan_utils.py) and expand to the same shape.
+"""
+# Standard library imports
+from typing import Any, Dict, List, Literal, Optional
+
+# Third-party imports
+from pydantic import BaseModel, Field
+
+# Local imports
+from backend.plan_utils import expand_phase
+
+# Define public API
+__all__ = [
+    'PlanPhase',
+    'BroadPlan',
+    'PlanResult',
+    'PhaseListResult',
+    'CompactPhase',
+    'CompactPlanResult',
+    'CompactPhaseListResult',
+    'PhasePatch',
+    'PatchOperation',
+    'PlanPatch',
+    'CritiquePoint',
+    'CritiqueResult',
+    'QuizQuestion',
+    'QuizAnswer',
+    'QuizData',
+    'QuizResult'
+]
+
+
+class PlanPhase(BaseModel):
+    """One teaching phase of the outline"""
+    phase: str = Field(description="Phase name")
+    duration: str = Field(description="Duration, e.g. '10 minutes'")
+    purpose: str = Field(description="What students will achieve in this phase")
+    description: str = Field(description="How this phase will unfold")
+    # Tool schemas only allow identifier-like names; the plan JSON uses "summary of changes"
+    summary_of_changes: Optional[str] = Field(
+        default=None,
+        description="Summary of changes made to this phase, only when it was revised"
+    )
+
+    def to_output(self) -> Dict[str, Any]:
+        data = self.model_dump(exclude={"summary_of_changes"})
+        if self.summary_of_changes:
+            data["summary of changes"] = self.summary_of_changes
+        return data
+
+
+class BroadPlan(BaseModel):
+    """Learning objectives plus ordered outline"""
+    objectives: List[str]
+    outline: List[PlanPhase]
+
+
+class PlanResult(BaseModel):
+    """A complete lesson plan"""
+    broad_plan: BroadPlan
+
+    def to_output(self) -> Dict[str, Any]:
+        return {
+            "broad_plan": {
+                "objectives": list(self.broad_plan.objectives),
+                "outline": [phase.to_output() for phase in self.broad_plan.outline]
+            }
+        }
+
+
+class PhaseListResult(BaseModel):
+    """Additional teaching phases for an existing plan"""
+    outline: List[PlanPhase]
+
+    def to_output(self) -> Dict[str, Any]:
+        return {"outline": [phase.to_output() for phase in self.outline]}
+
+
+class CompactPhase(BaseModel):
+    """One teaching phase in the compact wire format"""
+    n: str = Field(description="Phase name")
+    m: int = Field(description="Duration in minutes")
+    p: str = Field(description="Purpose: what students will achieve in this phase")
+    d: str = Field(description="Description: how this phase will unfold")
+    c: Optional[str] = Field(default=None, description="Summary of changes, only when the phase was revised")
+
+    def to_output(self) -> Dict[str, Any]:
+        return expand_phase(self.model_dump(exclude_none=True))
+
+
+class CompactPlanResult(BaseModel):
+    """A complete lesson plan in the compact wire format"""
+    o: List[str] = Field(description="Learning objectives")
+    ph: List[CompactPhase] = Field(description="Teaching phases in order")
+
+    def to_output(self) -> Dict[str, Any]:
+        return {
+            "broad_plan": {
+                "objectives": list(self.o),
+                "outline": [phase.to_output() for phase in self.ph]
+            }
+        }
+
+
+class CompactPhaseListResult(BaseModel):
+    """Additional teaching phases in the compact wire format"""
+    ph: List[CompactPhase] = Field(description="Teaching phases in order")
+
+    def to_output(self) -> Dict[str, Any]:
+        return {"outline": [phase.to_output() for phase in self.ph]}
+
+
+class PhasePatch(BaseModel):
+    """Phase fields set by a patch operation; omitted fields stay unchanged"""
+    phase: Optional[str] = None
+    duration: Optional[str] = None
+    purpose: Optional[str] = None
+    description: Optional[str] = None
+    summary_of_changes: Optional[str] = None
+
+    def to_output(self) -> Dict[str, Any]:
+        data = self.model_dump(exclude={"summary_of_changes"}, exclude_none=True)
+        if self.summary_of_changes:
+            data["summary of changes"] = self.summary_of_changes
+        return data
+
+
+class PatchOperation(BaseModel):
+    """Replace, insert or delete a phase at an index of the original outline"""
+    op: Literal["replace", "insert", "delete"]
+    index: int
+    phase: Optional[PhasePatch] = Field(
+        default=None, description="Changed fields for replace, the complete phase for insert")
+
+    def to_output(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"op": self.op, "index": self.index}
+        if self.phase is not None:
+            data["phase"] = self.phase.to_output()
+        return data
+
+
+class PlanPatch(BaseModel):
+    """Changes to a lesson plan; objectives only when they change"""
+    objectives: Optional[List[str]] = None
+    operations: List[PatchOperation]
+
+    def to_output(self) -> Dict[str, Any]:
+        return {
+            "objectives": self.objectives,
+            "operations": [operation.to_output() for operation in self.operations]
+        }
+
+
+class CritiquePoint(BaseModel):
+    """A single critique point"""
+    id: int
+    issue: str = Field(description="Clear description of a specific issue in the lesson plan")
+    suggestion: str = Field(description="Specific, actionable suggestion to address the issue")
+
+
+class CritiqueResult(BaseModel):
+    """The 1-7 critique points of a lesson plan"""
+    points: List[CritiquePoint]
+
+    def to_output(self) -> List[Dict[str, Any]]:
+        return [point.model_dump() for point in self.points]
+
+
+class QuizQuestion(BaseModel):
+    """A quiz question; options only for multiple choice"""
+    id: int
+    question: str
+    options: Optional[Dict[str, str]] = Field(
+        default=None, description="Options keyed A-D for multiple choice questions")
+
+
+class QuizAnswer(BaseModel):
+    """Answer and explanation for the question with the same id"""
+    id: int
+    correct_answer: Optional[str] = Field(
+        default=None, description="Correct option letter for multiple choice questions")
+    expected_elements: Optional[List[str]] = Field(
+        default=None, description="Expected response elements for short answer questions")
+    explanation: str
+
+
+class QuizData(BaseModel):
+    questions: List[QuizQuestion]
+    answers: List[QuizAnswer]
+
+
+class QuizResult(BaseModel):
+    """A complete quiz for one phase"""
+    phase_name: str
+    quiz_data: QuizData
+
+    def to_output(self) -> Dict[str, Any]:
+        return self.model_dump(exclude_none=True)
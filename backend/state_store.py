@@ -0,0 +1,300 @@
+"""
+Pluggable storage for per-session workflow state.
+
+Streamlit keeps ``st.session_state`` in the memory of the server process that
+owns the websocket. Mirroring the workflow keys into a shared store lets any
+worker behind a load balancer serve a session and survive restarts.
+
+The store also keeps named counters (e.g. the token budgets of
+backend/budgets.py) that every worker adds to, so limits hold across
+workers and restarts.
+"""
+# Standard library imports
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import closing, contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+# Define public API
+__all__ = [
+    'StateConflictError',
+    'StateStore',
+    'InMemoryStateStore',
+    'SQLiteStateStore',
+    'encode_state',
+    'decode_state',
+    'get_state_store',
+    'new_session_id',
+    'is_valid_session_id'
+]
+
+DEFAULT_DB_PATH = os.path.join(".state", "session_state.db")
+
+# Key for signing session ids; must be shared by all workers (a random
+# per-process key only works for a single worker)
+SESSION_SECRET = os.getenv("SESSION_SECRET") or secrets.token_hex(32)
+
+
+class StateConflictError(Exception):
+    """Raised when a save is based on a stale version of the session state."""
+
+    def __init__(self, session_id: str, expected_version: int, current_version: int):
+        super().__init__(
+            f"State for session {session_id} is at version {current_version}, "
+            f"expected {expected_version}"
+        )
+        self.session_id = session_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+
+def encode_state(state: Dict[str, Any]) -> bytes:
+    """Serialize state as compact, zlib-compressed JSON
+
+    Raises:
+        TypeError: If a value is not JSON-serializable (it could not be
+            restored as the same object)
+    """
+    payload = json.dumps(state, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return zlib.compress(payload.encode("utf-8"), 6)
+
+
+def decode_state(blob: bytes) -> Dict[str, Any]:
+    """Inverse of encode_state"""
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class StateStore(ABC):
+    """Versioned key-value store for session state.
+
+    Every successful save bumps the version by one. A save must name the version
+    it was based on; if another worker saved in between, StateConflictError is
+    raised and the caller should reload (optimistic concurrency control).
+    """
+
+    @abstractmethod
+    def load(self, session_id: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        """Return (state, version); (None, 0) if the session is unknown"""
+
+    @abstractmethod
+    def save(self, session_id: str, state: Dict[str, Any], expected_version: int) -> int:
+        """Store state and return the new version"""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Remove a session's state"""
+
+    @abstractmethod
+    def increment_counters(self, keys: Sequence[str], amounts: Dict[str, float]) -> None:
+        """Atomically add amounts (field -> value) to each of the counters keys"""
+
+    @abstractmethod
+    def read_counters(self, keys: Sequence[str]) -> Dict[str, Dict[str, float]]:
+        """Current fields of each counter in keys (missing counters are left out)"""
+
+    @abstractmethod
+    def expire_counters(self, max_age: float) -> None:
+        """Remove counters not incremented in the last max_age seconds"""
+
+
+class InMemoryStateStore(StateStore):
+    """Process-local store. Default backend for single-process deployments."""
+
+    def __init__(self):
+        self._records: Dict[str, Tuple[int, bytes]] = {}
+        self._counters: Dict[str, Tuple[float, Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            record = self._records.get(session_id)
+        if record is None:
+            return None, 0
+        version, blob = record
+        return decode_state(blob), version
+
+    def save(self, session_id, state, expected_version):
+        blob = encode_state(state)
+        with self._lock:
+            current_version = self._records.get(session_id, (0, b""))[0]
+            if current_version != expected_version:
+                raise StateConflictError(session_id, expected_version, current_version)
+            self._records[session_id] = (current_version + 1, blob)
+            return current_version + 1
+
+    def delete(self, session_id):
+        with self._lock:
+            self._records.pop(session_id, None)
+
+    def increment_counters(self, keys, amounts):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                fields = dict(self._counters.get(key, (now, {}))[1])
+                for field, amount in amounts.items():
+                    fields[field] = fields.get(field, 0) + amount
+                self._counters[key] = (now, fields)
+
+    def read_counters(self, keys):
+        with self._lock:
+            return {key: dict(self._counters[key][1]) for key in keys if key in self._counters}
+
+    def expire_counters(self, max_age):
+        cutoff = time.time() - max_age
+        with self._lock:
+            for key in [key for key, (updated, _) in self._counters.items() if updated < cutoff]:
+                del self._counters[key]
+
+
+class SQLiteStateStore(StateStore):
+    """File-backed store shared by all workers on a host (stand-in for a shared database)."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_state ("
+                " session_id TEXT PRIMARY KEY,"
+                " version INTEGER NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " payload BLOB NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                " counter_key TEXT NOT NULL,"
+                " field TEXT NOT NULL,"
+                " value REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (counter_key, field))"
+            )
+
+    @contextmanager
+    def _connect(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        """A connection running one transaction, closed afterwards
+
+        With write=True the transaction takes the write lock up front, so a
+        read-then-write in it cannot interleave with another worker's write.
+        """
+        with closing(sqlite3.connect(self.db_path, timeout=10)) as conn:
+            with conn:
+                if write:
+                    conn.execute("BEGIN IMMEDIATE")
+                yield conn
+
+    def load(self, session_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT version, payload FROM session_state WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+        if row is None:
+            return None, 0
+        return decode_state(row[1]), row[0]
+
+    def save(self, session_id, state, expected_version):
+        blob = encode_state(state)
+        now = time.time()
+        with self._connect(write=True) as conn:
+            if expected_version == 0:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO session_state (session_id, version, updated_at, payload)"
+                    " VALUES (?, 1, ?, ?)",
+                    (session_id, now, blob)
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE session_state SET version = version + 1, updated_at = ?, payload = ?"
+                    " WHERE session_id = ? AND version = ?",
+                    (now, blob, session_id, expected_version)
+                )
+            if cursor.rowcount == 0:
+                row = conn.execute(
+                    "SELECT version FROM session_state WHERE session_id = ?",
+                    (session_id,)
+                ).fetchone()
+                raise StateConflictError(session_id, expected_version, row[0] if row else 0)
+        return expected_version + 1
+
+    def delete(self, session_id):
+        with self._connect(write=True) as conn:
+            conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+
+    def increment_counters(self, keys, amounts):
+        now = time.time()
+        with self._connect(write=True) as conn:
+            conn.executemany(
+                "INSERT INTO counters (counter_key, field, value, updated_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (counter_key, field) DO UPDATE"
+                " SET value = value + excluded.value, updated_at = excluded.updated_at",
+                [(key, field, amount, now) for key in keys for field, amount in amounts.items()]
+            )
+
+    def read_counters(self, keys):
+        if not keys:
+            return {}
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT counter_key, field, value FROM counters"
+                f" WHERE counter_key IN ({', '.join('?' for _ in keys)})",
+                list(keys)
+            ).fetchall()
+        counters: Dict[str, Dict[str, float]] = {}
+        for key, field, value in rows:
+            counters.setdefault(key, {})[field] = value
+        return counters
+
+    def expire_counters(self, max_age):
+        with self._connect(write=True) as conn:
+            conn.execute("DELETE FROM counters WHERE updated_at < ?", (time.time() - max_age,))
+
+
+_store: Optional[StateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    """Return the process-wide store selected by the STATE_BACKEND env variable
+
+    STATE_BACKEND=memory (default) keeps state in this process only.
+    STATE_BACKEND=sqlite stores it in STATE_DB_PATH so every worker can share it.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = os.getenv("STATE_BACKEND", "memory").lower()
+            if backend == "sqlite":
+                _store = SQLiteStateStore(os.getenv("STATE_DB_PATH", DEFAULT_DB_PATH))
+            elif backend == "memory":
+                _store = InMemoryStateStore()
+            else:
+                raise ValueError(f"Unsupported state backend: {backend}")
+        return _store
+
+
+def _signature(session_id: str) -> str:
+    return hmac.new(SESSION_SECRET.encode("utf-8"), session_id.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def new_session_id() -> str:
+    """A fresh session id, signed so clients cannot make up or alter one"""
+    session_id = uuid.uuid4().hex
+    return f"{session_id}.{_signature(session_id)}"
+
+
+def is_valid_session_id(value: Optional[str]) -> bool:
+    """Return True if value was issued by new_session_id (with the current SESSION_SECRET)"""
+    session_id, _, signature = (value or "").partition(".")
+    return bool(session_id and signature) and hmac.compare_digest(signature, _signature(session_id))
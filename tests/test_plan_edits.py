@@ -0,0 +1,87 @@
+import pytest
+
+from backend.plan_edits import (
+    PhaseEdit, PlanEditError, apply_phase_edits, describe_phase_edits, format_duration, rebalance_durations
+)
+from backend.plan_utils import total_minutes
+
+
+def make_plan(*minutes):
+    return {
+        "objectives": ["Objective"],
+        "outline": [
+            {"phase": f"P{i}", "duration": f"{m} minutes", "purpose": "p", "description": "d"}
+            for i, m in enumerate(minutes)
+        ],
+    }
+
+
+def keep(plan, **changes):
+    """An edit for every phase, with changes keyed like P1="15 minutes" """
+    return [PhaseEdit(i, phase["phase"], changes.get(phase["phase"], phase["duration"]))
+            for i, phase in enumerate(plan["outline"])]
+
+
+def test_format_duration():
+    assert format_duration(1) == "1 minute"
+    assert format_duration(15) == "15 minutes"
+
+
+def test_rebalance_is_proportional_and_exact():
+    assert rebalance_durations({0: 10, 1: 20}, 60) == {0: 20, 1: 40}
+    result = rebalance_durations({0: 10, 1: 10, 2: 10}, 10)
+    assert sum(result.values()) == 10
+    assert result == {0: 4, 1: 3, 2: 3}
+
+
+def test_rebalance_keeps_the_minimum():
+    result = rebalance_durations({0: 1, 1: 100}, 20)
+    assert result[0] >= 1
+    assert sum(result.values()) == 20
+    with pytest.raises(PlanEditError):
+        rebalance_durations({0: 10, 1: 10}, 1)
+
+
+def test_unchanged_edits_keep_the_plan():
+    plan = make_plan(10, 20)
+    assert apply_phase_edits(plan, keep(plan))["outline"] == plan["outline"]
+
+
+def test_retimed_phase_is_kept_and_others_absorb_the_difference():
+    plan = make_plan(10, 20, 30)
+    new_plan = apply_phase_edits(plan, keep(plan, P0="20 minutes"))
+    assert new_plan["outline"][0]["duration"] == "20 minutes"
+    assert total_minutes(new_plan["outline"]) == 60
+    assert "keep the total lesson time" in new_plan["outline"][1]["summary of changes"]
+
+
+def test_deleted_time_goes_to_the_remaining_phases():
+    plan = make_plan(10, 20, 30)
+    edits = [PhaseEdit(2, "P2", "30 minutes"), PhaseEdit(0, "Warm-up", "10 minutes")]
+    new_plan = apply_phase_edits(plan, edits)
+    assert [phase["phase"] for phase in new_plan["outline"]] == ["P2", "Warm-up"]
+    assert total_minutes(new_plan["outline"]) == 60
+    assert "Renamed from 'P0'" in new_plan["outline"][1]["summary of changes"]
+    assert plan["outline"][0]["phase"] == "P0"
+
+
+@pytest.mark.parametrize("edits", [
+    [],
+    [PhaseEdit(0, "P0", "10 minutes"), PhaseEdit(0, "P0", "10 minutes")],
+    [PhaseEdit(5, "P5", "10 minutes")],
+    [PhaseEdit(0, " ", "10 minutes")],
+    [PhaseEdit(0, "P0", "a while")],
+])
+def test_invalid_edits_are_rejected(edits):
+    with pytest.raises(PlanEditError):
+        apply_phase_edits(make_plan(10, 20), edits)
+
+
+def test_describe_phase_edits():
+    plan = make_plan(10, 20, 30)
+    lines = describe_phase_edits(plan, [PhaseEdit(2, "P2", "30 minutes"), PhaseEdit(0, "Intro", "5 minutes")])
+    assert lines == [
+        "- Phase 2: Delete 'P1'",
+        "- Phase 1: Change 'P0' (10 minutes) to 'Intro' (5 minutes)",
+        "- Reorder the phases to: Phase 3, Phase 1",
+    ]
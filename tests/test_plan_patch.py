@@ -0,0 +1,90 @@
+import pytest
+
+from backend.plan_patch import PatchError, apply_plan_patch, validate_plan_patch
+
+
+def make_plan(count=3):
+    return {
+        "objectives": ["Objective"],
+        "outline": [
+            {"phase": f"P{i}", "duration": "10 minutes", "purpose": "p", "description": "d"}
+            for i in range(count)
+        ],
+    }
+
+
+NEW_PHASE = {"phase": "New", "duration": "5 minutes", "purpose": "p", "description": "d"}
+
+
+def patch(*operations, objectives=None):
+    return {"objectives": objectives, "operations": list(operations)}
+
+
+def test_operations_use_original_indices():
+    plan = make_plan()
+    new_plan = apply_plan_patch(plan, patch(
+        {"op": "delete", "index": 0},
+        {"op": "replace", "index": 1, "phase": {"duration": "15 minutes"}},
+        {"op": "insert", "index": 2, "phase": NEW_PHASE},
+        {"op": "insert", "index": 3, "phase": NEW_PHASE},
+    ))
+    assert [phase["phase"] for phase in new_plan["outline"]] == ["P1", "New", "P2", "New"]
+    assert new_plan["outline"][0]["duration"] == "15 minutes"
+    assert new_plan["outline"][0]["purpose"] == "p"
+
+
+def test_untouched_phases_are_the_same_objects_and_input_is_unchanged():
+    plan = make_plan()
+    new_plan = apply_plan_patch(plan, patch({"op": "replace", "index": 0, "phase": {"purpose": "q"}}))
+    assert new_plan["outline"][1] is plan["outline"][1]
+    assert plan["outline"][0]["purpose"] == "p"
+
+
+def test_objectives_are_replaced_only_when_given():
+    plan = make_plan()
+    assert apply_plan_patch(plan, patch())["objectives"] == ["Objective"]
+    assert apply_plan_patch(plan, patch(objectives=["New"]))["objectives"] == ["New"]
+
+
+@pytest.mark.parametrize("bad_patch", [
+    [],
+    {"operations": {}},
+    patch(objectives="not a list"),
+    patch({"op": "move", "index": 0}),
+    patch({"op": "delete", "index": "0"}),
+    patch({"op": "delete", "index": True}),
+    patch({"op": "delete", "index": 3}),
+    patch({"op": "insert", "index": 4, "phase": NEW_PHASE}),
+    patch({"op": "insert", "index": 0, "phase": {"phase": "Incomplete"}}),
+    patch({"op": "replace", "index": 0, "phase": {}}),
+    patch({"op": "replace", "index": 0, "phase": {"colour": "red"}}),
+    patch({"op": "replace", "index": 0, "phase": {"phase": ""}}),
+    patch({"op": "replace", "index": 0, "phase": {"purpose": "q"}}, {"op": "delete", "index": 0}),
+])
+def test_invalid_patches_are_rejected(bad_patch):
+    with pytest.raises(PatchError):
+        validate_plan_patch(make_plan(), bad_patch)
+
+
+def test_patch_may_not_remove_every_phase():
+    with pytest.raises(PatchError):
+        apply_plan_patch(make_plan(1), patch({"op": "delete", "index": 0}))
+
+
+def test_allowed_indices_limit_targets_and_inserts():
+    plan = make_plan()
+    validate_plan_patch(plan, patch({"op": "replace", "index": 1, "phase": {"purpose": "q"}}), [1])
+    validate_plan_patch(plan, patch({"op": "insert", "index": 1, "phase": NEW_PHASE}), [1])
+    validate_plan_patch(plan, patch({"op": "insert", "index": 2, "phase": NEW_PHASE}), [1])
+    with pytest.raises(PatchError):
+        validate_plan_patch(plan, patch({"op": "delete", "index": 0}), [1])
+    with pytest.raises(PatchError):
+        validate_plan_patch(plan, patch({"op": "insert", "index": 0, "phase": NEW_PHASE}), [1])
+
+
+def test_insert_indices_override_the_default_positions():
+    plan = make_plan()
+    # Position 2 is right after phase 1 but owned by another group here
+    with pytest.raises(PatchError):
+        validate_plan_patch(plan, patch({"op": "insert", "index": 2, "phase": NEW_PHASE}), [1], [1])
+    validate_plan_patch(plan, patch({"op": "insert", "index": 1, "phase": NEW_PHASE}), [1], [1])
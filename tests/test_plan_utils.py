@@ -0,0 +1,57 @@
+import pytest
+
+from backend.plan_utils import compact_plan, expand_plan, parse_duration_minutes, total_minutes
+
+
+@pytest.mark.parametrize("duration, minutes", [
+    ("10 minutes", 10),
+    ("15 min", 15),
+    ("90min", 90),
+    ("1 hour", 60),
+    ("1.5 hours", 90),
+    ("1 hour 30 minutes", 90),
+    ("1 hour and 30 minutes", 90),
+    ("1h 15m", 75),
+    ("15", 15),
+    (20, 20),
+])
+def test_parse_duration_minutes(duration, minutes):
+    assert parse_duration_minutes(duration) == minutes
+
+
+def test_breakdown_after_the_duration_is_not_counted():
+    assert parse_duration_minutes("15 minutes (5 min intro + 10 min practice)") == 15
+
+
+def test_range_counts_as_lower_bound():
+    assert parse_duration_minutes("10-15 minutes") == 10
+    assert parse_duration_minutes("10 to 15 min") == 10
+
+
+def test_numbers_without_unit_are_skipped():
+    assert parse_duration_minutes("Day 1: 20 minutes") == 20
+
+
+@pytest.mark.parametrize("duration", ["45 seconds", "a while", "", None, ["10 minutes"]])
+def test_unparseable_duration(duration):
+    assert parse_duration_minutes(duration) is None
+
+
+def test_total_minutes_ignores_unparseable_phases():
+    outline = [{"duration": "10 minutes"}, {"duration": "1 hour"}, {"duration": "later"}, {}]
+    assert total_minutes(outline) == 70
+
+
+def test_compact_plan_round_trip():
+    plan = {
+        "objectives": ["Explain loops"],
+        "outline": [
+            {"phase": "Intro", "duration": "10 minutes", "purpose": "p", "description": "d"},
+            {"phase": "Lab", "duration": "1 hour", "purpose": "p", "description": "d",
+             "summary of changes": "Longer lab"},
+        ],
+    }
+    compact = compact_plan(plan)
+    assert compact["ph"][0]["m"] == 10
+    assert compact["ph"][1]["m"] == "1 hour"
+    assert expand_plan(compact) == plan
@@ -0,0 +1,42 @@
+import pytest
+
+from backend import rate_limit
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """A fresh limiter for a test provider, without real sleeps"""
+    monkeypatch.setenv("TESTPROVIDER_RPM", "0")
+    monkeypatch.setenv("TESTPROVIDER_TPM", "100000")
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    return rate_limit._limiter("testprovider")
+
+
+def test_failed_attempts_return_their_reservation(limiter):
+    attempts = []
+
+    def request():
+        attempts.append(limiter.tokens.level)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "answer"
+
+    assert rate_limit.call("testprovider", "hello", request) == "answer"
+    # Every attempt sees the bucket with only its own reservation taken (plus refill)
+    assert attempts[2] == pytest.approx(attempts[0], abs=100)
+
+
+def test_non_retryable_failure_is_raised_once(limiter):
+    level = limiter.tokens.level
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        rate_limit.call("testprovider", "hello", request)
+    assert len(attempts) == 1
+    assert limiter.in_flight == 0
+    assert limiter.tokens.level == pytest.approx(level, abs=100)
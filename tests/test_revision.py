@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from backend import revision
+from backend.plan_patch import PatchError
+from backend.plan_utils import total_minutes
+
+
+def make_plan(count=4, minutes=10):
+    return {
+        "objectives": ["Objective"],
+        "outline": [
+            {"phase": f"P{i}", "duration": f"{minutes} minutes", "purpose": "p", "description": "d"}
+            for i in range(count)
+        ],
+    }
+
+
+TRANSITION = {"phase": "Transition", "duration": "5 minutes", "purpose": "p", "description": "d"}
+GROUPS = [([{"issue": "a"}], [0, 1]), ([{"issue": "b"}], [2, 3])]
+
+
+@pytest.fixture
+def patches(monkeypatch):
+    """Patch returned for each group, keyed by the issue of its point"""
+    outputs = {}
+
+    class FakeChain:
+        def invoke(self, inputs):
+            issue = json.loads(inputs["selected_critique_points"])[0]["issue"]
+            return {"plan_patch": json.dumps(outputs[issue])}
+
+    monkeypatch.setattr(revision, "create_revise_selected_patch_chain", lambda llm: FakeChain())
+    return outputs
+
+
+def test_boundary_between_windows_belongs_to_one_group():
+    assert revision._insert_positions(GROUPS) == [{0, 1}, {2, 3, 4}]
+
+
+def test_neighbouring_groups_cannot_insert_at_the_same_place(patches):
+    patches["a"] = {"operations": [{"op": "insert", "index": 2, "phase": TRANSITION}]}
+    patches["b"] = {"operations": [{"op": "insert", "index": 2, "phase": TRANSITION}]}
+    with pytest.raises(PatchError):
+        revision.revise_point_groups(None, make_plan(), GROUPS)
+
+
+def test_merged_patches_keep_the_total_duration(patches):
+    patches["a"] = {"operations": [{"op": "replace", "index": 1, "phase": {"duration": "20 minutes"}}]}
+    patches["b"] = {"operations": [{"op": "insert", "index": 2, "phase": TRANSITION}]}
+    plan = make_plan()
+    revised = revision.revise_point_groups(None, plan, GROUPS)
+    assert [phase["phase"] for phase in revised["outline"]] == ["P0", "P1", "Transition", "P2", "P3"]
+    assert revised["outline"][1]["duration"] == "20 minutes"
+    assert total_minutes(revised["outline"]) == total_minutes(plan["outline"])
+    assert "summary of changes" in revised["outline"][0]
+
+
+def test_balanced_patches_are_left_alone(patches):
+    patches["a"] = {"operations": [{"op": "replace", "index": 0, "phase": {"description": "new"}}]}
+    patches["b"] = {"operations": []}
+    plan = make_plan()
+    revised = revision.revise_point_groups(None, plan, GROUPS)
+    assert revised["outline"][0]["description"] == "new"
+    assert revised["outline"][1:] == plan["outline"][1:]
@@ -0,0 +1,41 @@
+import pytest
+
+from backend import routing
+from backend.routing import Backend, RoutedLLM
+
+PRIMARY = Backend("openai", "primary", None)
+BACKUP = Backend("openrouter", "backup", None)
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    """Outcome of a request per backend model (a value, or an exception to raise); records calls"""
+    outcomes, called = {}, []
+
+    def fake_request(self, backend, messages, template, first_token=None, cancel=None):
+        called.append(backend.model)
+        outcome = outcomes[backend.model]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(RoutedLLM, "_request", fake_request)
+    monkeypatch.setattr(routing, "_take_hedge", lambda template: False)
+    return outcomes, called
+
+
+def test_failed_primary_fails_over_without_hedge_budget(requests):
+    outcomes, called = requests
+    outcomes.update(primary=ConnectionError("reset"), backup="answer")
+    llm = RoutedLLM({"default": [PRIMARY, BACKUP]})
+    assert llm._hedged(PRIMARY, BACKUP, [], "test") == "answer"
+    assert called == ["primary", "backup"]
+
+
+def test_rejected_primary_is_not_retried(requests):
+    outcomes, called = requests
+    outcomes.update(primary=ValueError("bad request"), backup="answer")
+    llm = RoutedLLM({"default": [PRIMARY, BACKUP]})
+    with pytest.raises(ValueError):
+        llm._hedged(PRIMARY, BACKUP, [], "test")
+    assert called == ["primary"]
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from backend import scheduler
+from backend.call_context import priority_scope
+from backend.scheduler import PreemptedError, priority_for, queue_depths, slot
+
+
+@pytest.fixture(autouse=True)
+def fresh_scheduler(monkeypatch):
+    monkeypatch.setattr(scheduler, "_waiting", [])
+    monkeypatch.setattr(scheduler, "_running", {name: 0 for name in scheduler.PRIORITY_CLASSES})
+    monkeypatch.setattr(scheduler, "_tenant_running", {})
+
+    def configure(slots, reserved):
+        monkeypatch.setattr(scheduler, "SCHEDULER_SLOTS", slots)
+        monkeypatch.setattr(scheduler, "SCHEDULER_RESERVED_SLOTS", reserved)
+    return configure
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def run_in_thread(priority, outcome):
+    """Take a slot with priority on a new thread, appending (priority, "ran" or "preempted") to outcome"""
+    def run():
+        with priority_scope(priority):
+            try:
+                with slot("test"):
+                    outcome.append((priority, "ran"))
+            except PreemptedError:
+                outcome.append((priority, "preempted"))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_priority_for():
+    assert priority_for("critique") == "revision"
+    assert priority_for("quiz") == "artifact"
+    assert priority_for("unknown_template") == "interactive"
+    with priority_scope("batch"):
+        assert priority_for("critique") == "batch"
+
+
+def test_reserved_slots_stay_free_for_urgent_calls(fresh_scheduler):
+    fresh_scheduler(slots=2, reserved=1)
+    outcome = []
+    with priority_scope("artifact"), slot("test"):
+        thread = run_in_thread("artifact", outcome)
+        wait_until(lambda: queue_depths()["artifact"] == 1)
+        with priority_scope("interactive"), slot("test"):
+            assert outcome == []
+    thread.join(2)
+    assert outcome == [("artifact", "ran")]
+
+
+def test_higher_class_is_admitted_first(fresh_scheduler):
+    fresh_scheduler(slots=1, reserved=0)
+    order = []
+    with priority_scope("interactive"), slot("test"):
+        artifact = run_in_thread("artifact", order)
+        wait_until(lambda: queue_depths()["artifact"] == 1)
+        revision = run_in_thread("revision", order)
+        wait_until(lambda: queue_depths()["revision"] == 1)
+    artifact.join(2)
+    revision.join(2)
+    assert order == [("revision", "ran"), ("artifact", "ran")]
+    assert queue_depths() == {name: 0 for name in scheduler.PRIORITY_CLASSES}
+
+
+def test_preempted_call_wakes_up_while_slots_are_still_busy(fresh_scheduler):
+    fresh_scheduler(slots=1, reserved=0)
+    batch_outcome, urgent_outcome = [], []
+    with priority_scope("interactive"), slot("test"):
+        batch = run_in_thread("batch", batch_outcome)
+        wait_until(lambda: queue_depths()["batch"] == 1)
+        urgent = run_in_thread("interactive", urgent_outcome)
+        # The batch call gives up without waiting for the held slot to be released
+        batch.join(2)
+        assert batch_outcome == [("batch", "preempted")]
+        assert urgent_outcome == []
+    urgent.join(2)
+    assert urgent_outcome == [("interactive", "ran")]
@@ -0,0 +1,94 @@
+import pytest
+
+from backend.state_store import (
+    InMemoryStateStore, SQLiteStateStore, StateConflictError, StateStore, decode_state,
+    encode_state, is_valid_session_id, new_session_id
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteStateStore(str(tmp_path / "state.db"))
+    return InMemoryStateStore()
+
+
+def test_unknown_session_loads_empty(store):
+    assert store.load("missing") == (None, 0)
+
+
+def test_save_bumps_version(store):
+    assert store.save("s", {"plan": [1]}, 0) == 1
+    assert store.save("s", {"plan": [1, 2]}, 1) == 2
+    assert store.load("s") == ({"plan": [1, 2]}, 2)
+
+
+def test_stale_save_raises_conflict(store):
+    store.save("s", {"step": "a"}, 0)
+    store.save("s", {"step": "b"}, 1)
+    with pytest.raises(StateConflictError) as excinfo:
+        store.save("s", {"step": "stale"}, 1)
+    assert excinfo.value.expected_version == 1
+    assert excinfo.value.current_version == 2
+    assert store.load("s") == ({"step": "b"}, 2)
+
+
+def test_second_create_raises_conflict(store):
+    store.save("s", {"step": "a"}, 0)
+    with pytest.raises(StateConflictError) as excinfo:
+        store.save("s", {"step": "other"}, 0)
+    assert excinfo.value.current_version == 1
+
+
+def test_delete(store):
+    store.save("s", {"step": "a"}, 0)
+    store.delete("s")
+    assert store.load("s") == (None, 0)
+
+
+def test_counters_add_up(store):
+    store.increment_counters(["teacher:t", "session:s"], {"tokens": 10, "cost": 0.5})
+    store.increment_counters(["teacher:t"], {"tokens": 5})
+    assert store.read_counters(["teacher:t", "session:s", "other"]) == {
+        "teacher:t": {"tokens": 15, "cost": 0.5},
+        "session:s": {"tokens": 10, "cost": 0.5},
+    }
+    assert store.read_counters([]) == {}
+
+
+def test_expire_counters(store):
+    store.increment_counters(["teacher:t"], {"tokens": 1})
+    store.expire_counters(-1)
+    assert store.read_counters(["teacher:t"]) == {}
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "state.db")
+    SQLiteStateStore(path).save("s", {"step": "a"}, 0)
+    other = SQLiteStateStore(path)
+    assert other.load("s") == ({"step": "a"}, 1)
+    with pytest.raises(StateConflictError):
+        other.save("s", {"step": "b"}, 0)
+
+
+def test_state_store_is_abstract():
+    with pytest.raises(TypeError):
+        StateStore()
+
+
+def test_encode_state_round_trip_and_rejects_unserializable():
+    state = {"plan": {"phases": ["Intro"]}, "note": "café"}
+    assert decode_state(encode_state(state)) == state
+    with pytest.raises(TypeError):
+        encode_state({"value": object()})
+
+
+def test_session_ids_are_signed():
+    session_id = new_session_id()
+    assert is_valid_session_id(session_id)
+    assert session_id != new_session_id()
+    raw, _, signature = session_id.partition(".")
+    assert not is_valid_session_id(raw)
+    assert not is_valid_session_id(f"{'0' * len(raw)}.{signature}")
+    assert not is_valid_session_id(None)
+    assert not is_valid_session_id("")